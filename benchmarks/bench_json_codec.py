@@ -0,0 +1,111 @@
+"""Micro-benchmark of JSON encode/decode cost per backend.
+
+Run from the repository root:
+
+    python benchmarks/bench_json_codec.py
+
+Payloads mimic a /torrents list of a large DB and a /stream?stat=true reply
+for a season pack with many file_stats entries.
+"""
+
+import base64
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from lib import json_codec  # noqa: E402
+
+
+def torrents_payload(count=200):
+    return [
+        {
+            "title": "Some.Show.S{:02d}.1080p.WEB-DL".format(i % 30),
+            "poster": "https://image.tmdb.org/t/p/w500/{:032x}.jpg".format(i),
+            "data": base64.b64encode(os.urandom(1536)).decode("ascii"),
+            "timestamp": 1700000000 + i,
+            "name": "Some.Show.S{:02d}".format(i % 30),
+            "hash": "{:040x}".format(i),
+            "stat": i % 6,
+            "stat_string": "Torrent in db",
+            "torrent_size": 40 * 1024 ** 3,
+            "category": "tv",
+        }
+        for i in range(count)
+    ]
+
+
+def stream_stat_payload(files=400):
+    return {
+        "title": "Some.Show.Complete.Series.1080p",
+        "name": "Some.Show.Complete.Series.1080p",
+        "hash": "{:040x}".format(1),
+        "stat": 3,
+        "stat_string": "Torrent working",
+        "loaded_size": 123456789,
+        "torrent_size": 300 * 1024 ** 3,
+        "preloaded_bytes": 12345678,
+        "preload_size": 52428800,
+        "download_speed": 1234567.8,
+        "upload_speed": 12345.6,
+        "total_peers": 120,
+        "pending_peers": 10,
+        "active_peers": 40,
+        "connected_seeders": 25,
+        "half_open_peers": 3,
+        "bytes_written": 1,
+        "bytes_read": 123456789,
+        "file_stats": [
+            {
+                "id": i + 1,
+                "path": "Some.Show/Season {:02d}/Some.Show.S{:02d}E{:02d}.1080p.mkv".format(
+                    i // 20 + 1, i // 20 + 1, i % 20 + 1
+                ),
+                "length": 1500000000 + i,
+            }
+            for i in range(files)
+        ],
+    }
+
+
+def bench(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print("  {:<8} {:>10.1f} us".format(name, seconds * 1e6))
+
+
+def backends():
+    yield "json", json.dumps, json.loads
+    try:
+        import orjson
+
+        yield "orjson", orjson.dumps, orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+
+        yield "ujson", ujson.dumps, ujson.loads
+    except ImportError:
+        pass
+
+
+def main():
+    print("json_codec backend in use: {}".format(json_codec.BACKEND))
+    for label, payload, number in (
+        ("/torrents list (200 torrents)", torrents_payload(), 50),
+        ("/stream?stat=true (400 file_stats)", stream_stat_payload(), 200),
+    ):
+        raw = json.dumps(payload).encode("utf-8")
+        print("{} - {} bytes".format(label, len(raw)))
+        for name, dumps, loads in backends():
+            print(" {}".format(name))
+            bench("encode", lambda: dumps(payload), number)
+            bench("decode", lambda: loads(raw), number)
+
+
+if __name__ == "__main__":
+    main()
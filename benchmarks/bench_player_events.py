@@ -0,0 +1,170 @@
+"""Wakeups per minute of playback monitoring, polling vs Kodi events.
+
+Run from the repository root:
+
+    python benchmarks/bench_player_events.py
+
+Kodi is simulated on a virtual clock: a 90 minute playback with a pause in
+the middle. "polling" is the loop the player used before it was driven by
+Kodi's callbacks (0.2 s condition polling); "events" is ``lib.player.Player``.
+A wakeup is a return from ``Monitor.waitForAbort`` into Python; Kodi calls
+counts isPlaying/getPlayingFile/getCondVisibility round trips.
+"""
+
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+URL = "http://127.0.0.1:8090/stream/movie.mkv?link=abc&index=1&play"
+START_AT = 3.0
+PAUSE_AT = 40 * 60.0
+RESUME_AT = 45 * 60.0
+STOP_AT = 90 * 60.0
+# Kodi runs pending Python callbacks every 100 ms while a script waits.
+CALLBACK_TICK = 0.1
+
+
+class SimulatedKodi(object):
+    def __init__(self):
+        self.now = 0.0
+        self.wakeups = 0
+        self.calls = 0
+        self.player = None
+        self._pending = [
+            (START_AT, "onAVStarted"),
+            (PAUSE_AT, "onPlayBackPaused"),
+            (RESUME_AT, "onPlayBackResumed"),
+            (STOP_AT, "onPlayBackStopped"),
+        ]
+
+    def playing(self):
+        return START_AT <= self.now < STOP_AT
+
+    def paused(self):
+        return self.playing() and PAUSE_AT <= self.now < RESUME_AT
+
+    def wait_for_abort(self, timeout):
+        end = self.now + timeout
+        while self.now < end:
+            self.now = min(self.now + CALLBACK_TICK, end)
+            while self._pending and self._pending[0][0] <= self.now:
+                _, event = self._pending.pop(0)
+                if self.player is not None and hasattr(self.player, event):
+                    getattr(self.player, event)()
+        self.wakeups += 1
+        return self.now > STOP_AT + 60
+
+    def is_playing(self):
+        self.calls += 1
+        return self.playing()
+
+    def get_playing_file(self):
+        self.calls += 1
+        if not self.playing():
+            raise RuntimeError("Kodi is not playing any media file")
+        return URL
+
+    def get_cond_visibility(self, condition):
+        self.calls += 1
+        if condition == "Player.Paused":
+            return self.paused()
+        return self.playing() and not self.paused()
+
+
+KODI = SimulatedKodi()
+
+
+def install_kodi_modules():
+    class Monitor(object):
+        def waitForAbort(self, timeout=0):
+            return KODI.wait_for_abort(timeout)
+
+    class Player(object):
+        def isPlaying(self):
+            return KODI.is_playing()
+
+        def getPlayingFile(self):
+            return KODI.get_playing_file()
+
+    class Any(object):
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __getattr__(self, _name):
+            return lambda *args, **kwargs: ""
+
+    xbmc = types.ModuleType("xbmc")
+    xbmc.Monitor = Monitor
+    xbmc.Player = Player
+    xbmc.getCondVisibility = KODI.get_cond_visibility
+    xbmc.getInfoLabel = lambda _label: ""
+    xbmc.log = lambda *args, **kwargs: None
+    for level, name in enumerate(("NONE", "DEBUG", "INFO", "WARNING", "ERROR")):
+        setattr(xbmc, "LOG" + name, level)
+    xbmc.LOGFATAL = 5
+    xbmcgui = types.ModuleType("xbmcgui")
+    xbmcgui.Window = xbmcgui.ControlImage = xbmcgui.ControlLabel = Any
+    xbmcgui.Dialog = xbmcgui.DialogProgress = xbmcgui.ListItem = Any
+    xbmcaddon = types.ModuleType("xbmcaddon")
+    xbmcaddon.Addon = Any
+    xbmcvfs = types.ModuleType("xbmcvfs")
+    xbmcvfs.translatePath = lambda path: path
+    for module in (xbmc, xbmcgui, xbmcaddon, xbmcvfs):
+        sys.modules[module.__name__] = module
+
+
+def polling_loop(period=0.2):
+    """The condition polling loop that preceded the event driven player."""
+    import xbmc
+
+    monitor = xbmc.Monitor()
+    player = xbmc.Player()
+    while not (player.isPlaying() and player.getPlayingFile() == URL):
+        if monitor.waitForAbort(0.5):
+            return
+    current_event = 0
+    events = [
+        (0, lambda: xbmc.getCondVisibility("Player.Playing")),
+        (1, lambda: xbmc.getCondVisibility("Player.Paused")),
+    ]
+    while player.isPlaying() and player.getPlayingFile() == URL:
+        for event, handle in events:
+            if handle():
+                current_event = event
+                break
+        if monitor.waitForAbort(period):
+            return
+
+
+def event_loop():
+    from lib.player import Player
+
+    player = KODI.player = Player()
+    player.handle_events(url=URL)
+    KODI.player = None
+
+
+def run(name, loop):
+    KODI.__init__()
+    loop()
+    minutes = KODI.now / 60.0
+    print(
+        "  {:<8} {:>7.1f} wakeups/min {:>8.1f} Kodi calls/min".format(
+            name, KODI.wakeups / minutes, KODI.calls / minutes
+        )
+    )
+
+
+def main():
+    install_kodi_modules()
+    print("{:.0f} minute playback with a pause".format(STOP_AT / 60.0))
+    run("polling", polling_loop)
+    run("events", event_loop)
+
+
+if __name__ == "__main__":
+    main()
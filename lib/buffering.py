@@ -9,6 +9,41 @@ MAX_RETRIES_DEFAULT = 3
 BACKOFF_BASE_SECONDS = 1.0
 BACKOFF_MAX_SECONDS = 8.0
 
+POLL_MIN_SECONDS = 0.2
+POLL_DEFAULT_SECONDS = 1.0
+POLL_MAX_SECONDS = 5.0
+METADATA_POLL_SECONDS = 0.5
+# Longest wait between two checks of a dialog's Cancel button.
+CANCEL_CHECK_SECONDS = 0.5
+RATE_SMOOTHING = 0.3
+# /cache returns the whole piece map: read it on every poll only near the
+# target, where the ready gate needs it, and this often otherwise.
+PIECE_MAP_NEAR_TARGET = 0.9
+PIECE_MAP_SECONDS = 5.0
+
+EARLY_START_MARGIN_DEFAULT = 1.5
+EARLY_START_MIN_BUFFER_SECONDS = 10
+
+
+def piece_map_due(
+    preloaded_bytes,
+    target_size,
+    fetched_at,
+    now,
+    near_target=PIECE_MAP_NEAR_TARGET,
+    interval=PIECE_MAP_SECONDS,
+):
+    """Whether to read the piece map on this poll.
+
+    ``preloaded_bytes`` counts every downloaded byte of the file, so it
+    reaches the target no later than the contiguous head does.
+    """
+    if fetched_at is None:
+        return True
+    if target_size and preloaded_bytes >= target_size * near_target:
+        return True
+    return now - fetched_at >= interval
+
 
 def clamp_progress(value):
     """Clamp buffering progress to 0-100 int for DialogProgress.update."""
@@ -63,3 +98,149 @@ def is_preload_complete(preloaded_bytes, preload_size):
 def is_resolving_metadata(preload_size):
     """Return whether TorrServer has not resolved preload metadata yet."""
     return not preload_size or preload_size <= 0
+
+
+class Ewma(object):
+    """Exponentially weighted moving average of a sampled value."""
+
+    def __init__(self, smoothing=RATE_SMOOTHING):
+        self._smoothing = smoothing
+        self.value = None
+
+    def update(self, sample):
+        if sample is not None:
+            if self.value is None:
+                self.value = float(sample)
+            else:
+                self.value += self._smoothing * (sample - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+class RateEstimator(object):
+    """Exponentially weighted growth rate of a byte counter, in bytes/s."""
+
+    def __init__(self, smoothing=RATE_SMOOTHING):
+        self._ewma = Ewma(smoothing)
+        self._last = None
+
+    @property
+    def rate(self):
+        return self._ewma.value
+
+    def update(self, value, now):
+        """Record counter ``value`` observed at ``now`` and return the rate."""
+        if value is None:
+            return self.rate
+        if self._last is not None:
+            last_value, last_time = self._last
+            if value < last_value:
+                # The counter restarted, e.g. preload was re-requested.
+                self._ewma.reset()
+            elif now > last_time:
+                self._ewma.update((value - last_value) / (now - last_time))
+            else:
+                return self.rate
+        self._last = (value, now)
+        return self.rate
+
+
+def estimate_eta(remaining_bytes, rate):
+    """Seconds until ``remaining_bytes`` arrive at ``rate``, None if unknown."""
+    if remaining_bytes is None:
+        return None
+    if remaining_bytes <= 0:
+        return 0.0
+    if not rate or rate <= 0:
+        return None
+    return remaining_bytes / float(rate)
+
+
+def next_poll_interval(
+    eta,
+    active_peers=None,
+    stalled_polls=0,
+    minimum=POLL_MIN_SECONDS,
+    default=POLL_DEFAULT_SECONDS,
+    maximum=POLL_MAX_SECONDS,
+):
+    """Seconds to wait before the next status poll.
+
+    With a known ETA the poll lands when completion is predicted, bounded to
+    ``[minimum, default]``. Without one, polling backs off exponentially while
+    no peers are connected, doubling for every consecutive stalled poll after
+    the first (``stalled_polls`` includes the current one), up to ``maximum``.
+    """
+    if eta is not None:
+        return max(minimum, min(eta, default))
+    if active_peers is not None and active_peers <= 0:
+        exponent = max(0, stalled_polls - 1)
+        return min(default * (2 ** exponent), maximum)
+    return default
+
+
+def wait_or_cancel(monitor, seconds, canceled, slice_seconds=CANCEL_CHECK_SECONDS):
+    """Wait ``seconds`` in slices, returning early once ``canceled()`` is true.
+
+    Returns True when Kodi asked to abort. Without the slices a backed-off
+    poll interval leaves Cancel unanswered for up to POLL_MAX_SECONDS.
+    """
+    remaining = seconds
+    while remaining > 0:
+        step = min(remaining, slice_seconds)
+        if monitor.waitForAbort(step):
+            return True
+        if canceled():
+            return False
+        remaining -= step
+    return False
+
+
+def file_length(status, file_id):
+    """Length of ``file_id`` from a /stream stat response, None if absent."""
+    for file in status.get("file_stats") or ():
+        if str(file.get("id")) == str(file_id):
+            return file.get("length")
+    return None
+
+
+def can_start_early(
+    buffered_bytes,
+    file_length,
+    bitrate,
+    download_rate,
+    margin=EARLY_START_MARGIN_DEFAULT,
+    min_buffer_seconds=EARLY_START_MIN_BUFFER_SECONDS,
+):
+    """Return whether playback can start before the preload completes.
+
+    Playback from the start consumes ``bitrate`` bytes/s while the download
+    adds ``download_rate / margin`` bytes/s on top of ``buffered_bytes``.
+    Both curves are straight lines, so the download stays ahead for the whole
+    file if it is still ahead when playback reaches the end. At least
+    ``min_buffer_seconds`` of media must be buffered either way.
+    """
+    if not file_length or not bitrate or not download_rate or not buffered_bytes:
+        return False
+    if file_length <= 0 or bitrate <= 0 or download_rate <= 0 or margin <= 0:
+        return False
+    if buffered_bytes < bitrate * min_buffer_seconds:
+        return False
+    if buffered_bytes >= file_length:
+        return True
+    playback_seconds = file_length / float(bitrate)
+    return buffered_bytes + download_rate / margin * playback_seconds >= file_length
+
+
+def buffer_target_bytes(bitrate, buffer_seconds, preload_size):
+    """Bytes covering ``buffer_seconds`` of playback, capped at the preload.
+
+    Falls back to the full ``preload_size`` when the bitrate is unknown.
+    """
+    if is_resolving_metadata(preload_size):
+        return preload_size
+    if not bitrate or bitrate <= 0 or not buffer_seconds or buffer_seconds <= 0:
+        return preload_size
+    return min(int(bitrate * buffer_seconds), preload_size)
@@ -0,0 +1,67 @@
+import os
+
+from lib.kodi import ADDON_DATA
+from lib.settings import (
+    get_connect_timeout,
+    get_extra_servers,
+    get_password,
+    get_port,
+    get_read_timeout,
+    get_service_host,
+    get_username,
+    ssl_enabled,
+)
+from lib.torrserver.api import TorrServer
+from lib.torrserver.breaker import STATE_FILE_NAME as BREAKER_STATE_FILE_NAME
+from lib.torrserver.breaker import CircuitBreaker
+from lib.torrserver.cache import ResponseCache
+from lib.torrserver.metrics import DUMP_FILE_NAME as METRICS_FILE_NAME
+from lib.torrserver.metrics import RequestMetrics
+from lib.torrserver.pool import STATE_FILE_NAME as POOL_STATE_FILE_NAME
+from lib.torrserver.pool import TorrServerPool
+from lib.torrserver.session import shared_session
+
+
+def create_client(host, port, metrics=None):
+    """TorrServer client configured from the addon settings."""
+    return TorrServer(
+        host,
+        port,
+        get_username(),
+        get_password(),
+        ssl_enabled(),
+        session=shared_session(retries=0),
+        connect_timeout=get_connect_timeout(),
+        read_timeout=get_read_timeout(),
+        cache=ResponseCache(),
+        metrics=metrics,
+        breaker=CircuitBreaker(
+            "{}:{}".format(host, port),
+            state_path=os.path.join(ADDON_DATA, BREAKER_STATE_FILE_NAME),
+        ),
+    )
+
+
+def create_pool(servers, metrics=None):
+    metrics = metrics or RequestMetrics()
+    return TorrServerPool(
+        [create_client(host, port, metrics=metrics) for host, port in servers],
+        state_path=os.path.join(ADDON_DATA, POOL_STATE_FILE_NAME),
+    )
+
+
+def create_metrics():
+    """Request metrics dumped to the file shared by every process."""
+    return RequestMetrics(dump_path=os.path.join(ADDON_DATA, METRICS_FILE_NAME))
+
+
+def create_api():
+    """Client for the configured TorrServer, or a pool when extra instances
+    are configured."""
+    metrics = create_metrics()
+    extra_servers = get_extra_servers()
+    if extra_servers:
+        return create_pool(
+            [(get_service_host(), get_port())] + extra_servers, metrics=metrics
+        )
+    return create_client(get_service_host(), get_port(), metrics=metrics)
@@ -15,6 +15,8 @@ _EPISODE_PATTERN = re.compile(
     r"(?<![A-Za-z0-9])(?:episode|ep)[ ._-]*(?P<episode>[0-9]+)(?![0-9])",
     re.IGNORECASE,
 )
+# Larger "seasons" are resolutions such as 1920x1080.
+_MAX_SEASON = 100
 _SEASON_PATTERNS = (
     re.compile(
         r"(?<![A-Za-z0-9])season[ ._-]*(?P<season>[0-9]+)(?![0-9])",
@@ -103,3 +105,39 @@ def match_episode_file(candidate_files, season, episode, torrent_title=""):
     if len(best_matches) != 1:
         return None
     return best_matches[0]
+
+
+def parse_episode(path, torrent_title=""):
+    """Return (season, episode) named by a file path, or None.
+
+    The last strong match wins, so a file name takes precedence over its
+    folders. Paths that only name an episode take the season from the path
+    or the torrent title when that season is unambiguous.
+    """
+    if not isinstance(path, str):
+        return None
+    for pattern in _STRONG_PATTERNS:
+        for match in reversed(list(pattern.finditer(path))):
+            season = int(match.group("season"))
+            if season <= _MAX_SEASON:
+                return season, int(match.group("episode"))
+    episodes = list(_EPISODE_PATTERN.finditer(path))
+    if not episodes:
+        return None
+    seasons = _season_contexts(path) or _season_contexts(str(torrent_title or ""))
+    if len(seasons) != 1:
+        return None
+    return seasons.pop(), int(episodes[-1].group("episode"))
+
+
+def next_episode_file(candidate_files, path, torrent_title=""):
+    """Return the file of the episode after ``path``: the next one in its
+    season, else the first of the next season."""
+    current = parse_episode(path, torrent_title)
+    if current is None:
+        return None
+    season, episode = current
+    following = match_episode_file(candidate_files, season, episode + 1, torrent_title)
+    if following is None:
+        following = match_episode_file(candidate_files, season + 1, 1, torrent_title)
+    return following
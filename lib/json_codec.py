@@ -0,0 +1,68 @@
+"""JSON encoding and decoding with an optional fast backend.
+
+orjson is used when importable, then ujson, then the standard library. All
+backends raise ValueError (or a subclass) on invalid input.
+"""
+
+import json as _json
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+try:
+    import ujson as _ujson
+except ImportError:
+    _ujson = None
+
+
+if _orjson is not None:
+    BACKEND = "orjson"
+elif _ujson is not None:
+    BACKEND = "ujson"
+else:
+    BACKEND = "json"
+
+
+def _stdlib_encode(obj):
+    return _json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode(obj):
+    """Serialize ``obj`` to UTF-8 encoded JSON bytes, e.g. for HTTP bodies."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj)
+        except TypeError:
+            # e.g. non-str dict keys or ints beyond 64 bit
+            return _stdlib_encode(obj)
+    if _ujson is not None:
+        return _ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+    return _stdlib_encode(obj)
+
+
+def dumps(obj):
+    """Serialize ``obj`` to a JSON str."""
+    if _orjson is not None:
+        return encode(obj).decode("utf-8")
+    if _ujson is not None:
+        return _ujson.dumps(obj, ensure_ascii=False)
+    return _json.dumps(obj, ensure_ascii=False)
+
+
+def loads(data):
+    """Deserialize JSON from str or bytes."""
+    if _orjson is not None:
+        return _orjson.loads(data)
+    if _ujson is not None:
+        return _ujson.loads(data)
+    return _json.loads(data)
+
+
+def load(file):
+    return loads(file.read())
+
+
+def dump(obj, file):
+    file.write(dumps(obj))
@@ -0,0 +1,54 @@
+"""Persisted index of infohashes known to be in TorrServer's DB."""
+
+import time
+
+from lib.torrserver.statefile import SharedStateFile
+
+
+STATE_FILE_NAME = "known_hashes.json"
+
+
+class KnownHashes(object):
+    """Set of infohashes shared by plugin invocations.
+
+    It is refreshed from every full torrent listing and kept up to date by
+    the add and remove actions of the addon, so playing a known hash can skip
+    the add round-trip.
+    """
+
+    def __init__(self, path=None, clock=time.time):
+        self._state = SharedStateFile(path)
+        self._clock = clock
+
+    def __contains__(self, info_hash):
+        if not info_hash:
+            return False
+        return info_hash.lower() in self._state.load().get("hashes", {})
+
+    def add(self, info_hash):
+        if info_hash and info_hash not in self:
+            self._update({info_hash.lower(): self._clock()})
+
+    def discard(self, info_hash):
+        if info_hash and info_hash in self:
+
+            def update(data):
+                hashes = dict(data.get("hashes", {}))
+                hashes.pop(info_hash.lower(), None)
+                data["hashes"] = hashes
+
+            self._state.update(update)
+
+    def replace(self, info_hashes):
+        now = self._clock()
+        hashes = {h.lower(): now for h in info_hashes if h}
+        if set(hashes) != set(self._state.load().get("hashes", {})):
+            self._state.save({"hashes": hashes})
+
+    def _update(self, entries):
+        def update(data):
+            hashes = dict(data.get("hashes", {}))
+            hashes.update(entries)
+            data["hashes"] = hashes
+
+        self._state.update(update)
@@ -0,0 +1,43 @@
+"""Local magnet link parsing."""
+
+import base64
+import binascii
+import re
+from urllib.parse import parse_qs, urlsplit
+
+
+_HEX_HASH = re.compile(r"[0-9a-fA-F]{40}")
+_BASE32_HASH = re.compile(r"[A-Za-z2-7]{32}")
+
+
+def normalize_info_hash(value):
+    """Return the lowercase hex form of a hex or base32 BitTorrent v1
+    infohash, or None when ``value`` is not one."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if _HEX_HASH.fullmatch(value):
+        return value.lower()
+    if _BASE32_HASH.fullmatch(value):
+        try:
+            return binascii.hexlify(base64.b32decode(value.upper())).decode("ascii")
+        except (binascii.Error, ValueError):
+            return None
+    return None
+
+
+def is_magnet(link):
+    return isinstance(link, str) and link[:7].lower() == "magnet:"
+
+
+def parse_info_hash(link):
+    """Extract the btih infohash of a magnet link (or bare hash) as hex."""
+    if not is_magnet(link):
+        return normalize_info_hash(link)
+    query = urlsplit(link).query
+    for xt in parse_qs(query).get("xt", []):
+        if xt[:9].lower() == "urn:btih:":
+            info_hash = normalize_info_hash(xt[9:])
+            if info_hash:
+                return info_hash
+    return None
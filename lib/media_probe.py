@@ -0,0 +1,152 @@
+"""Container, duration and bitrate of torrent files from TorrServer's ffprobe.
+
+Results are cached per (hash, file id) in a state file shared by every
+plugin invocation, so replaying a file skips the probe entirely.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+
+from lib.torrserver.api import TorrServerError
+from lib.torrserver.statefile import SharedStateFile
+
+
+STATE_FILE_NAME = "media_probe.json"
+MAX_ENTRIES = 500
+
+# duration in seconds, bitrate in bytes per second
+MediaInfo = namedtuple("MediaInfo", ["container", "duration", "bitrate"])
+
+
+def _positive_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def parse_ffprobe(result, file_length=None):
+    """Build a ``MediaInfo`` from ffprobe JSON, or None when it has no timing.
+
+    The container bitrate is preferred; otherwise it is derived from
+    ``file_length`` and the duration.
+    """
+    if not isinstance(result, dict):
+        return None
+    media_format = result.get("format")
+    if not isinstance(media_format, dict):
+        return None
+    duration = _positive_float(media_format.get("duration"))
+    bitrate = _positive_float(media_format.get("bit_rate"))
+    if bitrate is not None:
+        bitrate /= 8.0
+    elif duration and file_length:
+        bitrate = file_length / duration
+    if duration is None and bitrate is None:
+        return None
+    return MediaInfo(
+        container=media_format.get("format_name") or "",
+        duration=duration,
+        bitrate=bitrate,
+    )
+
+
+class MediaProbeCache(object):
+    def __init__(self, path=None):
+        self._state = SharedStateFile(path)
+
+    @staticmethod
+    def _key(info_hash, file_id):
+        return "{}:{}".format(info_hash.lower(), file_id)
+
+    def get(self, info_hash, file_id):
+        entry = self._state.load().get(self._key(info_hash, file_id))
+        if not isinstance(entry, dict):
+            return None
+        return MediaInfo(
+            container=entry.get("container", ""),
+            duration=entry.get("duration"),
+            bitrate=entry.get("bitrate"),
+        )
+
+    def put(self, info_hash, file_id, media):
+        key = self._key(info_hash, file_id)
+
+        def update(data):
+            # Re-insert so the dict order doubles as recency for trimming.
+            data.pop(key, None)
+            data[key] = dict(media._asdict())
+            while len(data) > MAX_ENTRIES:
+                data.pop(next(iter(data)))
+
+        self._state.update(update)
+
+
+class MediaProbe(object):
+    """Probe one file on a background thread; ``result`` never blocks.
+
+    ``file_length`` may also be set after ``start`` with ``set_file_length``,
+    so the probe can run alongside the stat call that reports it.
+    """
+
+    def __init__(self, api, cache, info_hash, file_id, file_length=None):
+        self._api = api
+        self._cache = cache
+        self._info_hash = info_hash
+        self._file_id = file_id
+        self._file_length = file_length
+        self._result = None
+        self._done = threading.Event()
+
+    def start(self):
+        self._result = self._cache.get(self._info_hash, self._file_id)
+        if self._result is not None:
+            self._done.set()
+            return self
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def set_file_length(self, file_length):
+        self._file_length = file_length
+
+    def _run(self):
+        try:
+            result = parse_ffprobe(
+                self._api.get_ffprobe(self._info_hash, self._file_id)
+            )
+        except TorrServerError as e:
+            logging.debug("ffprobe failed for %s/%s: %s", self._info_hash, self._file_id, e)
+            result = None
+        if result is not None:
+            self._cache.put(self._info_hash, self._file_id, result)
+            logging.info(
+                "Probed %s/%s: %s, %.0fs, %.0f kB/s",
+                self._info_hash,
+                self._file_id,
+                result.container,
+                result.duration or 0,
+                (result.bitrate or 0) / 1024.0,
+            )
+        self._result = result
+        self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=0):
+        """The ``MediaInfo`` once probed, or None while pending or on failure."""
+        self._done.wait(timeout)
+        result = self._result
+        if (
+            result is not None
+            and result.bitrate is None
+            and result.duration
+            and self._file_length
+        ):
+            result = result._replace(bitrate=self._file_length / result.duration)
+        return result
@@ -1,27 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
 import logging
 import os
-from threading import Thread
+import tempfile
 import time
 
 import requests
-from lib.torrserver.api import TorrServer, TorrServerError
+from lib.torrserver.api import TorrServerError
 import routing
-from xbmc import Monitor, executebuiltin, getInfoLabel, getCondVisibility, sleep
+from xbmc import (
+    PLAYLIST_VIDEO,
+    Monitor,
+    PlayList,
+    executebuiltin,
+    getInfoLabel,
+    getCondVisibility,
+    sleep,
+)
 from xbmcgui import ListItem, DialogProgress, Dialog
 from xbmcplugin import addDirectoryItem, endOfDirectory, setResolvedUrl
 
 from lib.buffering import (
     MAX_RETRIES_DEFAULT,
+    METADATA_POLL_SECONDS,
+    Ewma,
+    RateEstimator,
+    can_start_early,
     clamp_progress,
     is_retryable_error,
     backoff_seconds,
+    buffer_target_bytes,
     compute_buffering_progress,
+    estimate_eta,
+    file_length,
     is_preload_complete,
     is_resolving_metadata,
+    next_poll_interval,
+    piece_map_due,
+    wait_or_cancel,
 )
+from lib.client_factory import create_api
 from lib.dialog import DialogInsert
-from lib.episode_matching import match_episode_file
+from lib.episode_matching import match_episode_file, parse_episode
+from lib.known_hashes import STATE_FILE_NAME as KNOWN_HASHES_FILE_NAME
+from lib.known_hashes import KnownHashes
 from lib.kodi import (
+    ADDON_DATA,
     ADDON_PATH,
     ADDON_NAME,
     translate,
@@ -40,22 +64,48 @@ from lib.kodi_formats import (
     is_displayable,
     strip_common_folder_prefix,
 )
-from lib.player import JackTorrPlayer
+from lib.magnet import is_magnet, parse_info_hash
+from lib.media_probe import STATE_FILE_NAME as MEDIA_PROBE_FILE_NAME
+from lib.media_probe import MediaProbe, MediaProbeCache
+from lib.piece_map import PieceMap, file_span
+from lib.next_episode import NextEpisodePreloader
+from lib.player import JackTorrPlayer, PlaylistPlayer
+from lib.preload import PreloadManager
+from lib.race import Race, RaceEntry, select_candidates
+from lib.season import PreloadWindow, season_playlist
+from lib.status import LOG_INTERVAL, StatusLog, StatusPublisher
+from lib.warm_pool import STATE_FILE_NAME as WARM_POOL_FILE_NAME
+from lib.warm_pool import WarmPool
+from lib.prewarm import HEAD_BYTES as PREWARM_HEAD_BYTES
+from lib.prewarm import Prewarm
 from lib.search_history import load_history, add_search, clear_history
+from lib.startup import current_startup, startup_session
+from lib.torrent_cache import DIRECTORY_NAME as TORRENT_CACHE_DIRECTORY_NAME
+from lib.torrent_cache import TorrentCache
+from lib.torrent_file import DEFAULT_CHUNK_SIZE as TORRENT_CHUNK_SIZE
+from lib.torrent_file import TeeReader, TorrentFileError, parse_torrent
 from lib.settings import (
-    get_password,
-    get_service_host,
-    get_port,
+    early_start_enabled,
+    get_buffer_seconds,
     get_buffering_timeout,
+    get_early_start_margin,
     get_buffer_retries,
-    get_username,
+    get_connect_timeout,
+    get_read_timeout,
     show_status_overlay,
     get_min_candidate_size,
     ask_to_delete_torrent,
     get_files_order,
     hide_subfolder_components,
     get_metadata_timeout,
-    ssl_enabled,
+    get_next_episode_minutes,
+    get_next_episode_percent,
+    get_race_candidates,
+    get_season_preload_window,
+    get_warm_pool_size,
+    get_status_interval,
+    next_episode_enabled,
+    prewarm_enabled,
 )
 from lib.utils import sizeof_fmt
 
@@ -63,10 +113,15 @@ set_logger()
 plugin = routing.Plugin()
 
 
-api = TorrServer(
-    get_service_host(), get_port(), get_username(), get_password(), ssl_enabled()
-)
-logging.info("JackTorr api singleton created with base_url=%s", api._base_url)
+api = create_api()
+logging.info("JackTorr api singleton created with base_url=%s", api.base_url)
+known_hashes = KnownHashes(os.path.join(ADDON_DATA, KNOWN_HASHES_FILE_NAME))
+torrent_cache = TorrentCache(os.path.join(ADDON_DATA, TORRENT_CACHE_DIRECTORY_NAME))
+media_probes = MediaProbeCache(os.path.join(ADDON_DATA, MEDIA_PROBE_FILE_NAME))
+# Module state outlives one invocation (reuselanguageinvoker), so repeated
+# clicks join the preload already running.
+preloads = PreloadManager(api, connect_timeout=get_connect_timeout())
+warm_pool = WarmPool(os.path.join(ADDON_DATA, WARM_POOL_FILE_NAME))
 
 
 class PlayError(Exception):
@@ -87,7 +142,10 @@ class CanceledError(PlayError):
 def check_playable(func):
     def wrapper(*args, **kwargs):
         try:
-            func(*args, **kwargs)
+            # Playable routes call each other; the outermost one owns the
+            # startup timeline.
+            with startup_session(api.metrics):
+                func(*args, **kwargs)
         except Exception as e:
             if not getattr(e, "%_checked", False):
                 setResolvedUrl(plugin.handle, False, ListItem())
@@ -170,21 +228,42 @@ def get_state_string(state):
         return translate(30230)
 
 
-def get_status_labels(info_hash):
-    info = api.get_torrent_info(info_hash)
+def get_status_labels(snapshot):
+    if snapshot is None:
+        return translate(30278), ""
     return (
-        "{:s}".format(get_state_string(info.get("stat"))),
+        "{:s}".format(get_state_string(snapshot.stat)),
         "D:{:s}/s U:{:s}/s S:{:d} P:{:d}/{:d}".format(
-            sizeof_fmt(info.get("download_speed")),
-            sizeof_fmt(info.get("upload_speed")),
-            info.get("connected_seeders"),
-            info.get("active_peers"),
-            info.get("total_peers"),
+            sizeof_fmt(snapshot.download_speed),
+            sizeof_fmt(snapshot.upload_speed),
+            snapshot.seeders,
+            snapshot.active_peers,
+            snapshot.total_peers,
         ),
     )
 
 
-def handle_player_stop(info_hash, name, initial_delay=0.5, listing_timeout=10):
+def handle_player_start(info_hash, startup):
+    startup.finish()
+    # Streaming, so not a spare the service may keep alive or evict; stopping
+    # adds it back.
+    warm_pool.discard(info_hash)
+
+
+def handle_player_stop(
+    info_hash, name, file_id=None, status=None, initial_delay=0.5, listing_timeout=10
+):
+    if status is not None:
+        logging.info(
+            "Stopped %s with %s/%s loaded (%s)",
+            name,
+            sizeof_fmt(status.loaded_size),
+            sizeof_fmt(status.torrent_size),
+            " ".join(get_status_labels(status)),
+        )
+    if file_id is not None and get_warm_pool_size() > 0:
+        # The service keeps it connected in case playback resumes soon.
+        warm_pool.touch(info_hash, file_id)
     if not ask_to_delete_torrent():
         return
 
@@ -198,7 +277,10 @@ def handle_player_stop(info_hash, name, initial_delay=0.5, listing_timeout=10):
 
     remove_torrent = Dialog().yesno(translate(30242), translate(30241))
     if remove_torrent:
+        preloads.cancel(info_hash)
+        warm_pool.discard(info_hash)
         api.remove_torrent(info_hash)
+        known_hashes.discard(info_hash)
         current_folder = getInfoLabel("Container.FolderPath")
         if current_folder == plugin.url_for(torrent_files, info_hash):
             executebuiltin("Action(Back)")
@@ -235,8 +317,10 @@ def index():
 @plugin.route("/torrents")
 @check_directory
 def torrents():
-    for torrent in api.torrents():
+    listed_hashes = []
+    for torrent in api.iter_torrents(fields=("hash", "title", "poster", "stat")):
         info_hash = torrent.get("hash")
+        listed_hashes.append(info_hash)
 
         context_menu_items = [
             (translate(30235), media(play_info_hash, info_hash=info_hash))
@@ -275,6 +359,7 @@ def torrents():
             torrent_li,
             isFolder=True,
         )
+    known_hashes.replace(listed_hashes)
 
 
 @plugin.route("/torrents/<info_hash>/<action_str>")
@@ -282,9 +367,12 @@ def torrent_action(info_hash, action_str):
     needs_refresh = True
 
     if action_str == "drop":
+        warm_pool.discard(info_hash)
         api.drop_torrent(info_hash)
     elif action_str == "remove_torrent":
+        warm_pool.discard(info_hash)
         api.remove_torrent(info_hash)
+        known_hashes.discard(info_hash)
     elif action_str == "torrent_status":
         torrent_status(info_hash)
         needs_refresh = False
@@ -390,13 +478,153 @@ def search_results(query=None):
         item = list_item(label, "download.png")
         item.setProperty("IsPlayable", "true")
         context_menu_items = [
-            (translate(30254), media(play_magnet, magnet=magnet, poster=""))
+            (translate(30254), media(play_magnet, magnet=magnet, poster="")),
+            (translate(30268), media(race, query=query, magnet=magnet)),
         ]
         item.addContextMenuItems(context_menu_items)
         url = plugin.url_for(play_magnet, magnet=magnet, buffer=True, poster="")
         addDirectoryItem(plugin.handle, url, item, isFolder=False)
 
 
+@plugin.route("/race")
+@query_arg("query")
+@query_arg("magnet")
+@query_arg("season", required=False)
+@query_arg("episode", required=False)
+@check_playable
+def race(query, magnet, season="", episode=""):
+    try:
+        results = api.search(query)
+    except TorrServerError as e:
+        notification(str(e))
+        raise PlayError(str(e))
+    candidates = select_candidates(results, magnet, limit=get_race_candidates())
+    if len(candidates) < 2:
+        logging.info("Race: no look-alikes for %s, playing it directly", magnet)
+        play_magnet(magnet=magnet, season=season, episode=episode)
+        return
+
+    startup = current_startup()
+    with startup.phase("add"):
+        entries, created = add_race_entries(candidates)
+    if not entries:
+        notification(translate(30239))
+        raise PlayError("Race: no candidate could be added")
+
+    race_state = Race(
+        entries,
+        min_size=get_min_candidate_size() * 1024 * 1024,
+        season=season,
+        episode=episode,
+    )
+    winner = None
+    try:
+        with startup.phase("metadata"):
+            winner = run_race(race_state)
+    finally:
+        for entry in race_state.losers(winner):
+            preloads.cancel(entry.info_hash)
+            try:
+                if entry.info_hash in created:
+                    api.remove_torrent(entry.info_hash)
+                    known_hashes.discard(entry.info_hash)
+                else:
+                    api.drop_torrent(entry.info_hash)
+            except TorrServerError as e:
+                logging.warning("Race: failed to release %s: %s", entry.info_hash, e)
+
+    logging.info("Race: %s won with %s", winner.info_hash, winner.title)
+    startup.remember_info(winner.info_hash, winner.status)
+    # The file was chosen when its metadata resolved and is already preloaded.
+    start_playback(winner.info_hash, winner.file)
+
+
+def add_race_entries(candidates):
+    """Add the candidates concurrently; returns the entries and the hashes
+    the race created, the only losers that may be removed from the DB."""
+    try:
+        # Ask TorrServer: known_hashes misses torrents saved by other clients.
+        on_server = {
+            torrent["hash"].lower()
+            for torrent in api.iter_torrents(fields=("hash",))
+            if isinstance(torrent, dict) and torrent.get("hash")
+        }
+    except TorrServerError as e:
+        logging.warning("Race: cannot list torrents, keeping every loser: %s", e)
+        on_server = None
+
+    def add(result):
+        try:
+            return RaceEntry(result, api.add_magnet(result.get("Magnet")))
+        except TorrServerError as e:
+            logging.warning("Race: failed to add %s: %s", result.get("Magnet"), e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        entries = [entry for entry in executor.map(add, candidates) if entry]
+    for entry in entries:
+        known_hashes.add(entry.info_hash)
+    if on_server is None:
+        return entries, set()
+    created = {e.info_hash for e in entries if e.info_hash.lower() not in on_server}
+    return entries, created
+
+
+def run_race(race_state):
+    """Poll every entry until one is playable; returns the winning entry."""
+    close_busy_dialog()
+    monitor = Monitor()
+    timeout = get_metadata_timeout() + get_buffering_timeout()
+    start_time = time.time()
+    progress = DialogProgress()
+    progress.create(ADDON_NAME)
+    try:
+        while True:
+            running = race_state.running
+            if not running:
+                notification(translate(30239))
+                raise PlayError("Race: every candidate failed")
+            statuses = {
+                result.hash: result.info
+                for result in api.get_torrent_infos([e.info_hash for e in running])
+                if result.error is None
+            }
+            newly_resolved, winner = race_state.update(statuses)
+            for entry in newly_resolved:
+                preload_torrent(entry.info_hash, entry.file.get("id"))
+            if winner is not None:
+                return winner
+
+            lines = []
+            best = 0
+            for entry in race_state.entries:
+                status = entry.status
+                percent = compute_buffering_progress(
+                    status.get("preloaded_bytes", 0), status.get("preload_size", 0)
+                )
+                best = max(best, percent)
+                lines.append(
+                    "{} - {}%  {}/s  P:{}  {}".format(
+                        get_state_string(status.get("stat")),
+                        percent,
+                        sizeof_fmt(status.get("download_speed", 0)),
+                        status.get("active_peers", 0),
+                        entry.title[:40],
+                    )
+                )
+            progress.update(best, "\n".join(lines))
+
+            if progress.iscanceled():
+                raise PlayError("User canceled race")
+            if 0 < timeout < time.time() - start_time:
+                notification(translate(30236))
+                raise PlayError("Race timeout reached")
+            if monitor.waitForAbort(1):
+                raise PlayError("Abort requested")
+    finally:
+        progress.close()
+
+
 @plugin.route("/torrents/<info_hash>/files/<file_id>/<action_str>")
 def file_action(info_hash, file_id, action_str):
     if action_str == "download":
@@ -478,12 +706,104 @@ def torrent_files(info_hash):
                 context_menu_items.append(
                     (translate(30235), media(buffer_and_play, **kwargs))
                 )
+                if info_type == "video" and parse_episode(name) is not None:
+                    context_menu_items.append(
+                        (
+                            translate(30273),
+                            action(play_season, info_hash=info_hash, file_id=id),
+                        )
+                    )
 
         file_li.addContextMenuItems(context_menu_items)
 
         addDirectoryItem(plugin.handle, url, file_li)
 
 
+@plugin.route("/torrents/<info_hash>/play_season/<file_id>")
+def play_season(info_hash, file_id):
+    info = api.get_torrent_info(link=info_hash)
+    items = season_playlist(info.get("file_stats"), file_id, info.get("title") or "")
+    if not items:
+        notification(translate(30239))
+        return
+
+    # A context menu action, not a resolved route, so it opens the startup
+    # itself.
+    with startup_session(api.metrics) as startup:
+        # Only the first item buffers behind the dialog; the window preloads
+        # the following ones while the playlist plays.
+        first_id = items[0].get("id")
+        try:
+            with startup.phase("preload"):
+                preload_torrent(info_hash, first_id)
+                wait_for_buffering_completion(info_hash, first_id)
+        except PlayError as e:
+            preloads.cancel(info_hash, first_id)
+            logging.debug(e)
+            e.handle()
+            return
+
+        playlist = PlayList(PLAYLIST_VIDEO)
+        playlist.clear()
+        for item in items:
+            path = item.get("path")
+            url = api.get_stream_url(
+                link=info_hash, path=path, file_id=item.get("id")
+            )
+            list_item = ListItem(os.path.basename(path), path=url)
+            list_item.setProperty("no-ext-subs-scan", "true")
+            set_info_tag(list_item, "video", {"title": os.path.basename(path)})
+            if info.get("poster"):
+                list_item.setArt({"poster": info.get("poster")})
+            playlist.add(url, list_item)
+
+        window = PreloadWindow(
+            preloads, info_hash, items, size=get_season_preload_window()
+        )
+        # The overlay and the stop handler follow the item Kodi is playing.
+        playing = [items[0]]
+
+        def on_item(position):
+            if 0 <= position < len(items):
+                playing[0] = items[position]
+            window.move(position)
+
+        def playing_name():
+            return playing[0].get("path")
+
+        publisher = StatusPublisher(api, info_hash, interval=get_status_interval())
+        publisher.subscribe(
+            StatusLog(info.get("title") or info_hash), interval=LOG_INTERVAL
+        )
+        startup.begin("play")
+        try:
+            with PlaylistPlayer(
+                playlist,
+                on_item_handler=on_item,
+                status_publisher=publisher,
+                text_handler=(
+                    (lambda snapshot: get_status_labels(snapshot) + (playing_name(),))
+                    if show_status_overlay()
+                    else None
+                ),
+                on_close_handler=lambda: handle_player_stop(
+                    info_hash,
+                    name=playing_name(),
+                    file_id=playing[0].get("id"),
+                    status=publisher.latest,
+                ),
+                on_start_handler=lambda: handle_player_start(info_hash, startup),
+            ) as player:
+                player.play(playlist)
+                player.handle_events()
+        except Exception as e:
+            logging.error(
+                "Caught exception while playing season: %s", e, exc_info=True
+            )
+        finally:
+            window.close()
+
+
 @plugin.route("/display_picture/<info_hash>/<file_id>")
 @query_arg("path")
 def display_picture(info_hash, file_id, path):
@@ -493,10 +813,39 @@ def display_picture(info_hash, file_id, path):
 @plugin.route("/display_text/<info_hash>/<file_id>")
 @query_arg("path")
 def display_text(info_hash, file_id, path):
-    r = requests.get(api.get_stream_url(link=info_hash, path=path, file_id=file_id))
+    r = api.session.get(
+        api.get_stream_url(link=info_hash, path=path, file_id=file_id),
+        timeout=(get_connect_timeout(), get_read_timeout()),
+    )
     Dialog().textviewer(path, r.text)
 
 
+def is_on_server(info_hash):
+    """Whether a hash from ``known_hashes`` is still in TorrServer's DB.
+
+    The index goes stale when a torrent is removed in TorrServer's web UI or
+    lost with its DB; a hash TorrServer answers for with an error is
+    forgotten so the caller adds the torrent again. The answer carries the
+    file list, which the startup keeps so the replay needs no stat call.
+    """
+    if info_hash is None or info_hash not in known_hashes:
+        return False
+    try:
+        info = api.get_torrent_info_by_hash(info_hash)
+    except TorrServerError as e:
+        if e.status_code is None:
+            # Unreachable or slow: the entry may well be valid, keep it.
+            logging.warning("Could not check known torrent %s: %s", info_hash, e)
+        else:
+            logging.info("Known torrent %s is not on TorrServer: %s", info_hash, e)
+            known_hashes.discard(info_hash)
+        return False
+    startup = current_startup()
+    if startup is not None and info.get("file_stats"):
+        startup.remember_info(info_hash, info)
+    return True
+
+
 @plugin.route("/play_url")
 @query_arg("url")
 @query_arg("poster", required=False)
@@ -504,18 +853,87 @@ def display_text(info_hash, file_id, path):
 @query_arg("episode", required=False)
 @check_playable
 def play_url(url, buffer=True, poster="", season="", episode=""):
+    if is_magnet(url):
+        play_magnet(
+            magnet=url, buffer=buffer, poster=poster, season=season, episode=episode
+        )
+        return
+    cached_hash = torrent_cache.lookup(url)
+    with current_startup().phase("add"):
+        on_server = is_on_server(cached_hash)
+    if on_server:
+        play_info_hash(
+            info_hash=cached_hash, buffer=buffer, season=season, episode=episode
+        )
+        return
+    data = torrent_cache.get(cached_hash) if cached_hash else None
+    if data is not None:
+        play_torrent_file(
+            lambda: io.BytesIO(data),
+            buffer=buffer,
+            poster=poster,
+            season=season,
+            episode=episode,
+            on_added=lambda info_hash: torrent_cache.put(url, info_hash, data),
+        )
+        return
+
+    with current_startup().phase("add"):
+        try:
+            path, meta = download_torrent(url)
+        except requests.RequestException as e:
+            raise PlayError("Failed to download torrent: {}".format(e))
+
+    def on_added(info_hash):
+        with open(path, "rb") as file:
+            torrent_cache.put(url, info_hash, file)
+        # Playback blocks below; do not keep the download around for it.
+        remove_file(path)
+
     try:
-        with requests.get(url, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            info_hash = api.add_torrent_obj(r.raw, poster=poster)
-    except requests.RequestException as e:
-        raise PlayError("Failed to download torrent: {}".format(e))
-    play_info_hash(
-        info_hash=info_hash,
-        buffer=buffer,
-        season=season,
-        episode=episode,
-    )
+        play_torrent_file(
+            lambda: open(path, "rb"),
+            buffer=buffer,
+            poster=poster,
+            season=season,
+            episode=episode,
+            on_added=on_added,
+            meta=meta,
+        )
+    finally:
+        remove_file(path)
+
+
+def download_torrent(url):
+    """Download a .torrent to a temporary file, parsing it as it arrives.
+
+    Returns ``(path, meta)``; ``meta`` is None when the data is not a
+    readable metainfo file. The caller removes the file.
+    """
+    os.makedirs(ADDON_DATA, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".torrent.tmp", dir=ADDON_DATA)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            with api.session.get(url, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                stream = TeeReader(r.iter_content(TORRENT_CHUNK_SIZE), spool)
+                try:
+                    meta = parse_torrent(stream)
+                except TorrentFileError as e:
+                    logging.warning("Could not read downloaded torrent: %s", e)
+                    meta = None
+                stream.drain()
+    except BaseException:
+        remove_file(path)
+        raise
+    return path, meta
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 @plugin.route("/play_magnet")
@@ -525,7 +943,13 @@ def play_url(url, buffer=True, poster="", season="", episode=""):
 @query_arg("episode", required=False)
 @check_playable
 def play_magnet(magnet, buffer=True, poster="", season="", episode=""):
-    info_hash = api.add_magnet(magnet, poster=poster)
+    # Torrents already in TorrServer's DB are played by hash, saving the add
+    # round-trip; only unknown hashes are added.
+    info_hash = parse_info_hash(magnet)
+    with current_startup().phase("add"):
+        if not is_on_server(info_hash):
+            info_hash = api.add_magnet(magnet, poster=poster)
+            known_hashes.add(info_hash)
     play_info_hash(
         info_hash=info_hash,
         buffer=buffer,
@@ -539,8 +963,67 @@ def play_magnet(magnet, buffer=True, poster="", season="", episode=""):
 @query_arg("poster", required=False)
 @check_playable
 def play_file(path, buffer=True, poster=""):
-    info_hash = api.add_torrent(path, poster=poster)
-    play_info_hash(info_hash=info_hash, buffer=buffer)
+    play_torrent_file(lambda: open(path, "rb"), buffer=buffer, poster=poster)
+
+
+def play_torrent_file(
+    open_torrent,
+    buffer=True,
+    poster="",
+    season="",
+    episode="",
+    on_added=None,
+    meta=None,
+):
+    """Upload a .torrent while choosing the file from its local metainfo.
+
+    ``open_torrent`` returns a fresh binary file object on each call, one for
+    the upload and one for the parser unless ``meta`` was already parsed.
+    Falls back to TorrServer's file list when the metainfo cannot be read
+    locally. ``on_added`` is called with the infohash once TorrServer holds
+    the torrent.
+    """
+
+    def upload():
+        with open_torrent() as file:
+            return api.add_torrent_obj(file, poster=poster)
+
+    startup = current_startup()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending_upload = executor.submit(upload)
+        with startup.phase("choose"):
+            if meta is None:
+                try:
+                    with open_torrent() as file:
+                        meta = parse_torrent(file)
+                except (OSError, TorrentFileError) as e:
+                    logging.warning("Could not read torrent file locally: %s", e)
+            chosen_file = None
+            if meta is not None:
+                chosen_file = choose_file(
+                    meta.files, torrent_title=meta.name, season=season, episode=episode
+                )
+        # Only the part of the upload not hidden behind the choice is counted.
+        with startup.phase("add"):
+            try:
+                info_hash = pending_upload.result()
+            except TorrServerError as e:
+                notification(str(e))
+                raise PlayError(str(e))
+    known_hashes.add(info_hash)
+    if on_added is not None:
+        on_added(info_hash)
+
+    if meta is None or meta.info_hash != info_hash:
+        if meta is not None:
+            logging.warning(
+                "Local infohash %s does not match TorrServer's %s",
+                meta.info_hash,
+                info_hash,
+            )
+        play_info_hash(info_hash=info_hash, buffer=buffer, season=season, episode=episode)
+        return
+    start_playback(info_hash, chosen_file, buffer=buffer)
 
 
 @plugin.route("/play_info_hash")
@@ -549,16 +1032,41 @@ def play_file(path, buffer=True, poster=""):
 @query_arg("episode", required=False)
 @check_playable
 def play_info_hash(info_hash, buffer=True, season="", episode=""):
+    startup = current_startup()
+    with startup.phase("metadata"):
+        info = get_resolved_info(info_hash)
+
+    torrent_title = " ".join(str(info.get(key) or "") for key in ("title", "name"))
+    with startup.phase("choose"):
+        chosen_file = choose_file(
+            info.get("file_stats"),
+            torrent_title=torrent_title,
+            season=season,
+            episode=episode,
+        )
+    start_playback(info_hash, chosen_file, buffer=buffer)
+
+
+def get_resolved_info(info_hash):
+    """Torrent info with metadata, fetched once per startup."""
+    startup = current_startup()
+    info = startup.info_for(info_hash) if startup is not None else None
+    if info is not None:
+        return info
     try:
         info = api.get_torrent_info(info_hash)
     except TorrServerError as e:
         notification(str(e))
         raise PlayError(str(e))
-
     if info.get("stat") == 1:
-        wait_for_metadata(info_hash)
+        info = wait_for_metadata(info_hash)
+    if startup is not None:
+        startup.remember_info(info_hash, info)
+    return info
+
 
-    files = info.get("file_stats")
+def choose_file(files, torrent_title="", season="", episode=""):
+    """Pick the file to play, asking the user when the episode is unclear."""
     min_candidate_size = get_min_candidate_size() * 1024 * 1024
     candidate_files = [
         f
@@ -567,29 +1075,27 @@ def play_info_hash(info_hash, buffer=True, season="", episode=""):
     ]
     if not candidate_files:
         notification(translate(30239))
-        raise PlayError("No candidate files found for {}".format(info_hash))
+        raise PlayError("No candidate files found")
     elif len(candidate_files) == 1:
-        chosen_file = candidate_files[0]
-    else:
-        torrent_title = " ".join(
-            str(info.get(key) or "") for key in ("title", "name")
-        )
-        chosen_file = match_episode_file(
-            candidate_files,
-            season=season,
-            episode=episode,
-            torrent_title=torrent_title,
-        )
-        if chosen_file is None:
-            sort_files(candidate_files)
-            display_names = strip_common_folder_prefix(candidate_files)
-            chosen_index = Dialog().select(
-                translate(30240), display_names
-            )
-            if chosen_index < 0:
-                raise PlayError("User canceled dialog select")
-            chosen_file = candidate_files[chosen_index]
+        return candidate_files[0]
+
+    chosen_file = match_episode_file(
+        candidate_files,
+        season=season,
+        episode=episode,
+        torrent_title=torrent_title,
+    )
+    if chosen_file is None:
+        sort_files(candidate_files)
+        display_names = strip_common_folder_prefix(candidate_files)
+        chosen_index = Dialog().select(translate(30240), display_names)
+        if chosen_index < 0:
+            raise PlayError("User canceled dialog select")
+        chosen_file = candidate_files[chosen_index]
+    return chosen_file
 
+
+def start_playback(info_hash, chosen_file, buffer=True):
     if buffer:
         buffer_and_play(
             info_hash=info_hash,
@@ -613,6 +1119,7 @@ def wait_for_metadata(info_hash):
     progress = DialogProgress()
     progress.create(ADDON_NAME, translate(30237))
 
+    stalled_polls = 0
     try:
         while True:
             try:
@@ -622,10 +1129,24 @@ def wait_for_metadata(info_hash):
                 raise PlayError(str(e))
 
             if info.get("stat") != 1:
-                break
-
-            if monitor.waitForAbort(0.5):
+                return info
+            active_peers = info.get("active_peers", 0)
+            stalled_polls = stalled_polls + 1 if active_peers <= 0 else 0
+
+            # Metadata arrives from peers, so back off only while there are none.
+            if wait_or_cancel(
+                monitor,
+                next_poll_interval(
+                    None,
+                    active_peers=active_peers,
+                    stalled_polls=stalled_polls,
+                    default=METADATA_POLL_SECONDS,
+                ),
+                progress.iscanceled,
+            ):
                 raise PlayError("Abort requested")
+            if progress.iscanceled():
+                raise CanceledError("User canceled metadata", info_hash, "")
             passed_time = time.time() - start_time
             if 0 < timeout:
                 if timeout < passed_time:
@@ -635,8 +1156,6 @@ def wait_for_metadata(info_hash):
             else:
                 percent = 0 if percent == 100 else (percent + 5)
             progress.update(percent)
-            if progress.iscanceled():
-                raise CanceledError("User canceled metadata", info_hash, "")
     finally:
         progress.close()
 
@@ -647,83 +1166,85 @@ def wait_for_metadata(info_hash):
 @query_arg("path")
 @check_playable
 def buffer_and_play(info_hash, file_id, path):
-    preload_torrent(info_hash, file_id)
-    try:
-        info = api.get_torrent_info(info_hash)
-    except TorrServerError as e:
-        notification(str(e))
-        raise PlayError(str(e))
-
-    if info.get("stat") == 1:
-        wait_for_metadata(info_hash)
-    wait_for_buffering_completion(info_hash, file_id)
+    startup = current_startup()
+    if warm_pool.is_warm(info_hash, file_id):
+        # The service kept the torrent connected with this file preloaded.
+        logging.info("Playing warm torrent %s without buffering", info_hash)
+        with startup.phase("preload"):
+            info = get_resolved_info(info_hash)
+        play(info_hash=info_hash, file_id=file_id, path=path, poster=info.get("poster"))
+        return
+    with startup.phase("preload"):
+        # The hash and file are known, so the preload and the media probe
+        # start before the stat call and overlap it; the buffering poll
+        # joins them.
+        preload_torrent(info_hash, file_id)
+        probe = MediaProbe(api, media_probes, info_hash, file_id).start()
+        try:
+            info = get_resolved_info(info_hash)
+            probe.set_file_length(file_length(info, file_id))
+            index = Prewarm(api, info_hash, file_id) if prewarm_enabled() else None
+            wait_for_buffering_completion(
+                info_hash, file_id, probe=probe, prewarm=index
+            )
+        except PlayError:
+            preloads.cancel(info_hash, file_id)
+            raise
     poster = info.get("poster")
     play(info_hash=info_hash, file_id=file_id, path=path, poster=poster)
 
 
 def preload_torrent(info_hash, file_id):
-    thread = Thread(target=api.preload_torrent, args=(info_hash, file_id))
-    thread.start()
+    """Preload one file; preloads of the torrent's other files are cancelled."""
+    preloads.cancel(info_hash, keep=file_id)
+    return preloads.start(info_hash, file_id)
+
 
+def wait_for_buffering_completion(info_hash, file_id, probe=None, prewarm=None):
+    """Poll until the start buffer is readable, showing progress.
 
-def wait_for_buffering_completion(info_hash, file_id):
+    ``prewarm`` (not started) is started once the head is readable; the
+    dialog then stays up until it finished.
+    """
     close_busy_dialog()
     monitor = Monitor()
-    initial_retry_count = 0
-    while True:
-        try:
-            info = api.get_torrent_file_info(info_hash, file_id)
-            break
-        except TorrServerError as e:
-            retryable = is_retryable_error(e)
-            if retryable and initial_retry_count < MAX_RETRIES_DEFAULT:
-                initial_retry_count += 1
-                backoff = backoff_seconds(initial_retry_count - 1)
-                logging.warning(
-                    "Initial buffering info error (retry %d/%d): %s, backing off %.1fs",
-                    initial_retry_count,
-                    MAX_RETRIES_DEFAULT,
-                    e,
-                    backoff,
-                )
-                if monitor.waitForAbort(backoff):
-                    api.drop_torrent(info_hash)
-                    raise PlayError("Abort requested")
-                continue
-            if retryable:
-                logging.error(
-                    "Initial buffering info error exhausted after %d retries: %s",
-                    MAX_RETRIES_DEFAULT,
-                    e,
-                )
-            notification(str(e))
-            api.drop_torrent(info_hash)
-            raise PlayError(str(e))
-
     of = translate(30244)
     timeout = get_buffering_timeout()
     retries = get_buffer_retries()
     retry_count = 0
     start_time = time.time()
+    rate = RateEstimator()
+    stalled_polls = 0
+    early_start = early_start_enabled()
+    early_start_margin = get_early_start_margin()
+    speed_ewma = Ewma()
+    buffer_seconds = get_buffer_seconds()
+    piece_state_supported = True
+    pieces = None
+    pieces_at = None
 
     progress = DialogProgress()
     progress.create(ADDON_NAME)
 
     try:
-        name = info.get("name", "")
+        name = ""
+        polled = False
         while True:
             current_time = time.time()
             try:
                 status = api.get_torrent_file_info(info_hash, file_id)
             except TorrServerError as e:
                 retryable = is_retryable_error(e)
-                if retryable and retry_count < retries:
+                # The first poll gets the default retries even when the
+                # setting allows none.
+                limit = retries if polled else max(retries, MAX_RETRIES_DEFAULT)
+                if retryable and retry_count < limit:
                     retry_count += 1
                     backoff = backoff_seconds(retry_count - 1)
                     logging.warning(
                         "Buffering polling error (retry %d/%d): %s, backing off %.1fs",
                         retry_count,
-                        retries,
+                        limit,
                         e,
                         backoff,
                     )
@@ -731,19 +1252,22 @@ def wait_for_buffering_completion(info_hash, file_id):
                         0,
                         "Retrying {}/{}...\n{}\n{}".format(
                             retry_count,
-                            retries,
+                            limit,
                             e,
                             name,
                         ),
                     )
-                    if monitor.waitForAbort(backoff):
+                    if wait_or_cancel(monitor, backoff, progress.iscanceled):
                         api.drop_torrent(info_hash)
                         raise PlayError("Abort requested")
+                    if progress.iscanceled():
+                        api.drop_torrent(info_hash)
+                        raise CanceledError("User canceled buffering", info_hash, name)
                     continue
                 if retryable:
                     logging.error(
                         "Buffering polling error exhausted after %d retries: %s",
-                        retries,
+                        limit,
                         e,
                     )
                 notification(str(e))
@@ -751,6 +1275,7 @@ def wait_for_buffering_completion(info_hash, file_id):
                 raise PlayError(str(e))
 
             retry_count = 0
+            polled = True
 
             preloaded_bytes = status.get("preloaded_bytes", 0)
             preload_size = status.get("preload_size", 0)
@@ -760,40 +1285,116 @@ def wait_for_buffering_completion(info_hash, file_id):
             speed = status.get("download_speed", 0)
             name = status.get("name") or name
 
-            if is_preload_complete(preloaded_bytes, preload_size):
+            media = probe.result() if probe is not None else None
+            bitrate = media.bitrate if media is not None else None
+            target_size = buffer_target_bytes(bitrate, buffer_seconds, preload_size)
+
+            span = file_span(status.get("file_stats"), file_id)
+            if (
+                piece_state_supported
+                and span
+                and not is_resolving_metadata(preload_size)
+                and piece_map_due(
+                    preloaded_bytes, target_size, pieces_at, time.monotonic()
+                )
+            ):
+                # Between reads the last map stands in; it can only lag
+                # behind, and near the target it is read on every poll.
+                pieces_at = time.monotonic()
+                try:
+                    pieces = PieceMap.from_cache_state(api.get_cache(info_hash))
+                except TorrServerError as e:
+                    # An HTTP error means the server has no usable /cache.
+                    piece_state_supported = e.status_code is None
+                    pieces = None
+                    logging.debug("Piece state unavailable: %s", e)
+
+            if pieces is not None:
+                # The start buffer is the contiguous head; the tail index is
+                # a separate gate and does not count towards it.
+                target_size = min(target_size, span[1])
+                buffered_bytes = pieces.head_bytes(*span)
+                tail_ready = pieces.tail_ready(*span)
+            else:
+                buffered_bytes = preloaded_bytes
+                tail_ready = True
+            if prewarm is not None and not prewarm.started:
+                if buffered_bytes >= min(PREWARM_HEAD_BYTES, target_size):
+                    prewarm.start()
+            index_ready = prewarm is None or prewarm.done
+            buffered = is_preload_complete(buffered_bytes, target_size) and tail_ready
+            if buffered and index_ready:
                 break
 
+            download_rate = rate.update(preloaded_bytes, time.monotonic())
+            eta = None
+            if not is_resolving_metadata(preload_size):
+                eta = estimate_eta(target_size - buffered_bytes, download_rate)
+            stalled_polls = stalled_polls + 1 if not download_rate else 0
+
+            if early_start:
+                average_speed = speed_ewma.update(speed)
+                # Needs the probed bitrate: a guessed duration underestimates
+                # the bitrate of short files and would start too soon.
+                if bitrate and tail_ready and index_ready and can_start_early(
+                    buffered_bytes,
+                    file_length(status, file_id),
+                    bitrate,
+                    average_speed,
+                    margin=early_start_margin,
+                ):
+                    logging.info(
+                        "Starting early at %s of %s: %s/s against %s/s bitrate",
+                        sizeof_fmt(buffered_bytes),
+                        sizeof_fmt(target_size),
+                        sizeof_fmt(average_speed),
+                        sizeof_fmt(bitrate),
+                    )
+                    break
+
             buffering_progress = clamp_progress(
-                compute_buffering_progress(preloaded_bytes, preload_size)
+                compute_buffering_progress(buffered_bytes, target_size)
             )
             dialog_text = "{} - {:.2f}%\n{} {} {} - {}/s S:{} P:{}/{}\n{}\n".format(
                 get_state_string(status.get("stat")),
                 buffering_progress,
-                sizeof_fmt(preloaded_bytes),
+                sizeof_fmt(buffered_bytes),
                 of,
-                sizeof_fmt(preload_size),
+                sizeof_fmt(target_size),
                 sizeof_fmt(speed),
                 seeds,
                 peers,
                 total_peers,
                 name,
             )
+            if bitrate and target_size:
+                dialog_text += "{:.0f}s {} {:.0f}s\n".format(
+                    buffered_bytes / bitrate, of, target_size / bitrate
+                )
+            if pieces is not None:
+                dialog_text += pieces.bar(*span) + "\n"
             if is_resolving_metadata(preload_size):
                 dialog_text = "Resolving metadata...\n" + dialog_text
                 buffering_progress = 0
+            elif buffered:
+                dialog_text = translate(30277) + "\n" + dialog_text
 
             progress.update(buffering_progress, dialog_text)
 
-            if progress.iscanceled():
-                api.drop_torrent(info_hash)
-                raise CanceledError("User canceled buffering", info_hash, name)
             if 0 < timeout < current_time - start_time:
                 notification(translate(30236))
                 api.drop_torrent(info_hash)
                 raise PlayError("Buffering timeout reached")
-            if monitor.waitForAbort(1):
+            if wait_or_cancel(
+                monitor,
+                next_poll_interval(eta, active_peers=peers, stalled_polls=stalled_polls),
+                progress.iscanceled,
+            ):
                 api.drop_torrent(info_hash)
                 raise PlayError("Abort requested")
+            if progress.iscanceled():
+                api.drop_torrent(info_hash)
+                raise CanceledError("User canceled buffering", info_hash, name)
     finally:
         progress.close()
 
@@ -816,17 +1417,37 @@ def play(info_hash, file_id, path, poster=""):
     # so the "directory" scan resolves to the media itself and stalls playback.
     # Workaround for xbmc/xbmc#28490 (regression from xbmc/xbmc#28275).
     item.setProperty("no-ext-subs-scan", "true")
+    startup = current_startup()
+    startup.begin("play")
     setResolvedUrl(plugin.handle, True, item)
 
+    publisher = StatusPublisher(api, info_hash, interval=get_status_interval())
+    publisher.subscribe(StatusLog(name), interval=LOG_INTERVAL)
     try:
         with JackTorrPlayer(
+            status_publisher=publisher,
             text_handler=(
-                (lambda: get_status_labels(info_hash) + (name,))
+                (lambda snapshot: get_status_labels(snapshot) + (name,))
                 if show_status_overlay()
                 else None
             ),
-            on_close_handler=lambda: handle_player_stop(info_hash, name=name),
+            on_close_handler=lambda: handle_player_stop(
+                info_hash, name=name, file_id=file_id, status=publisher.latest
+            ),
+            on_start_handler=lambda: handle_player_start(info_hash, startup),
         ) as player:
+            if next_episode_enabled() and parse_episode(path) is not None:
+                player.add_tick_handler(
+                    NextEpisodePreloader(
+                        api,
+                        preloads,
+                        player,
+                        info_hash,
+                        path,
+                        percent=get_next_episode_percent(),
+                        minutes_left=get_next_episode_minutes(),
+                    )
+                )
             player.handle_events(url=serve_url)
     except Exception as e:
         logging.error("Caught exception while playing file: %s", e, exc_info=True)
@@ -837,9 +1458,9 @@ def dialog_insert():
     window = DialogInsert("DialogInsert.xml", ADDON_PATH, "Default")
     window.doModal()
     if window.type == DialogInsert.TYPE_URL:
-        api.add_magnet(window.ret_val)
+        known_hashes.add(api.add_magnet(window.ret_val))
     elif window.type == DialogInsert.TYPE_PATH:
-        api.add_torrent(window.ret_val)
+        known_hashes.add(api.add_torrent(window.ret_val))
     else:
         return
     notification(translate(30243), time=2000)
@@ -851,3 +1472,6 @@ def run():
     except Exception as e:
         logging.error("Caught exception:", exc_info=True)
         notification(str(e))
+    finally:
+        # Most invocations are too short for the periodic dump.
+        api.metrics.dump()
@@ -0,0 +1,107 @@
+"""Preload the next episode of a torrent while the current one plays.
+
+``NextEpisodePreloader`` runs on the player's watchdog tick, reading only
+Kodi's playback position and cache, so it costs no TorrServer requests
+until the preload is due. Once playback passes ``percent`` of the file, or has ``minutes_left``
+minutes to go, it looks up the following episode in the torrent and
+preloads it. The preload competes with the playing stream for the same
+swarm, so it only runs while Kodi holds ``min_buffer_seconds`` of the
+current file ahead of the play position and is cancelled when that drops.
+"""
+
+import logging
+
+from lib.episode_matching import next_episode_file
+from lib.preload import DONE
+from lib.torrserver.api import TorrServerError
+
+
+DEFAULT_PERCENT = 80
+DEFAULT_MINUTES_LEFT = 5
+MIN_BUFFER_SECONDS = 30
+# Resume only with twice the minimum so a buffer hovering around the minimum
+# does not start and cancel the preload on every tick.
+RESUME_BUFFER_FACTOR = 2
+
+
+class NextEpisodePreloader(object):
+    def __init__(
+        self,
+        api,
+        preloads,
+        player,
+        info_hash,
+        path,
+        percent=DEFAULT_PERCENT,
+        minutes_left=DEFAULT_MINUTES_LEFT,
+        min_buffer_seconds=MIN_BUFFER_SECONDS,
+    ):
+        self._api = api
+        self._preloads = preloads
+        self._player = player
+        self._info_hash = info_hash
+        self._path = path
+        self._percent = percent
+        self._minutes_left = minutes_left
+        self._min_buffer_seconds = min_buffer_seconds
+        self._target = None
+        self._task = None
+        self._finished = False
+
+    @property
+    def target(self):
+        """The next episode's file once it was looked up."""
+        return self._target
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def is_due(self, elapsed, total):
+        if total <= 0:
+            return False
+        if self._percent and elapsed >= total * self._percent / 100.0:
+            return True
+        return bool(self._minutes_left) and total - elapsed <= self._minutes_left * 60
+
+    def __call__(self):
+        if self._finished:
+            return
+        elapsed, total = self._player.playback_position()
+        if self._task is None and not self.is_due(elapsed, total):
+            return
+        if self._target is None and not self._find_target():
+            return
+
+        buffered = self._player.buffered_seconds()
+        if self._task is not None:
+            if self._task.state == DONE:
+                logging.info("Next episode %s is preloaded", self._target.get("path"))
+                self._finished = True
+            elif buffered < self._min_buffer_seconds:
+                logging.info(
+                    "Pausing next episode preload, %.0fs buffered ahead", buffered
+                )
+                self._preloads.cancel(self._info_hash, self._target.get("id"))
+                self._task = None
+            elif not self._task.active:
+                # Failed: try again on the next tick.
+                self._task = None
+        elif buffered >= self._min_buffer_seconds * RESUME_BUFFER_FACTOR:
+            logging.info("Preloading next episode %s", self._target.get("path"))
+            self._task = self._preloads.start(self._info_hash, self._target.get("id"))
+
+    def _find_target(self):
+        try:
+            info = self._api.get_torrent_info(self._info_hash)
+        except TorrServerError as e:
+            logging.debug("Next episode lookup of %s failed: %s", self._info_hash, e)
+            return False
+        self._target = next_episode_file(
+            info.get("file_stats") or [], self._path, info.get("title") or ""
+        )
+        if self._target is None:
+            logging.debug("No episode after %s", self._path)
+            self._finished = True
+            return False
+        return True
@@ -15,6 +15,7 @@ class OverlayText(object):
         self._shown = False
         self._lock = Lock()
         self._closed = False
+        self._labels = [None, None, None]
 
         logging.debug("Using window width=%d and height=%d", window_width, window_height)
         total_label_h = 3 * label_h
@@ -59,9 +60,13 @@ class OverlayText(object):
 
     def set_text(self, label1=None, label2=None, label3=None):
         with self._lock:
-            for label, control in ((label1, self._label1), (label2, self._label2), (label3, self._label3)):
-                if label is not None:
+            for index, (label, control) in enumerate(
+                ((label1, self._label1), (label2, self._label2), (label3, self._label3))
+            ):
+                # setLabel redraws the control, skip labels that did not change
+                if label is not None and label != self._labels[index]:
                     control.setLabel(label)
+                    self._labels[index] = label
 
     def close(self):
         with self._lock:
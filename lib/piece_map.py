@@ -0,0 +1,128 @@
+"""Per-file piece availability from TorrServer's cache state.
+
+``POST /cache {"action": "get"}`` reports the pieces held in TorrServer's
+cache. Aggregate ``preloaded_bytes`` cannot tell a readable head from
+scattered pieces; this module maps the pieces onto one file's byte range to
+find how much of it is readable contiguously from the start, and whether the
+trailing index region MKV/MP4 players seek to is there.
+"""
+
+# Players read container indexes (MKV Cues, MP4 moov) from the last bytes of
+# the file before playing.
+INDEX_TAIL_BYTES = 1024 * 1024
+BAR_WIDTH = 30
+
+
+def file_span(files, file_id):
+    """(offset, length) of ``file_id`` within the torrent, None if unknown.
+
+    Files are laid out back to back in id order, so the offset is the sum of
+    the lengths of the files before it.
+    """
+    offset = 0
+    for file in sorted(files or (), key=lambda f: f.get("id", 0)):
+        length = file.get("length") or 0
+        if str(file.get("id")) == str(file_id):
+            return offset, length
+        offset += length
+    return None
+
+
+class PieceMap(object):
+    def __init__(self, piece_length, pieces):
+        self.piece_length = piece_length
+        self._pieces = pieces
+
+    @classmethod
+    def from_cache_state(cls, state):
+        """Build from a /cache response, None when it carries no piece data."""
+        if not isinstance(state, dict):
+            return None
+        piece_length = state.get("PiecesLength")
+        if not piece_length or piece_length <= 0:
+            return None
+        pieces = {}
+        for key, piece in (state.get("Pieces") or {}).items():
+            if not isinstance(piece, dict):
+                continue
+            try:
+                index = int(piece.get("Id", key))
+            except (TypeError, ValueError):
+                continue
+            size = piece.get("Size") or 0
+            length = piece.get("Length") or piece_length
+            pieces[index] = 1.0 if piece.get("Completed") else min(size / length, 1.0)
+        return cls(piece_length, pieces)
+
+    def fill(self, index):
+        """Fraction of piece ``index`` in the cache, 1.0 once verified."""
+        return self._pieces.get(index, 0.0)
+
+    def is_complete(self, index):
+        return self.fill(index) >= 1.0
+
+    def is_present(self, index):
+        return index in self._pieces
+
+    def _pieces_of(self, offset, length):
+        if length <= 0:
+            return range(0)
+        return range(
+            offset // self.piece_length, (offset + length - 1) // self.piece_length + 1
+        )
+
+    def head_bytes(self, offset, length):
+        """Bytes readable contiguously from the start of the span."""
+        end = offset + length
+        position = offset
+        index = offset // self.piece_length
+        while position < end and self.is_complete(index):
+            index += 1
+            position = min(index * self.piece_length, end)
+        return position - offset
+
+    def tail_bytes(self, offset, length):
+        """Bytes readable contiguously backwards from the end of the span."""
+        end = offset + length
+        position = end
+        index = (end - 1) // self.piece_length
+        while position > offset and self.is_complete(index):
+            position = max(index * self.piece_length, offset)
+            index -= 1
+        return end - position
+
+    def readable_bytes(self, offset, length):
+        """Head plus tail bytes; scattered pieces in between do not count."""
+        return min(
+            self.head_bytes(offset, length) + self.tail_bytes(offset, length), length
+        )
+
+    def tail_ready(self, offset, length, tail=INDEX_TAIL_BYTES):
+        """Whether the index region at the end of the span is readable.
+
+        Only gates once TorrServer has started fetching that region, so a
+        server that does not preload the tail never blocks playback.
+        """
+        tail = min(tail, length)
+        start = offset + length - tail
+        if not any(self.is_present(i) for i in self._pieces_of(start, tail)):
+            return True
+        return self.tail_bytes(offset, length) >= tail
+
+    def bar(self, offset, length, width=BAR_WIDTH):
+        """ASCII availability of the span: ``#`` complete, ``+`` partial."""
+        if length <= 0:
+            return ""
+        cells = []
+        for cell in range(width):
+            start = offset + length * cell // width
+            end = offset + length * (cell + 1) // width
+            pieces = self._pieces_of(start, max(end - start, 1))
+            fills = [self.fill(index) for index in pieces]
+            if all(fill >= 1.0 for fill in fills):
+                cells.append("#")
+            elif any(fill > 0 for fill in fills):
+                cells.append("+")
+            else:
+                cells.append(".")
+        return "[{}]".format("".join(cells))
@@ -1,5 +1,4 @@
 import logging
-import threading
 import time
 
 import xbmc
@@ -20,6 +19,13 @@ def _execute_callback(callback):
         )
 
 
+def _percent_label(label):
+    try:
+        return float(xbmc.getInfoLabel(label).rstrip("%") or 0)
+    except ValueError:
+        return 0.0
+
+
 class PlayerTimeoutError(Exception):
     pass
 
@@ -28,69 +34,141 @@ class PlayerUrlError(Exception):
     pass
 
 
-class Player(object):
-    def __init__(self, url=None):
+# Playback events come from Kodi's callbacks. The loop in handle_events only
+# wakes up this often, to catch missed events and to enforce the start timeout.
+WATCHDOG_PERIOD = 2.0
+
+
+class Player(xbmc.Player):
+    """Drive the on_playback_* callbacks from Kodi's player events.
+
+    Kodi delivers the callbacks to the thread that created the player while
+    it waits in ``Monitor.waitForAbort``, so ``handle_events`` waits with a
+    long period and the events run in between.
+    """
+
+    def __init__(self, url=None, watchdog_period=WATCHDOG_PERIOD):
         super(Player, self).__init__()
         self._monitor = xbmc.Monitor()
-        self._player = xbmc.Player()
-
-    def handle_events(self, url=None, timeout=60, period=0.2):
+        self._watchdog_period = watchdog_period
+        self._url = url
+        self._started = False
+        self._finished = False
+        self._paused = False
+        self._error = None
+        self.wakeups = 0
+
+    def handle_events(self, url=None, timeout=60):
+        self._url = url
         start_time = time.time()
-        while True:
+        while not self._finished:
+            if self._monitor.waitForAbort(self._watchdog_period):
+                logging.debug("Received abort request. Aborting...")
+                if self._started:
+                    _execute_callback(self.on_abort_requested)
+                return
+            self.wakeups += 1
+            self._watchdog(start_time, timeout)
+            if self._started and not self._finished:
+                _execute_callback(self.on_playback_tick)
+        if self._error is not None:
+            raise self._error
+
+    def _watchdog(self, start_time, timeout):
+        if self._finished:
+            return
+        if not self._started:
             if self.is_active():
-                if not url:
-                    break
-                playing_file = self.get_playing_file()
-                if playing_file == url:
-                    break
-                elif playing_file:
-                    raise PlayerUrlError(
-                        "Expecting url '%s' but found '%s'. Aborting...",
-                        url,
-                        playing_file,
+                # Older Kodi versions or a missed onAVStarted.
+                self._playback_started()
+            elif 0 < timeout < time.time() - start_time:
+                self._fail(
+                    PlayerTimeoutError(
+                        "Player did not start after {} seconds".format(timeout)
                     )
-
-            if 0 < timeout < time.time() - start_time:
-                raise PlayerTimeoutError(
-                    "Player did not start after {} seconds".format(timeout)
                 )
-            if self._monitor.waitForAbort(0.5):
-                logging.debug("Received abort request. Aborting...")
-                return
+        elif not self.is_active() or not self._is_our_file():
+            self._playback_stopped()
+
+    def _is_our_file(self):
+        return not self._url or self.get_playing_file() == self._url
+
+    def _fail(self, error):
+        self._error = error
+        self._finished = True
+
+    def _playback_started(self):
+        if self._started or self._finished:
+            return
+        playing_file = self.get_playing_file()
+        if self._url and playing_file and playing_file != self._url:
+            self._fail(
+                PlayerUrlError(
+                    "Expecting url '{}' but found '{}'. Aborting...".format(
+                        self._url, playing_file
+                    )
+                )
+            )
+            return
+        self._started = True
+        _execute_callback(self.on_playback_started)
 
-        current_event = 0
-        events = [
-            (0, self.is_playing, self.on_playback_resumed),
-            (1, self.is_paused, self.on_playback_paused),
-        ]
+    def _playback_stopped(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._started:
+            _execute_callback(self.on_playback_stopped)
 
-        _execute_callback(self.on_playback_started)
-        while self.is_active() and (not url or self.get_playing_file() == url):
-            for event, handle, callback in events:
-                if handle():
-                    if current_event != event:
-                        current_event = event
-                        _execute_callback(callback)
-                    break
-            if self._monitor.waitForAbort(period):
-                _execute_callback(self.on_abort_requested)
-                return
+    # Kodi callbacks
 
-        _execute_callback(self.on_playback_stopped)
+    def onAVStarted(self):
+        self._playback_started()
 
-    def get_playing_file(self):
-        return self._player.getPlayingFile()
+    def onPlayBackPaused(self):
+        if self._started and not self._finished and not self._paused:
+            self._paused = True
+            _execute_callback(self.on_playback_paused)
 
-    def is_active(self):
-        return self._player.isPlaying()
+    def onPlayBackResumed(self):
+        if self._started and not self._finished and self._paused:
+            self._paused = False
+            _execute_callback(self.on_playback_resumed)
+
+    def onPlayBackStopped(self):
+        self._playback_stopped()
 
-    @staticmethod
-    def is_paused():
-        return xbmc.getCondVisibility("Player.Paused")
+    def onPlayBackEnded(self):
+        self._playback_stopped()
 
-    @staticmethod
-    def is_playing():
-        return xbmc.getCondVisibility("Player.Playing")
+    def onPlayBackError(self):
+        if not self._started:
+            logging.warning("Kodi failed to play %s", self._url)
+        self._playback_stopped()
+
+    def get_playing_file(self):
+        try:
+            return self.getPlayingFile()
+        except RuntimeError:
+            # Raised by Kodi when nothing is playing.
+            return ""
+
+    def is_active(self):
+        return self.isPlaying()
+
+    def playback_position(self):
+        """(elapsed, total) seconds of the playing file, zeros when idle."""
+        try:
+            return self.getTime(), self.getTotalTime()
+        except RuntimeError:
+            return 0.0, 0.0
+
+    def buffered_seconds(self):
+        """Seconds of Kodi's stream cache ahead of the play position."""
+        _, total = self.playback_position()
+        progress = _percent_label("Player.Progress")
+        cached = _percent_label("Player.ProgressCache")
+        return max(cached - progress, 0.0) * total / 100.0
 
     def on_playback_started(self):
         pass
@@ -104,60 +182,138 @@ class Player(object):
     def on_playback_stopped(self):
         pass
 
+    def on_playback_tick(self):
+        """Called every watchdog period while playing."""
+
     def on_abort_requested(self):
         pass
 
 
 class JackTorrPlayer(Player):
-    def __init__(self, text_handler=None, on_close_handler=None):
+    """Player with the status overlay shown while paused.
+
+    ``status_publisher`` is started with the playback and feeds the overlay
+    while it is shown; ``text_handler`` turns its latest snapshot (None
+    before the first sample) into the overlay's labels.
+    """
+
+    def __init__(
+        self,
+        status_publisher=None,
+        text_handler=None,
+        on_close_handler=None,
+        on_start_handler=None,
+    ):
         super(JackTorrPlayer, self).__init__()
-        self._stopped = False
+        self._status_publisher = status_publisher
         self._text_handler = text_handler
         self._on_close_handler = on_close_handler
-        self._overlay = self._overlay_thread = None
+        self._on_start_handler = on_start_handler
+        self._tick_handlers = []
+        self._overlay = None
+
+    def add_tick_handler(self, handler):
+        """Call ``handler()`` every watchdog period while playing."""
+        self._tick_handlers.append(handler)
 
     # noinspection PyAttributeOutsideInit
     def on_playback_started(self):
+        if self._on_start_handler:
+            self._on_start_handler()
         if self._text_handler:
             self._overlay = OverlayText()
-            self._overlay_thread = threading.Thread(target=self._overlay_updater)
-            self._overlay_thread.daemon = True
-            self._overlay_thread.start()
+        if self._status_publisher is not None:
+            self._status_publisher.start()
 
     def on_playback_paused(self):
         if self._overlay:
             self._overlay.show()
-            self._update_overlay_text()
+            self._update_overlay_text(self._latest_status())
+            if self._status_publisher is not None:
+                # Sample while the overlay is shown, starting right away.
+                self._status_publisher.subscribe(self._on_status)
+                self._status_publisher.request_sample()
 
     def on_playback_resumed(self):
         if self._overlay:
             self._overlay.hide()
+            if self._status_publisher is not None:
+                self._status_publisher.unsubscribe(self._on_status)
+
+    def on_playback_tick(self):
+        for handler in self._tick_handlers:
+            handler()
 
     def on_abort_requested(self):
-        self._stopped = True
-        
+        self._stop_status(wait=False)
+
     def on_playback_stopped(self):
-        self._stopped = True
+        self._stop_status(wait=False)
         if self._on_close_handler:
             self._on_close_handler()
 
-    def _update_overlay_text(self):
-        self._overlay.set_text(*self._text_handler())
+    def _latest_status(self):
+        if self._status_publisher is None:
+            return None
+        return self._status_publisher.latest
+
+    def _on_status(self, snapshot):
+        if self._overlay.shown:
+            self._update_overlay_text(snapshot)
 
-    def _overlay_updater(self):
-        while not self._stopped:
-            if self._overlay.shown:
-                self._update_overlay_text()
-            if self._monitor.waitForAbort(1):
-                break
-        self._overlay.close()
+    def _update_overlay_text(self, snapshot):
+        self._overlay.set_text(*self._text_handler(snapshot))
+
+    def _stop_status(self, wait=True):
+        if self._status_publisher is not None:
+            self._status_publisher.stop(wait=wait)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._stopped = True
+        # Stop the publisher first so it no longer writes to the overlay.
+        self._stop_status()
         if self._overlay:
-            self._overlay_thread.join()
             self._overlay.close()
         return False
+
+
+class PlaylistPlayer(JackTorrPlayer):
+    """Follow a Kodi playlist until its playback ends.
+
+    ``on_item_handler(position)`` runs whenever Kodi starts a playlist item.
+    Kodi ends every item on its way to the next one, so the end of playback
+    is left to the watchdog: it takes several idle checks in a row. The
+    remaining keyword arguments are ``JackTorrPlayer``'s, so the start and
+    close handlers run once for the whole playlist.
+    """
+
+    IDLE_CHECKS = 3
+
+    def __init__(self, playlist, on_item_handler=None, **kwargs):
+        super(PlaylistPlayer, self).__init__(**kwargs)
+        self._playlist = playlist
+        self._on_item_handler = on_item_handler
+        self._idle_checks = 0
+
+    def onAVStarted(self):
+        super(PlaylistPlayer, self).onAVStarted()
+        if self._started and not self._finished:
+            _execute_callback(self.on_item_started)
+
+    def onPlayBackEnded(self):
+        pass
+
+    def _watchdog(self, start_time, timeout):
+        if self._started and not self._finished and not self.is_active():
+            self._idle_checks += 1
+            if self._idle_checks < self.IDLE_CHECKS:
+                return
+        else:
+            self._idle_checks = 0
+        super(PlaylistPlayer, self)._watchdog(start_time, timeout)
+
+    def on_item_started(self):
+        if self._on_item_handler:
+            self._on_item_handler(self._playlist.getposition())
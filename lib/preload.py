@@ -0,0 +1,260 @@
+"""Preload requests that can be deduplicated, limited and cancelled.
+
+TorrServer preloads a file for as long as its ``/stream?preload`` request is
+open and only answers once the preload finished. Each preload runs on its
+own connection so cancelling closes that connection instead of leaving a
+thread waiting on the response. Preloads are keyed by (hash, file id): asking
+again for one that is pending or running returns the same task, and at most
+``max_concurrent`` requests are open at a time.
+"""
+
+import http.client
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from lib.torrserver.api import DEFAULT_CONNECT_TIMEOUT, TorrServerError
+
+
+DEFAULT_MAX_CONCURRENT = 4
+# Finished tasks kept so their status can still be read.
+MAX_FINISHED_TASKS = 50
+SLOT_POLL_SECONDS = 0.2
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELED = "canceled"
+
+ACTIVE_STATES = (PENDING, RUNNING)
+
+
+def _open_connection(url, timeout):
+    parts = urlsplit(url)
+    if parts.scheme == "https":
+        return http.client.HTTPSConnection(parts.hostname, parts.port, timeout=timeout)
+    return http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+
+
+class PreloadTask(object):
+    def __init__(self, info_hash, file_id):
+        self.info_hash = info_hash
+        self.file_id = file_id
+        self.state = PENDING
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._connection = None
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def key(self):
+        return self.info_hash, str(self.file_id)
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def wait(self, timeout=None):
+        """Whether the task finished within ``timeout`` seconds."""
+        return self._finished.wait(timeout)
+
+    def cancel(self):
+        """Stop waiting for a slot or close the open preload connection."""
+        with self._lock:
+            if not self.active:
+                return False
+            self.state = CANCELED
+            connection = self._connection
+        if connection is not None:
+            # shutdown() wakes the thread blocked reading the response, a
+            # plain close() from this thread would not.
+            sock = connection.sock
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            connection.close()
+        return True
+
+    def _attach(self, connection):
+        with self._lock:
+            if self.state == CANCELED:
+                return False
+            self.state = RUNNING
+            self.started_at = time.monotonic()
+            self._connection = connection
+            return True
+
+    def _connected(self):
+        """Whether the preload is still wanted once its connection is open."""
+        with self._lock:
+            return self.state != CANCELED
+
+    def _finish(self, state, error=None):
+        with self._lock:
+            if self.state != CANCELED:
+                self.state = state
+                self.error = error
+            self._connection = None
+            self.finished_at = time.monotonic()
+        self._finished.set()
+
+
+class PreloadManager(object):
+    def __init__(
+        self,
+        api,
+        max_concurrent=DEFAULT_MAX_CONCURRENT,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        open_connection=_open_connection,
+    ):
+        self._api = api
+        self._connect_timeout = connect_timeout
+        self._open_connection = open_connection
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def start(self, info_hash, file_id):
+        """Start preloading a file, or return its pending or running task."""
+        key = (info_hash, str(file_id))
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task.active:
+                return task
+            task = PreloadTask(info_hash, file_id)
+            self._tasks.pop(key, None)
+            self._tasks[key] = task
+            self._trim()
+        thread = threading.Thread(target=self._run, args=(task,))
+        thread.daemon = True
+        thread.start()
+        return task
+
+    def cancel(self, info_hash, file_id=None, keep=None):
+        """Cancel the preloads of a hash, or of one of its files.
+
+        ``keep`` names a file id whose preload is left running. Returns the
+        number of cancelled tasks.
+        """
+        with self._lock:
+            tasks = [
+                task
+                for task in self._tasks.values()
+                if task.info_hash == info_hash
+                and (file_id is None or task.key[1] == str(file_id))
+                and (keep is None or task.key[1] != str(keep))
+            ]
+        return sum(1 for task in tasks if task.cancel())
+
+    def cancel_all(self):
+        with self._lock:
+            tasks = list(self._tasks.values())
+        return sum(1 for task in tasks if task.cancel())
+
+    def get(self, info_hash, file_id):
+        with self._lock:
+            return self._tasks.get((info_hash, str(file_id)))
+
+    def status(self, info_hash, file_id):
+        """State of the latest preload of a file, None if never started."""
+        task = self.get(info_hash, file_id)
+        return task.state if task is not None else None
+
+    def snapshot(self):
+        """{(hash, file id): state} of the known tasks."""
+        with self._lock:
+            return {key: task.state for key, task in self._tasks.items()}
+
+    def _trim(self):
+        finished = [key for key, task in self._tasks.items() if not task.active]
+        for key in finished[: max(0, len(finished) - MAX_FINISHED_TASKS)]:
+            del self._tasks[key]
+
+    def _acquire_slot(self, task):
+        while not self._slots.acquire(timeout=SLOT_POLL_SECONDS):
+            if not task.active:
+                return False
+        if not task.active:
+            self._slots.release()
+            return False
+        return True
+
+    def _run(self, task):
+        if not self._acquire_slot(task):
+            task._finish(CANCELED)
+            return
+        state, error = FAILED, None
+        try:
+            self._preload(task)
+            state = DONE
+        except Exception as e:
+            if task.state != CANCELED:
+                logging.warning(
+                    "Preload of %s/%s failed: %s", task.info_hash, task.file_id, e
+                )
+            error = e
+        finally:
+            self._slots.release()
+            # Always finish, waiters would hang otherwise.
+            task._finish(state, error)
+        logging.debug("Preload of %s/%s %s", task.info_hash, task.file_id, task.state)
+
+    def _record(self, task, start, status=None, error=None, unreachable=False):
+        # Errors of a cancelled preload come from closing its connection.
+        if task.state == CANCELED:
+            return
+        self._api.record_preload(
+            task.info_hash,
+            time.monotonic() - start,
+            status=status,
+            error=error,
+            unreachable=unreachable,
+        )
+
+    def _preload(self, task):
+        url, headers = self._api.preload_request(task.info_hash, task.file_id)
+        connection = self._open_connection(url, self._connect_timeout)
+        # A connection closed by cancel() must fail instead of reconnecting.
+        connection.auto_open = 0
+        if not task._attach(connection):
+            connection.close()
+            return
+        start = time.monotonic()
+        try:
+            try:
+                connection.connect()
+            except OSError as e:
+                self._record(task, start, error=e, unreachable=True)
+                raise
+            try:
+                if not task._connected():
+                    return
+                sock = connection.sock
+                if sock is None:
+                    # Closed by a cancel() racing the check above.
+                    raise http.client.NotConnected()
+                # The response only arrives once the preload finished.
+                sock.settimeout(None)
+                parts = urlsplit(url)
+                path = "{}?{}".format(parts.path, parts.query)
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self._record(task, start, error=e)
+                raise
+            self._record(task, start, status=response.status)
+            if response.status != 200:
+                raise TorrServerError(
+                    "TorrServer preload returned HTTP {}".format(response.status),
+                    status_code=response.status,
+                )
+        finally:
+            connection.close()
@@ -0,0 +1,252 @@
+"""Fetch the byte ranges players read right after opening a stream.
+
+Kodi's demuxers read the container index before the first frame: MKV Cues
+(located through the SeekHead) and the MP4 moov box, which often sits after
+mdat at the end of the file. Reading those ranges through TorrServer's
+stream endpoint before handing the URL to Kodi makes TorrServer download the
+pieces, so the player's first reads are served from cache.
+"""
+
+import logging
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from lib.torrserver.api import TorrServerError
+
+
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 1024 * 1024
+MAX_INDEX_BYTES = 4 * 1024 * 1024
+DEFAULT_TIMEOUT = 20
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+CUES_ID = 0x1C53BB6B
+CLUSTER_ID = 0x1F43B675
+
+
+def _read_vint(data, pos, keep_marker):
+    """Read an EBML variable length integer; returns (value, next_pos)."""
+    if pos >= len(data):
+        raise IndexError(pos)
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8 or pos + length > len(data):
+        raise IndexError(pos)
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[pos + 1 : pos + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None  # unknown size
+    return value, pos + length
+
+
+def _read_element(data, pos):
+    element_id, pos = _read_vint(data, pos, keep_marker=True)
+    size, pos = _read_vint(data, pos, keep_marker=False)
+    return element_id, size, pos
+
+
+def mkv_cues_offset(head):
+    """Absolute offset of the Cues element from the SeekHead, or None."""
+    try:
+        element_id, size, pos = _read_element(head, 0)
+        if element_id != EBML_ID or size is None:
+            return None
+        element_id, _, segment_start = _read_element(head, pos + size)
+        if element_id != SEGMENT_ID:
+            return None
+        pos = segment_start
+        while pos < len(head):
+            element_id, size, data_start = _read_element(head, pos)
+            if element_id == CLUSTER_ID or size is None:
+                return None
+            if element_id == SEEK_HEAD_ID:
+                return _cues_from_seek_head(
+                    head, data_start, data_start + size, segment_start
+                )
+            pos = data_start + size
+    except IndexError:
+        pass
+    return None
+
+
+def _cues_from_seek_head(head, pos, end, segment_start):
+    while pos < min(end, len(head)):
+        element_id, size, data_start = _read_element(head, pos)
+        if element_id == SEEK_ID and size is not None:
+            seek_id = None
+            seek_position = None
+            child = data_start
+            while child < data_start + size:
+                child_id, child_size, child_start = _read_element(head, child)
+                value = head[child_start : child_start + child_size]
+                if child_id == SEEK_ID_ID:
+                    seek_id = int.from_bytes(value, "big")
+                elif child_id == SEEK_POSITION_ID:
+                    seek_position = int.from_bytes(value, "big")
+                child = child_start + child_size
+            if seek_id == CUES_ID and seek_position is not None:
+                return segment_start + seek_position
+        if size is None:
+            return None
+        pos = data_start + size
+    return None
+
+
+def mp4_moov_range(head, file_length):
+    """(offset, size) of the top-level moov box, walking box headers.
+
+    When the walk leaves ``head`` (typically by skipping mdat) before finding
+    moov, the next box offset is returned with an unknown (None) size: moov
+    is usually the box right after mdat.
+    """
+    pos = 0
+    seen_mdat = False
+    while pos + 8 <= file_length:
+        if pos + 8 > len(head):
+            return (pos, None) if seen_mdat else None
+        size, box_type = struct.unpack(">I4s", head[pos : pos + 8])
+        if size == 1:
+            if pos + 16 > len(head):
+                return None
+            size = struct.unpack(">Q", head[pos + 8 : pos + 16])[0]
+        elif size == 0:
+            size = file_length - pos
+        if size < 8:
+            return None
+        if box_type == b"moov":
+            return pos, size
+        seen_mdat = seen_mdat or box_type == b"mdat"
+        pos += size
+    return None
+
+
+def index_ranges(head, file_length):
+    """Inclusive byte ranges to prewarm beyond the (already buffered) head."""
+    ranges = [(max(0, file_length - TAIL_BYTES), file_length - 1)]
+    cues = mkv_cues_offset(head)
+    if cues is not None:
+        ranges.append((cues, min(cues + MAX_INDEX_BYTES, file_length) - 1))
+    else:
+        moov = mp4_moov_range(head, file_length)
+        if moov is not None:
+            offset, size = moov
+            size = min(size or MAX_INDEX_BYTES, MAX_INDEX_BYTES)
+            ranges.append((offset, min(offset + size, file_length) - 1))
+
+    merged = []
+    for start, end in sorted(r for r in ranges if HEAD_BYTES <= r[1] and r[0] <= r[1]):
+        start = max(start, HEAD_BYTES)
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def prewarm(api, info_hash, file_id, timeout=DEFAULT_TIMEOUT):
+    """Read the file's index ranges through TorrServer, waiting at most
+    ``timeout`` seconds. Returns whether every range was served."""
+    start_time = time.monotonic()
+    try:
+        head, file_length = api.read_stream_range(
+            info_hash, file_id, 0, HEAD_BYTES - 1, read_timeout=timeout
+        )
+    except TorrServerError as e:
+        logging.warning("Prewarm head read failed: %s", e)
+        return False
+    if not file_length:
+        logging.debug("Prewarm skipped, no Content-Range for %s/%s", info_hash, file_id)
+        return False
+
+    ranges = index_ranges(head, file_length)
+    if not ranges:
+        return True
+    remaining = timeout - (time.monotonic() - start_time)
+    if remaining <= 0:
+        return False
+    executor = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        futures = [
+            executor.submit(
+                api.read_stream_range,
+                info_hash,
+                file_id,
+                range_start,
+                range_end,
+                read_timeout=remaining,
+            )
+            for range_start, range_end in ranges
+        ]
+        done, _ = wait(futures, timeout=remaining)
+    finally:
+        # Do not block on reads still in flight; they time out on their own.
+        executor.shutdown(wait=False)
+
+    served = [f for f in done if f.exception() is None]
+    logging.info(
+        "Prewarmed %d/%d index ranges %s of %s/%s in %.2fs",
+        len(served),
+        len(ranges),
+        ranges,
+        info_hash,
+        file_id,
+        time.monotonic() - start_time,
+    )
+    return len(served) == len(ranges)
+
+
+class Prewarm(object):
+    """Run ``prewarm`` on a background thread; ``done`` never blocks.
+
+    Buffering starts it once the head of the file is readable and keeps its
+    dialog (and Cancel) up until it finished.
+    """
+
+    def __init__(self, api, info_hash, file_id, timeout=DEFAULT_TIMEOUT):
+        self._api = api
+        self._info_hash = info_hash
+        self._file_id = file_id
+        self._timeout = timeout
+        self._thread = None
+        self._result = None
+        self._done = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._result = prewarm(
+                self._api, self._info_hash, self._file_id, timeout=self._timeout
+            )
+        finally:
+            self._done.set()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=0):
+        """Whether every range was served; None while pending."""
+        self._done.wait(timeout)
+        return self._result
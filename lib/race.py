@@ -0,0 +1,191 @@
+"""Race mode: start several copies of the same content, keep the fastest.
+
+Search results for one title often point at swarms of very different
+health. ``select_candidates`` picks results that look like the same content
+(similar title or similar size) and ``Race`` follows their TorrServer status
+until one of them has preloaded enough to play.
+"""
+
+import difflib
+import re
+
+from lib.buffering import is_preload_complete
+from lib.episode_matching import match_episode_file
+from lib.kodi_formats import is_video
+from lib.magnet import parse_info_hash
+
+
+DEFAULT_CANDIDATES = 3
+MIN_TITLE_SIMILARITY = 0.6
+SIZE_BAND = 0.25
+
+_SIZE_UNITS = {
+    "B": 1,
+    "KB": 1024,
+    "MB": 1024 ** 2,
+    "GB": 1024 ** 3,
+    "TB": 1024 ** 4,
+}
+_SIZE_PATTERN = re.compile(r"([\d.,]+)\s*([KMGT]?i?B)", re.IGNORECASE)
+_TAG_PATTERN = re.compile(r"[\[(].*?[\])]")
+_SEPARATOR_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def parse_size(text):
+    """Bytes of a human readable size such as ``"42.93 GB"``, or None."""
+    if isinstance(text, (int, float)):
+        return int(text)
+    match = _SIZE_PATTERN.search(text or "")
+    if not match:
+        return None
+    try:
+        value = float(match.group(1).replace(",", "."))
+    except ValueError:
+        return None
+    unit = match.group(2).upper().replace("I", "")
+    return int(value * _SIZE_UNITS[unit])
+
+
+def normalize_title(title):
+    """Lowercase words of a release title without bracketed tags."""
+    title = _TAG_PATTERN.sub(" ", title or "")
+    return " ".join(_SEPARATOR_PATTERN.sub(" ", title).lower().split())
+
+
+def title_similarity(a, b):
+    return difflib.SequenceMatcher(None, normalize_title(a), normalize_title(b)).ratio()
+
+
+def same_content(a, b, min_similarity=MIN_TITLE_SIMILARITY, size_band=SIZE_BAND):
+    """Whether two search results look like releases of the same content."""
+    if title_similarity(_title(a), _title(b)) >= min_similarity:
+        return True
+    size_a = parse_size(a.get("Size"))
+    size_b = parse_size(b.get("Size"))
+    if not size_a or not size_b:
+        return False
+    return abs(size_a - size_b) <= size_band * max(size_a, size_b)
+
+
+def _title(result):
+    return result.get("Title") or result.get("Name") or ""
+
+
+def _seeders(result):
+    try:
+        return int(result.get("Seed") or result.get("Seeders") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def select_candidates(results, picked_magnet, limit=DEFAULT_CANDIDATES):
+    """The picked result followed by its best seeded look-alikes.
+
+    Results without a magnet and duplicate infohashes are skipped. Returns
+    at most ``limit`` results; an unknown ``picked_magnet`` returns [].
+    """
+    picked = next((r for r in results if r.get("Magnet") == picked_magnet), None)
+    if picked is None:
+        return []
+    seen = {parse_info_hash(picked_magnet) or picked_magnet}
+    others = []
+    for result in results:
+        magnet = result.get("Magnet")
+        if not magnet or result is picked:
+            continue
+        key = parse_info_hash(magnet) or magnet
+        if key in seen or not same_content(picked, result):
+            continue
+        seen.add(key)
+        others.append(result)
+    others.sort(key=_seeders, reverse=True)
+    return [picked] + others[: max(0, limit - 1)]
+
+
+def race_file(files, min_size=0, season="", episode="", torrent_title=""):
+    """File to preload and play: the requested episode, else the largest video.
+
+    The file is settled here, before its preload starts, so the winner plays
+    the file that was raced. With an episode requested, a torrent without an
+    unambiguous match has no race file.
+    """
+    videos = [
+        f
+        for f in files or ()
+        if is_video(f.get("path")) and (f.get("length") or 0) >= min_size
+    ]
+    if not videos:
+        return None
+    if season and episode:
+        return match_episode_file(
+            videos, season=season, episode=episode, torrent_title=torrent_title
+        )
+    return max(videos, key=lambda f: f.get("length") or 0)
+
+
+class RaceEntry(object):
+    def __init__(self, result, info_hash):
+        self.result = result
+        self.info_hash = info_hash
+        self.file = None
+        self.status = {}
+        self.failed = False
+
+    @property
+    def title(self):
+        return _title(self.result)
+
+    @property
+    def resolving(self):
+        return not self.status or self.status.get("stat") == 1
+
+    @property
+    def playable(self):
+        return self.file is not None and is_preload_complete(
+            self.status.get("preloaded_bytes"), self.status.get("preload_size")
+        )
+
+
+class Race(object):
+    """Race state; the caller adds torrents, polls status and starts preloads.
+
+    ``update`` takes the torrent status of every running entry and returns
+    the entries whose metadata just resolved (they need a preload) and the
+    winner, if any.
+    """
+
+    def __init__(self, entries, min_size=0, season="", episode=""):
+        self.entries = list(entries)
+        self._min_size = min_size
+        self._season = season
+        self._episode = episode
+
+    @property
+    def running(self):
+        return [e for e in self.entries if not e.failed]
+
+    def update(self, statuses):
+        newly_resolved = []
+        for entry in self.running:
+            status = statuses.get(entry.info_hash)
+            if status is None:
+                continue
+            entry.status = status
+            if entry.file is None and not entry.resolving:
+                entry.file = race_file(
+                    status.get("file_stats"),
+                    self._min_size,
+                    season=self._season,
+                    episode=self._episode,
+                    torrent_title=entry.title,
+                )
+                if entry.file is None:
+                    # Nothing playable in this torrent; it drops out.
+                    entry.failed = True
+                else:
+                    newly_resolved.append(entry)
+        winner = next((e for e in self.running if e.playable), None)
+        return newly_resolved, winner
+
+    def losers(self, winner):
+        return [e for e in self.entries if e is not winner]
@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
 
+from lib import json_codec
 from lib.kodi import ADDON_DATA
 
 
@@ -15,7 +15,7 @@ def load_history() -> list[str]:
     path = _history_path()
     try:
         with open(path, "r", encoding="utf-8") as file:
-            history = json.load(file)
+            history = json_codec.load(file)
     except (OSError, ValueError, TypeError):
         return []
 
@@ -38,7 +38,7 @@ def add_search(term: str) -> None:
         history.insert(0, term)
         history = history[:20]
         with open(tmp_path, "w", encoding="utf-8") as file:
-            json.dump(history, file)
+            json_codec.dump(history, file)
         os.replace(tmp_path, path)
     except Exception:
         logging.exception("Failed to persist search history")
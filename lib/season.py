@@ -0,0 +1,84 @@
+"""Play a season of a torrent as one Kodi playlist.
+
+``season_playlist`` orders the episodes of a season from the one the user
+picked onwards. While the playlist plays, ``PreloadWindow`` keeps the next
+few items preloading on TorrServer, so each item starts from cache and no
+buffering dialog is needed between them.
+"""
+
+import logging
+
+from lib.episode_matching import parse_episode
+from lib.kodi_formats import is_video
+
+
+DEFAULT_WINDOW = 2
+
+
+def season_playlist(files, file_id, torrent_title=""):
+    """Video files of ``file_id``'s season, from that episode on, in order.
+
+    When another episode has several files the largest one is kept. Returns []
+    when ``file_id`` is not an episode.
+    """
+    episodes = {}
+    start = picked = None
+    for file in files or ():
+        path = file.get("path")
+        if not is_video(path):
+            continue
+        number = parse_episode(path, torrent_title)
+        if number is None:
+            continue
+        if str(file.get("id")) == str(file_id):
+            start, picked = number, file
+        current = episodes.get(number)
+        length = file.get("length") or 0
+        if current is None or length > (current.get("length") or 0):
+            episodes[number] = file
+    if start is None:
+        return []
+    episodes[start] = picked
+    season = start[0]
+    return [
+        episodes[number]
+        for number in sorted(episodes)
+        if number[0] == season and number >= start
+    ]
+
+
+class PreloadWindow(object):
+    """Preload the ``size`` items after the playing one.
+
+    ``move`` is called with the playlist position whenever an item starts;
+    preloads this window started for items that fell out of the window
+    (played, skipped or jumped over) are cancelled.
+    """
+
+    def __init__(self, preloads, info_hash, items, size=DEFAULT_WINDOW):
+        self._preloads = preloads
+        self._info_hash = info_hash
+        self._items = list(items)
+        self._size = size
+        self._preloading = set()
+
+    def move(self, position):
+        if position < 0 or position >= len(self._items):
+            return
+        wanted = [
+            str(item.get("id"))
+            for item in self._items[position + 1 : position + 1 + self._size]
+        ]
+        for file_id in sorted(self._preloading - set(wanted)):
+            self._preloads.cancel(self._info_hash, file_id)
+        for file_id in wanted:
+            if file_id not in self._preloading:
+                logging.debug("Preloading %s/%s", self._info_hash, file_id)
+                self._preloads.start(self._info_hash, file_id)
+        self._preloading = set(wanted)
+
+    def close(self):
+        """Cancel every preload still running for the window."""
+        for file_id in sorted(self._preloading):
+            self._preloads.cancel(self._info_hash, file_id)
+        self._preloading = set()
@@ -1,8 +1,6 @@
-import json
 import logging
 import os
 import threading
-from requests import request
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import RequestException
 from lib.utils import assure_unicode, megabytes_to_bytes
@@ -10,9 +8,22 @@ import xbmc
 import xbmcgui
 
 from lib import kodi
+from lib.json_codec import encode, loads
+from lib.client_factory import create_client, create_metrics, create_pool
+from lib.preload import PreloadManager
+from lib.torrserver.api import CONNECTION_ERRORS
+from lib.torrserver.breaker import CLOSED, STATE_FILE_NAME, CircuitBreaker
+from lib.torrserver.session import shared_session
+from lib.warm_pool import STATE_FILE_NAME as WARM_POOL_FILE_NAME
+from lib.warm_pool import WarmKeeper, WarmPool
 from lib.settings import (
+    get_connect_timeout,
+    get_extra_servers,
+    get_warm_pool_budget,
+    get_warm_pool_size,
     get_password,
     get_port,
+    get_read_timeout,
     get_service_host,
     get_username,
     apply_settings_to_torrserver,
@@ -38,21 +49,21 @@ class DaemonMonitor(xbmc.Monitor):
     settings_name = "settings.json"
     log_name = "torrserver.log"
 
+    probe_interval = 5
+    probe_timeout = (2, 3)
+
     def __init__(self):
         super(DaemonMonitor, self).__init__()
         self._lock = threading.Lock()
         self._settings_path = os.path.join(kodi.ADDON_DATA, self.settings_name)
         self._log_path = os.path.join(kodi.ADDON_DATA, self.log_name)
         self._enabled = None
-        self._host = get_service_host()
-        self._port = get_port()
-        self._username = get_username()
-        self._password = get_password()
-        self._auth = HTTPBasicAuth(self._username, self._password)
-        self._ssl_enabled = ssl_enabled()
-        self._base_url = "{}://{}:{}".format(
-            "https" if self._ssl_enabled else "http", self._host, self._port
-        )
+        # The probe drives the breaker, see shared_session.
+        self._session = shared_session(retries=0)
+        self._warm_pool = WarmPool(os.path.join(kodi.ADDON_DATA, WARM_POOL_FILE_NAME))
+        self._warm_keeper = None
+        self._metrics = create_metrics()
+        self._refresh_connection()
         self._settings_spec = [
             s
             for s in kodi.get_all_settings_spec()
@@ -60,7 +71,8 @@ class DaemonMonitor(xbmc.Monitor):
         ]
 
     def _request(self, method, url, **kwargs):
-        return request(
+        kwargs.setdefault("timeout", self._timeout)
+        return self._session.request(
             method,
             f"{self._base_url}/{url}",
             auth=self._auth,
@@ -80,7 +92,7 @@ class DaemonMonitor(xbmc.Monitor):
     def _get_daemon_settings(self):
         try:
             r = self._request(
-                "post", self._settings_get_uri, data=json.dumps({"action": "get"})
+                "post", self._settings_get_uri, data=encode({"action": "get"})
             )
         except RequestException as error:
             logging.error(
@@ -94,7 +106,7 @@ class DaemonMonitor(xbmc.Monitor):
                 "Failed getting daemon settings with code %d: %s", r.status_code, r.text
             )
             return None
-        return r.json()
+        return loads(r.content)
 
     def _update_kodi_settings(self):
         daemon_settings = self._get_daemon_settings()
@@ -119,6 +131,60 @@ class DaemonMonitor(xbmc.Monitor):
         self._base_url = "{}://{}:{}".format(
             "https" if self._ssl_enabled else "http", self._host, self._port
         )
+        self._timeout = (get_connect_timeout(), get_read_timeout())
+        self._breaker = CircuitBreaker(
+            "{}:{}".format(self._host, self._port),
+            state_path=os.path.join(kodi.ADDON_DATA, STATE_FILE_NAME),
+        )
+        extra_servers = get_extra_servers()
+        self._pool = (
+            create_pool(
+                [(self._host, self._port)] + extra_servers, metrics=self._metrics
+            )
+            if extra_servers
+            else None
+        )
+        api = self._pool or create_client(
+            self._host, self._port, metrics=self._metrics
+        )
+        if self._warm_keeper is not None:
+            self._warm_keeper.close()
+        self._warm_keeper = WarmKeeper(
+            api,
+            self._warm_pool,
+            PreloadManager(api, connect_timeout=get_connect_timeout()),
+        )
+
+    def _probe_torrserver(self):
+        """Close the shared circuit breaker as soon as TorrServer answers again,
+        so plugin invocations stop failing fast without waiting for a trial.
+        With extra instances configured, also keep the pool health fresh."""
+        if self._pool is not None:
+            self._pool.probe_if_stale()
+        breaker = self._breaker
+        if breaker.state == CLOSED:
+            return
+        try:
+            self._request("get", "echo", timeout=self.probe_timeout)
+        except RequestException as error:
+            logging.debug("TorrServer probe failed: %s", error)
+            # Like TorrServer._request, only an unreachable server counts.
+            if isinstance(error, CONNECTION_ERRORS):
+                breaker.record_failure()
+            return
+        breaker.record_success()
+
+    def _keep_warm(self):
+        """Keep recently stopped torrents connected, within the pool limits."""
+        if not self._warm_pool.entries():
+            # Nothing to keep; with a pool size of 0 the plugin adds nothing.
+            return
+        size = get_warm_pool_size()
+        try:
+            self._warm_keeper.tick(size, megabytes_to_bytes(get_warm_pool_budget()))
+        except Exception as e:
+            # The service loop also probes TorrServer and syncs settings.
+            logging.error("Warm pool tick failed: %s", e, exc_info=True)
 
     def _update_daemon_settings(self):
         self._refresh_connection()
@@ -134,10 +200,10 @@ class DaemonMonitor(xbmc.Monitor):
             r = self._request(
                 "post",
                 self._settings_set_uri,
-                data=json.dumps({"action": "set", "sets": kodi_settings}),
+                data=encode({"action": "set", "sets": kodi_settings}),
             )
             if r.status_code != 200:
-                xbmcgui.Dialog().ok(kodi.translate(30102), r.json()["error"])
+                xbmcgui.Dialog().ok(kodi.translate(30102), loads(r.content)["error"])
                 return False
 
         return True
@@ -159,8 +225,13 @@ class DaemonMonitor(xbmc.Monitor):
         # Keep the monitor alive so Kodi can deliver onSettingsChanged callbacks
         # after runtime setting toggles. Without this loop the service thread ends
         # immediately after the initial sync and no later setting change reaches
-        # the daemon.
-        self.waitForAbort()
+        # the daemon. The loop also probes TorrServer while the breaker is open
+        # and keeps the warm pool alive.
+        while not self.waitForAbort(self.probe_interval):
+            self._probe_torrserver()
+            self._keep_warm()
+            self._metrics.maybe_dump()
+        self._metrics.dump()
 
 
 @kodi.once("migrated")
@@ -1,4 +1,5 @@
 from lib.kodi import (
+    get_float_setting,
     get_int_setting,
     get_boolean_setting,
     get_setting,
@@ -14,6 +15,24 @@ def get_port():
     return get_int_setting("service_port")
 
 
+def get_extra_servers():
+    """Additional TorrServer instances as (host, port) tuples."""
+    servers = []
+    for entry in get_setting("extra_servers").split(","):
+        host, _, port = entry.strip().rpartition(":")
+        if host and port.isdigit():
+            servers.append((host, int(port)))
+    return servers
+
+
+def get_connect_timeout():
+    return get_int_setting("connect_timeout")
+
+
+def get_read_timeout():
+    return get_int_setting("read_timeout")
+
+
 def get_metadata_timeout():
     return get_int_setting("metadata_timeout")
 
@@ -26,10 +45,58 @@ def get_buffer_retries():
     return get_int_setting("buffer_retries")
 
 
+def get_buffer_seconds():
+    return get_int_setting("buffer_seconds")
+
+
+def prewarm_enabled():
+    return get_boolean_setting("prewarm")
+
+
+def next_episode_enabled():
+    return get_boolean_setting("next_episode")
+
+
+def get_next_episode_percent():
+    return get_int_setting("next_episode_percent")
+
+
+def get_next_episode_minutes():
+    return get_int_setting("next_episode_minutes")
+
+
+def get_season_preload_window():
+    return get_int_setting("season_preload_window")
+
+
+def get_warm_pool_size():
+    return get_int_setting("warm_pool_size")
+
+
+def get_warm_pool_budget():
+    return get_int_setting("warm_pool_budget")
+
+
+def get_race_candidates():
+    return get_int_setting("race_candidates")
+
+
+def early_start_enabled():
+    return get_boolean_setting("early_start")
+
+
+def get_early_start_margin():
+    return get_float_setting("early_start_margin")
+
+
 def show_status_overlay():
     return get_boolean_setting("overlay")
 
 
+def get_status_interval():
+    return get_float_setting("status_interval")
+
+
 def get_min_candidate_size():
     return get_int_setting("min_candidate_size")
 
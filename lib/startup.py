@@ -0,0 +1,113 @@
+"""Timing of one playback start.
+
+Starting playback walks through the phases add -> metadata -> choose ->
+preload -> play, spread over several route functions that call each other.
+Phases overlap where their inputs allow: the .torrent upload runs during
+file choice, and once the hash and file are known ``buffer_and_play``
+starts the preload and the media probe before the stat call, so both run
+alongside it and the buffering poll joins them. The outermost call opens a
+``Startup`` and nested calls join it, so every phase lands on one timeline,
+and torrent info already fetched (the metadata wait, a replay's
+``/torrents get``) is reused instead of requested again.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+PHASES = ("add", "metadata", "choose", "preload", "play")
+METRIC_PREFIX = "startup "
+
+_local = threading.local()
+
+
+class Startup(object):
+    def __init__(self, metrics=None, clock=time.monotonic):
+        self._metrics = metrics
+        self._clock = clock
+        self._started_at = clock()
+        self._timings = {}
+        self._finished = False
+        self._open_phase = None
+        self._info = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as ``name``; repeated phases accumulate."""
+        start = self._clock()
+        try:
+            yield self
+        finally:
+            elapsed = self._clock() - start
+            self._timings[name] = self._timings.get(name, 0.0) + elapsed
+            if self._metrics is not None:
+                self._metrics.record(METRIC_PREFIX + name, elapsed)
+
+    def begin(self, name):
+        """Open a phase that ends at ``finish``, e.g. waiting for the player."""
+        self._open_phase = (name, self._clock())
+
+    def remember_info(self, info_hash, info):
+        """Keep torrent info with resolved metadata for later phases."""
+        self._info[info_hash] = info
+
+    def info_for(self, info_hash):
+        return self._info.get(info_hash)
+
+    @property
+    def timings(self):
+        return dict(self._timings)
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def finish(self, success=True):
+        """Close any open phase and log the timeline once."""
+        if self._finished:
+            return
+        self._finished = True
+        if self._open_phase is not None:
+            name, start = self._open_phase
+            elapsed = self._clock() - start
+            self._timings[name] = self._timings.get(name, 0.0) + elapsed
+            if self._metrics is not None:
+                self._metrics.record(METRIC_PREFIX + name, elapsed)
+        total = self._clock() - self._started_at
+        if self._metrics is not None and success:
+            self._metrics.record(METRIC_PREFIX + "total", total)
+        logging.info(
+            "Playback startup %s in %.2fs (%s)",
+            "finished" if success else "aborted",
+            total,
+            " ".join(
+                "{}={:.2f}s".format(name, self._timings[name])
+                for name in PHASES
+                if name in self._timings
+            ),
+        )
+
+
+def current_startup():
+    return getattr(_local, "startup", None)
+
+
+@contextmanager
+def startup_session(metrics=None):
+    """Yield the running ``Startup``, opening one for the outermost caller.
+
+    A startup still open when the outermost block exits (playback never
+    began) is logged as aborted.
+    """
+    startup = current_startup()
+    if startup is not None:
+        yield startup
+        return
+    startup = _local.startup = Startup(metrics)
+    try:
+        yield startup
+    finally:
+        _local.startup = None
+        startup.finish(success=False)
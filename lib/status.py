@@ -0,0 +1,181 @@
+"""Torrent status sampled once and shared by every consumer during playback.
+
+The overlay, the stop handler and the log all want the same few numbers
+(state, speeds, seeders, peers). ``StatusPublisher`` reads them with
+``get_torrent_info_by_hash``, which skips the per-file stats, and hands a
+compact ``StatusSnapshot`` to each subscriber. It samples only while someone
+subscribes, at the shortest interval a subscriber asked for: every few
+seconds while the overlay is shown, once a minute for the log otherwise.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from lib.torrserver.api import TorrServerError
+
+
+DEFAULT_INTERVAL = 2.0
+LOG_INTERVAL = 60.0
+
+StatusSnapshot = namedtuple(
+    "StatusSnapshot",
+    [
+        "stat",
+        "download_speed",
+        "upload_speed",
+        "seeders",
+        "active_peers",
+        "total_peers",
+        "loaded_size",
+        "torrent_size",
+        "sampled_at",
+    ],
+)
+
+
+def snapshot_from_status(status, sampled_at):
+    status = status or {}
+    return StatusSnapshot(
+        stat=status.get("stat"),
+        download_speed=status.get("download_speed") or 0,
+        upload_speed=status.get("upload_speed") or 0,
+        seeders=status.get("connected_seeders") or 0,
+        active_peers=status.get("active_peers") or 0,
+        total_peers=status.get("total_peers") or 0,
+        loaded_size=status.get("loaded_size") or 0,
+        torrent_size=status.get("torrent_size") or 0,
+        sampled_at=sampled_at,
+    )
+
+
+class StatusPublisher(object):
+    def __init__(self, api, info_hash, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self._api = api
+        self._info_hash = info_hash
+        self._interval = max(interval, 0.1)
+        self._clock = clock
+        self._subscribers = []
+        self._latest = None
+        self._sampled_at = None
+        self._requested = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def latest(self):
+        """The last snapshot, None before the first successful sample."""
+        return self._latest
+
+    def subscribe(self, callback, interval=None):
+        """Call ``callback(snapshot)`` for every new snapshot.
+
+        ``interval`` is how old a snapshot the subscriber accepts, the
+        publisher's interval by default. Subscribing again only updates it.
+        """
+        interval = self._interval if interval is None else max(interval, 0.1)
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != callback]
+            self._subscribers.append((callback, interval))
+        self._wake.set()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def request_sample(self):
+        """Have the sampling thread read the status now, e.g. for the overlay."""
+        with self._lock:
+            self._requested = True
+        self._wake.set()
+
+    def sample(self):
+        """Read the status once and publish it; errors keep the last one."""
+        self._sampled_at = self._clock()
+        try:
+            status = self._api.get_torrent_info_by_hash(self._info_hash)
+        except TorrServerError as e:
+            logging.debug("Status sample of %s failed: %s", self._info_hash, e)
+            return None
+        snapshot = self._latest = snapshot_from_status(status, self._clock())
+        with self._lock:
+            subscribers = [callback for callback, _interval in self._subscribers]
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.error(
+                    "Status subscriber %r failed: %s", callback, e, exc_info=True
+                )
+        return snapshot
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Stop sampling; ``wait`` joins a sample still in flight."""
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _next_delay(self):
+        """Seconds until the next sample is due, None without subscribers."""
+        with self._lock:
+            if self._requested:
+                self._requested = False
+                return 0
+            if not self._subscribers:
+                return None
+            interval = min(interval for _callback, interval in self._subscribers)
+        if self._sampled_at is None:
+            return 0
+        return max(0, self._sampled_at + interval - self._clock())
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._next_delay()
+            if delay == 0:
+                self.sample()
+                continue
+            # Woken early by stop(), a new subscriber or a requested sample.
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+class StatusLog(object):
+    """Subscriber logging a snapshot on state changes and every ``interval``."""
+
+    def __init__(self, name, interval=LOG_INTERVAL):
+        self._name = name
+        self._interval = interval
+        self._last = None
+
+    def __call__(self, snapshot):
+        last = self._last
+        if (
+            last is not None
+            and last.stat == snapshot.stat
+            and snapshot.sampled_at - last.sampled_at < self._interval
+        ):
+            return
+        self._last = snapshot
+        logging.info(
+            "Status of %s: stat=%s down=%.0f kB/s up=%.0f kB/s seeders=%d peers=%d/%d",
+            self._name,
+            snapshot.stat,
+            snapshot.download_speed / 1024.0,
+            snapshot.upload_speed / 1024.0,
+            snapshot.seeders,
+            snapshot.active_peers,
+            snapshot.total_peers,
+        )
@@ -0,0 +1,123 @@
+"""On-disk cache of downloaded .torrent files.
+
+Two indexes live under one directory: ``urls/<sha1(url)>`` holds the infohash
+a URL resolved to, and ``<infohash>.torrent`` holds the metainfo bytes. Every
+write goes through a temporary file and ``os.replace``, so concurrent plugin
+processes only ever see complete entries. Entries are evicted least recently
+used first, by mtime, once the cache outgrows its byte budget.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from lib.magnet import normalize_info_hash
+
+
+DIRECTORY_NAME = "torrents"
+URLS_DIRECTORY_NAME = "urls"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+class TorrentCache(object):
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self._directory = directory
+        self._urls_directory = os.path.join(directory, URLS_DIRECTORY_NAME)
+        self._max_bytes = max_bytes
+
+    def _torrent_path(self, info_hash):
+        return os.path.join(self._directory, info_hash + ".torrent")
+
+    def _url_path(self, url):
+        return os.path.join(self._urls_directory, _url_key(url))
+
+    def lookup(self, url):
+        """Infohash ``url`` resolved to on an earlier play, or None."""
+        data = self._read(self._url_path(url))
+        if data is None:
+            return None
+        return normalize_info_hash(data.decode("ascii", errors="replace"))
+
+    def get(self, info_hash):
+        """Cached .torrent bytes for ``info_hash``, or None."""
+        info_hash = normalize_info_hash(info_hash)
+        if info_hash is None:
+            return None
+        return self._read(self._torrent_path(info_hash))
+
+    def put(self, url, info_hash, data):
+        """Cache ``data``, bytes or a binary file object, as ``info_hash``."""
+        info_hash = normalize_info_hash(info_hash)
+        if info_hash is None:
+            return
+        try:
+            os.makedirs(self._urls_directory, exist_ok=True)
+            self._write(self._torrent_path(info_hash), data)
+            if url:
+                self._write(self._url_path(url), info_hash.encode("ascii"))
+        except OSError:
+            logging.exception("Failed to cache torrent %s", info_hash)
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the budget is met."""
+        entries = []
+        for directory in (self._directory, self._urls_directory):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if os.path.isfile(path):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process got there first.
+                pass
+            total -= size
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        try:
+            # Reads refresh the mtime that eviction orders by.
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path, data):
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp_path, "wb") as file:
+                if isinstance(data, bytes):
+                    file.write(data)
+                else:
+                    shutil.copyfileobj(data, file)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
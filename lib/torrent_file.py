@@ -0,0 +1,216 @@
+"""Streaming reader for .torrent metainfo files.
+
+Only what file selection needs is kept: the infohash and the file list. The
+``pieces`` blob, which dominates the size of large season packs, is hashed as
+it streams past and never held in memory.
+"""
+
+import hashlib
+from collections import namedtuple
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_DEPTH = 64
+MAX_INTEGER_DIGITS = 64
+
+# Strings that are hashed but never needed for file selection.
+_SKIPPED_KEYS = frozenset((b"pieces", b"piece layers"))
+
+
+TorrentMeta = namedtuple("TorrentMeta", ["info_hash", "name", "files"])
+
+
+class TorrentFileError(ValueError):
+    pass
+
+
+class TeeReader(object):
+    """File-like view of an iterable of byte chunks, e.g. ``iter_content``.
+
+    Every chunk handed to the reader is also written to ``sink``, so a
+    download is parsed and saved in one pass. ``drain`` copies whatever the
+    parser did not need to read.
+    """
+
+    def __init__(self, chunks, sink):
+        self._chunks = iter(chunks)
+        self._sink = sink
+
+    def read(self, _size=-1):
+        for chunk in self._chunks:
+            if chunk:
+                self._sink.write(chunk)
+                return chunk
+        return b""
+
+    def drain(self):
+        while self.read():
+            pass
+
+
+class _Reader(object):
+    """Buffered reader that can feed a span of consumed bytes into sha1."""
+
+    def __init__(self, file, chunk_size):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buf = b""
+        self._pos = 0
+        self._hasher = None
+        self._hash_from = 0
+
+    def _fill(self, size):
+        while len(self._buf) - self._pos < size:
+            chunk = self._file.read(
+                max(self._chunk_size, size - (len(self._buf) - self._pos))
+            )
+            if not chunk:
+                raise TorrentFileError("Truncated torrent file")
+            if self._hasher is not None:
+                self._hasher.update(memoryview(self._buf)[self._hash_from : self._pos])
+                self._hash_from = 0
+            self._buf = self._buf[self._pos :] + chunk
+            self._pos = 0
+
+    def peek(self):
+        self._fill(1)
+        return self._buf[self._pos]
+
+    def read(self, size):
+        self._fill(size)
+        data = self._buf[self._pos : self._pos + size]
+        self._pos += size
+        return data
+
+    def read_until(self, delimiter, limit):
+        while True:
+            index = self._buf.find(delimiter, self._pos)
+            if index >= 0:
+                data = self._buf[self._pos : index]
+                self._pos = index + 1
+                return data
+            if len(self._buf) - self._pos > limit:
+                raise TorrentFileError("Malformed torrent file")
+            self._fill(len(self._buf) - self._pos + 1)
+
+    def skip(self, size):
+        while size:
+            if self._pos >= len(self._buf):
+                self._fill(1)
+            step = min(size, len(self._buf) - self._pos)
+            self._pos += step
+            size -= step
+
+    def start_hash(self):
+        self._hasher = hashlib.sha1()
+        self._hash_from = self._pos
+
+    def finish_hash(self):
+        self._hasher.update(memoryview(self._buf)[self._hash_from : self._pos])
+        digest = self._hasher.hexdigest()
+        self._hasher = None
+        return digest
+
+
+class _Decoder(object):
+    def __init__(self, reader):
+        self._reader = reader
+        self.info_hash = None
+
+    def decode(self, depth=0, skip=False):
+        if depth > MAX_DEPTH:
+            raise TorrentFileError("Torrent file nested too deeply")
+        reader = self._reader
+        token = reader.peek()
+        if token == ord("i"):
+            reader.read(1)
+            try:
+                return int(reader.read_until(b"e", MAX_INTEGER_DIGITS))
+            except ValueError:
+                raise TorrentFileError("Malformed integer in torrent file")
+        if token == ord("l"):
+            reader.read(1)
+            items = []
+            while reader.peek() != ord("e"):
+                items.append(self.decode(depth + 1))
+            reader.read(1)
+            return items
+        if token == ord("d"):
+            reader.read(1)
+            result = {}
+            while reader.peek() != ord("e"):
+                key = self.decode_string()
+                if depth == 0 and key == b"info":
+                    reader.start_hash()
+                    result[key] = self.decode(depth + 1)
+                    self.info_hash = reader.finish_hash()
+                else:
+                    result[key] = self.decode(depth + 1, skip=key in _SKIPPED_KEYS)
+            reader.read(1)
+            return result
+        if ord("0") <= token <= ord("9"):
+            return self.decode_string(skip=skip)
+        raise TorrentFileError("Unexpected byte {!r} in torrent file".format(token))
+
+    def decode_string(self, skip=False):
+        length = self._reader.read_until(b":", MAX_INTEGER_DIGITS)
+        try:
+            length = int(length)
+        except ValueError:
+            raise TorrentFileError("Malformed string length in torrent file")
+        if skip:
+            self._reader.skip(length)
+            return None
+        return self._reader.read(length)
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return ""
+
+
+def _best(entry, key):
+    """Prefer the ``.utf-8`` variant some clients add next to a field."""
+    value = entry.get(key + b".utf-8")
+    return value if value is not None else entry.get(key)
+
+
+def _files(info):
+    name = _text(_best(info, b"name"))
+    entries = info.get(b"files")
+    if entries is None:
+        length = info.get(b"length")
+        if not isinstance(length, int):
+            raise TorrentFileError("Torrent file has no files")
+        return name, [{"id": 1, "path": name, "length": length}]
+
+    if not isinstance(entries, list):
+        raise TorrentFileError("Malformed file list in torrent file")
+    files = []
+    # Ids follow TorrServer's file_stats: 1-based, in info dictionary order,
+    # with the torrent name as the first path component.
+    for index, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise TorrentFileError("Malformed file entry in torrent file")
+        parts = _best(entry, b"path")
+        length = entry.get(b"length")
+        if not isinstance(parts, list) or not isinstance(length, int):
+            raise TorrentFileError("Malformed file entry in torrent file")
+        path = "/".join([name] + [_text(part) for part in parts])
+        files.append({"id": index, "path": path, "length": length})
+    return name, files
+
+
+def parse_torrent(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Read a .torrent from a binary file object into a ``TorrentMeta``.
+
+    Raises ``TorrentFileError`` when the data is not a valid metainfo file.
+    """
+    decoder = _Decoder(_Reader(file, chunk_size))
+    metainfo = decoder.decode()
+    info = metainfo.get(b"info") if isinstance(metainfo, dict) else None
+    if not isinstance(info, dict):
+        raise TorrentFileError("Torrent file has no info dictionary")
+    name, files = _files(info)
+    return TorrentMeta(info_hash=decoder.info_hash, name=name, files=files)
@@ -1,12 +1,90 @@
-from json import dumps
+import base64
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
+import time
+
 import requests
 from requests.auth import HTTPBasicAuth
-from urllib.parse import quote
+from urllib.parse import quote, urlencode
+
+from lib.json_codec import encode, loads
+from lib.torrserver.jsonstream import iter_json_array
+from lib.torrserver.metrics import RequestMetrics
+
+
+DEFAULT_BATCH_WORKERS = 8
+
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# Read timeouts for endpoints whose latency differs from the default. Keys are
+# the first path segment of the request URL.
+ENDPOINT_READ_TIMEOUTS = {
+    "/echo": 5,
+    "/settings": 10,
+    "/torrent": 60,
+    "/search": 60,
+    "/ffp": 60,
+}
+
+# Failures that mean TorrServer cannot be reached, the only ones counted by the
+# circuit breaker. Read timeouts and HTTP errors come from a server that
+# answered. requests.ConnectTimeout is a requests.ConnectionError.
+CONNECTION_ERRORS = (requests.ConnectionError, ConnectionError)
+
+TorrentInfoResult = namedtuple("TorrentInfoResult", ("hash", "info", "error"))
+
+
+def batch_torrent_infos(get_info, hashes, max_workers=DEFAULT_BATCH_WORKERS, timeout=None):
+    """run ``get_info(hash)`` for many hashes on a bounded thread pool"""
+    hashes = list(hashes)
+    if not hashes:
+        return []
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(hashes))),
+        thread_name_prefix="TorrServerBatch",
+    )
+    futures = []
+    try:
+        futures.extend(executor.submit(get_info, h) for h in hashes)
+        wait(futures, timeout=timeout)
+    finally:
+        # shutdown(cancel_futures=True) needs Python 3.9; Kodi 19/20 may ship 3.8.
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    results = []
+    for info_hash, future in zip(hashes, futures):
+        if future.cancelled() or not future.done():
+            error = TorrServerError(
+                "TorrServer /stream timed out after {}s".format(timeout)
+            )
+            results.append(TorrentInfoResult(info_hash, None, error))
+        elif future.exception() is not None:
+            results.append(TorrentInfoResult(info_hash, None, future.exception()))
+        else:
+            results.append(TorrentInfoResult(info_hash, future.result(), None))
+    return results
 
 
 class TorrServer(object):
-    def __init__(self, host, port, username, password, ssl_enabled=False, session=None):
+    def __init__(
+        self,
+        host,
+        port,
+        username,
+        password,
+        ssl_enabled=False,
+        session=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        endpoint_timeouts=None,
+        cache=None,
+        metrics=None,
+        breaker=None,
+    ):
         self._base_url = "{}://{}:{}".format(
             "https" if ssl_enabled else "http", host, port
         )
@@ -14,6 +92,28 @@ class TorrServer(object):
         self._password = password
         self._auth = HTTPBasicAuth(self._username, self._password)
         self._session = session or requests
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._endpoint_timeouts = dict(ENDPOINT_READ_TIMEOUTS)
+        if endpoint_timeouts:
+            self._endpoint_timeouts.update(endpoint_timeouts)
+        self._cache = cache
+        self._metrics = metrics or RequestMetrics()
+        self._breaker = breaker
+
+    @property
+    def base_url(self):
+        return self._base_url
+
+    @property
+    def session(self):
+        """HTTP session used for TorrServer requests, reusable for stream URLs"""
+        return self._session
+
+    @property
+    def metrics(self):
+        """per endpoint request metrics (see RequestMetrics.snapshot)"""
+        return self._metrics
 
     @property
     def torr_version(self):
@@ -21,10 +121,10 @@ class TorrServer(object):
         return self._get("/echo").content
 
     def add_magnet(self, magnet, title="", poster="", data=""):
-        return self._parse_json_response(
+        info_hash = self._parse_json_response(
             self._post(
             "/torrents",
-            data=dumps(
+            data=encode(
                 {
                     "action": "add",
                     "link": magnet,
@@ -37,25 +137,15 @@ class TorrServer(object):
             ),
             "/torrents",
         )["hash"]
+        self._invalidate(info_hash)
+        return info_hash
 
     def add_torrent(self, path, title="", poster="", data=""):
         with open(path, "rb") as file:
-            return self._parse_json_response(
-                self._post(
-                    "/torrent/upload",
-                    files={"file": file},
-                    data={
-                        "save": "true",
-                        "title": title,
-                        "poster": poster,
-                        "data": data,
-                    },
-                ),
-                "/torrent/upload",
-            )["hash"]
+            return self.add_torrent_obj(file, title=title, poster=poster, data=data)
 
     def add_torrent_obj(self, obj, title="", poster="", data=""):
-        return self._parse_json_response(
+        info_hash = self._parse_json_response(
             self._post(
                 "/torrent/upload",
                 files={"file": obj},
@@ -68,6 +158,8 @@ class TorrServer(object):
             ),
             "/torrent/upload",
         )["hash"]
+        self._invalidate(info_hash)
+        return info_hash
 
     def torrents(self):
         """read info about all torrents (doesn't fill file_stats info)
@@ -75,13 +167,46 @@ class TorrServer(object):
         Returns the raw list from TorrServer. Unlike single-object endpoints,
         /torrents list returns a proper JSON array — pass it through as-is.
         """
-        response = self._post("/torrents", data=dumps({"action": "list"}))
+        return self._cached(("torrents",), self._load_torrents)
+
+    def _load_torrents(self):
+        response = self._post("/torrents", data=encode({"action": "list"}))
         if response.status_code != 200:
             raise TorrServerError(
                 "TorrServer /torrents returned HTTP {}".format(response.status_code),
                 status_code=response.status_code,
             )
-        return response.json()
+        return loads(response.content)
+
+    def iter_torrents(self, fields=None, chunk_size=16 * 1024):
+        """iterate over the /torrents list without loading it whole
+
+        The response body is parsed incrementally while it is read from the
+        socket, so memory stays flat regardless of the DB size. When
+        ``fields`` is given, each yielded torrent only keeps those keys.
+        """
+        response = self._post("/torrents", data=encode({"action": "list"}), stream=True)
+        try:
+            if response.status_code != 200:
+                raise TorrServerError(
+                    "TorrServer /torrents returned HTTP {}".format(response.status_code),
+                    status_code=response.status_code,
+                )
+            try:
+                for torrent in iter_json_array(response.iter_content(chunk_size)):
+                    if fields is not None and isinstance(torrent, dict):
+                        torrent = {k: torrent[k] for k in fields if k in torrent}
+                    yield torrent
+            except ValueError as e:
+                raise TorrServerError(
+                    "TorrServer /torrents returned invalid JSON: {}".format(e),
+                    status_code=response.status_code,
+                )
+            except requests.RequestException as e:
+                # The body broke off mid-list (reset, chunking or read timeout).
+                raise TorrServerError(str(e))
+        finally:
+            response.close()
 
     def search(self, query):
         """search torrents via Rutor (GET /search/?query=...).
@@ -108,7 +233,7 @@ class TorrServer(object):
                 status_code=response.status_code,
             )
         try:
-            result = response.json()
+            result = loads(response.content)
         except ValueError:
             raise TorrServerError(
                 "TorrServer /search returned invalid JSON",
@@ -122,9 +247,12 @@ class TorrServer(object):
 
     def get_torrent_info_by_hash(self, hash):
         """not extended info"""
-        return self._parse_json_response(
-            self._post("/torrents", data=dumps({"action": "get", "hash": hash})),
-            "/torrents",
+        return self._cached(
+            ("torrent", hash),
+            lambda: self._parse_json_response(
+                self._post("/torrents", data=encode({"action": "get", "hash": hash})),
+                "/torrents",
+            ),
         )
 
     def set_torrent(self, hash, title=None, poster=None, category=None, data=None):
@@ -138,42 +266,79 @@ class TorrServer(object):
             payload["category"] = category
         if data is not None:
             payload["data"] = data
-        return self._parse_json_response(
-            self._post("/torrents", data=dumps(payload)),
+        result = self._parse_json_response(
+            self._post("/torrents", data=encode(payload)),
             "/torrents",
         )
+        self._invalidate(hash)
+        return result
 
     def get_torrent_info(self, link):
         """read extended info of one torrent"""
-        return self._parse_json_response(
-            self._get("/stream", params={"link": link, "stat": "true"}),
-            "/stream",
+        return self._cached(
+            ("torrent_info", link),
+            lambda: self._parse_json_response(
+                self._get("/stream", params={"link": link, "stat": "true"}),
+                "/stream",
+            ),
+        )
+
+    def get_torrent_infos(self, hashes, max_workers=DEFAULT_BATCH_WORKERS, timeout=None):
+        """read extended info of many torrents concurrently
+
+        Returns one TorrentInfoResult per hash, in input order. A failing
+        hash carries its TorrServerError in ``error`` instead of failing the
+        batch; hashes still pending after ``timeout`` seconds get a timeout
+        error.
+        """
+        return batch_torrent_infos(
+            self.get_torrent_info, hashes, max_workers=max_workers, timeout=timeout
         )
 
     def get_torrent_file_info(self, link, file_index=1):
         """read extended info of file of torrent"""
-        return self._parse_json_response(
-            self._get(
+        return self._cached(
+            ("file_info", link, file_index),
+            lambda: self._parse_json_response(
+                self._get(
+                    "/stream",
+                    params={"link": link, "index": file_index, "stat": "true"},
+                ),
                 "/stream",
-                params={"link": link, "index": file_index, "stat": "true"},
             ),
-            "/stream",
         )
 
     def drop_torrent(self, hash):
-        return self._post("/torrents", data=dumps({"action": "drop", "hash": hash}))
+        response = self._post("/torrents", data=encode({"action": "drop", "hash": hash}))
+        self._invalidate(hash)
+        return response
 
     def remove_torrent(self, info_hash, save_to_db=True):
         """delete torrent from TorrServer"""
-        return self._post(
+        response = self._post(
             "/torrents",
-            data=dumps({"action": "rem", "hash": info_hash, "save_to_db": save_to_db}),
+            data=encode({"action": "rem", "hash": info_hash, "save_to_db": save_to_db}),
         )
+        self._invalidate(info_hash)
+        return response
 
     def download_file(self, hash, file_id):
         """stream a specific file's content from a torrent (GET /play/{hash}/{id})"""
         return self._get("/play/{}/{}".format(hash, file_id), stream=True)
 
+    def get_ffprobe(self, hash, file_id):
+        """ffprobe output (format and streams) of a file (GET /ffp/{hash}/{id})"""
+        return self._parse_json_response(
+            self._get("/ffp/{}/{}".format(hash, file_id)), "/ffp"
+        )
+
+    def get_cache(self, hash):
+        """cache and piece state of a torrent (POST /cache)"""
+        return self._parse_json_response(
+            self._post("/cache", data=encode({"action": "get", "hash": hash})),
+            "/cache",
+        )
+
     def play_torrent(self, hash, id):
         """Play given torrent referenced by hash"""
         """ application/octet-stream """
@@ -188,7 +353,11 @@ class TorrServer(object):
         )
 
     def preload_torrent(self, link, file_id=1, title=""):
-        """preload torrent"""
+        """preload torrent
+
+        TorrServer answers only once the preload finished, so no read timeout
+        is applied to this call.
+        """
         return self._get(
             "/stream",
             params={
@@ -198,16 +367,112 @@ class TorrServer(object):
                 "stat": "true",
                 "preload": "true",
             },
+            timeout=(self._connect_timeout, None),
+        )
+
+    def preload_request(self, link, file_id=1, title=""):
+        """URL and headers of the preload request of ``preload_torrent``
+
+        For callers that issue the request on a connection they own, so that
+        closing it cancels the preload (see lib.preload). Report the outcome
+        with ``record_preload``.
+        """
+        if self._breaker is not None and not self._breaker.allow_request():
+            raise TorrServerUnavailableError(
+                "TorrServer at {} is unavailable".format(self._base_url)
+            )
+        params = {
+            "link": link,
+            "index": file_id,
+            "title": title,
+            "stat": "true",
+            "preload": "true",
+        }
+        headers = {}
+        if self._username or self._password:
+            credentials = "{}:{}".format(self._username or "", self._password or "")
+            headers["Authorization"] = "Basic " + base64.b64encode(
+                credentials.encode("utf-8")
+            ).decode("ascii")
+        return "{}/stream?{}".format(self._base_url, urlencode(params)), headers
+
+    def record_preload(self, link, seconds, status=None, error=None, unreachable=False):
+        """Record a ``preload_request`` issued outside ``_request``
+
+        Counts it in the 'GET /stream preload' metrics and, like ``_request``,
+        reports to the breaker: a failure when TorrServer could not be
+        reached, a success when it answered.
+        """
+        self._metrics.record("GET /stream preload", seconds, status=status, error=error)
+        if self._breaker is None:
+            return
+        if unreachable:
+            self._breaker.record_failure()
+        elif status is not None:
+            self._breaker.record_success()
+
+    def read_stream_range(self, link, file_id, start, end, read_timeout=None):
+        """read bytes ``start``..``end`` (inclusive) of a file via /stream
+
+        Returns ``(data, total_length)``; ``total_length`` comes from
+        Content-Range and is None when the server did not send one. At most
+        the requested number of bytes is read, even if the server ignores the
+        Range header.
+        """
+        size = end - start + 1
+        kwargs = {}
+        if read_timeout is not None:
+            kwargs["timeout"] = (self._connect_timeout, read_timeout)
+        response = self._get(
+            "/stream",
+            params={"link": link, "index": file_id, "play": "true"},
+            headers={"Range": "bytes={}-{}".format(start, end)},
+            stream=True,
+            **kwargs,
         )
+        try:
+            if response.status_code not in (200, 206):
+                raise TorrServerError(
+                    "TorrServer /stream returned {}".format(response.status_code),
+                    status_code=response.status_code,
+                )
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= size:
+                    break
+        except requests.RequestException as e:
+            raise TorrServerError(str(e))
+        finally:
+            response.close()
+        total = None
+        content_range = response.headers.get("Content-Range", "")
+        if "/" in content_range:
+            try:
+                total = int(content_range.rsplit("/", 1)[1])
+            except ValueError:
+                total = None
+        return b"".join(chunks)[:size], total
 
     def get_stream_url(self, link, path, file_id):
         """returns the stream url"""
         return f"{self._base_url}/stream/{quote(path)}?link={link}&index={file_id}&play"
 
     def get_settings(self):
-        res = self._post("/settings", data=dumps({"action": "get"}))
+        res = self._post("/settings", data=encode({"action": "get"}))
         return self._parse_json_response(res, "/settings")
 
+    def _cached(self, key, loader):
+        if self._cache is None:
+            return loader()
+        return self._cache.get_or_load(key, loader)
+
+    def _invalidate(self, info_hash):
+        if self._cache is not None:
+            self._cache.invalidate(info_hash)
+
     def _parse_json_response(self, response, endpoint):
         status_code = getattr(response, "status_code", None)
         text = getattr(response, "text", "") or ""
@@ -224,7 +489,7 @@ class TorrServer(object):
             )
 
         try:
-            result = response.json()
+            result = loads(response.content)
         except ValueError:
             raise TorrServerError(
                 "TorrServer {} returned invalid JSON{}".format(
@@ -259,16 +524,76 @@ class TorrServer(object):
     def _delete(self, url, **kwargs):
         return self._request("delete", url, **kwargs)
 
+    def _timeout_for(self, url):
+        endpoint = "/" + url.lstrip("/").split("/", 1)[0]
+        read_timeout = self._endpoint_timeouts.get(endpoint, self._read_timeout)
+        return self._connect_timeout, read_timeout
+
+    @staticmethod
+    def _metric_name(method, url, kwargs):
+        """endpoint label such as 'GET /stream stat' or 'POST /torrents add'"""
+        endpoint = "/" + url.lstrip("/").split("/", 1)[0]
+        name = "{} {}".format(method.upper(), endpoint)
+        params = kwargs.get("params") or {}
+        if endpoint == "/stream":
+            for flag in ("preload", "play", "stat"):
+                if flag in params:
+                    return "{} {}".format(name, flag)
+        data = kwargs.get("data")
+        if isinstance(data, bytes) and data.startswith(b"{"):
+            try:
+                action = loads(data).get("action")
+            except ValueError:
+                action = None
+            if action:
+                return "{} {}".format(name, action)
+        return name
+
+    @staticmethod
+    def _response_size(response, streamed):
+        try:
+            length = response.headers.get("Content-Length")
+            if length is not None:
+                return int(length)
+            if not streamed:
+                return len(response.content)
+        except (AttributeError, TypeError, ValueError):
+            pass
+        return None
+
     def _request(self, method, url, **kwargs):
+        if self._breaker is not None and not self._breaker.allow_request():
+            raise TorrServerUnavailableError(
+                "TorrServer at {} is unavailable".format(self._base_url)
+            )
+        kwargs.setdefault("timeout", self._timeout_for(url))
+        name = self._metric_name(method, url, kwargs)
+        start = time.monotonic()
         try:
-            return self._session.request(
+            response = self._session.request(
                 method, self._base_url + url, auth=self._auth, **kwargs
             )
         except Exception as e:
+            self._metrics.record(name, time.monotonic() - start, error=e)
+            if self._breaker is not None and isinstance(e, CONNECTION_ERRORS):
+                self._breaker.record_failure()
             raise TorrServerError(str(e))
+        if self._breaker is not None:
+            self._breaker.record_success()
+        self._metrics.record(
+            name,
+            time.monotonic() - start,
+            size=self._response_size(response, kwargs.get("stream", False)),
+            status=getattr(response, "status_code", None),
+        )
+        return response
 
 
 class TorrServerError(Exception):
     def __init__(self, message, status_code=None):
         super(TorrServerError, self).__init__(message)
         self.status_code = status_code
+
+
+class TorrServerUnavailableError(TorrServerError):
+    """raised without a request while the circuit breaker is open"""
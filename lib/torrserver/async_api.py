@@ -0,0 +1,139 @@
+"""Asyncio variant of the TorrServer client for concurrent service-side jobs.
+
+Kodi does not ship an asyncio HTTP library, so each call runs the blocking
+TorrServer client on a bounded thread pool. All workers share the client's
+pooled keep-alive session, which gives connection reuse across the fan-out.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+DEFAULT_CONCURRENCY = 8
+
+
+async def gather_limited(aws, limit=DEFAULT_CONCURRENCY, return_exceptions=False):
+    """Like asyncio.gather, but run at most ``limit`` awaitables at a time.
+
+    Results are returned in input order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(run(aw) for aw in aws), return_exceptions=return_exceptions
+    )
+
+
+class AsyncTorrServer(object):
+    def __init__(self, client, max_workers=DEFAULT_CONCURRENCY):
+        self._client = client
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="AsyncTorrServer"
+        )
+        self._loop = None
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    async def torrents(self):
+        return await self._call(self._client.torrents)
+
+    async def get_torrent_info(self, link):
+        return await self._call(self._client.get_torrent_info, link)
+
+    async def get_torrent_file_info(self, link, file_index=1):
+        return await self._call(self._client.get_torrent_file_info, link, file_index)
+
+    async def add_magnet(self, magnet, title="", poster="", data=""):
+        return await self._call(
+            self._client.add_magnet, magnet, title=title, poster=poster, data=data
+        )
+
+    async def search(self, query):
+        return await self._call(self._client.search, query)
+
+    async def preload_torrent(self, link, file_id=1, title=""):
+        return await self._call(
+            self._client.preload_torrent, link, file_id=file_id, title=title
+        )
+
+    async def set_torrent(self, hash, title=None, poster=None, category=None, data=None):
+        return await self._call(
+            self._client.set_torrent,
+            hash,
+            title=title,
+            poster=poster,
+            category=category,
+            data=data,
+        )
+
+    async def remove_torrent(self, info_hash, save_to_db=True):
+        return await self._call(
+            self._client.remove_torrent, info_hash, save_to_db=save_to_db
+        )
+
+    async def drop_torrent(self, hash):
+        return await self._call(self._client.drop_torrent, hash)
+
+    async def get_cache(self, hash):
+        return await self._call(self._client.get_cache, hash)
+
+    async def get_torrent_infos(self, hashes, limit=None):
+        """extended info for many torrents; failed hashes yield their exception"""
+        return await gather_limited(
+            (self.get_torrent_info(h) for h in hashes),
+            limit=limit or self._max_workers,
+            return_exceptions=True,
+        )
+
+    async def remove_torrents(self, hashes, save_to_db=True, limit=None):
+        """remove many torrents; failed hashes yield their exception"""
+        return await gather_limited(
+            (self.remove_torrent(h, save_to_db=save_to_db) for h in hashes),
+            limit=limit or self._max_workers,
+            return_exceptions=True,
+        )
+
+    async def drop_torrents(self, hashes, limit=None):
+        """disconnect many torrents; failed hashes yield their exception"""
+        return await gather_limited(
+            (self.drop_torrent(h) for h in hashes),
+            limit=limit or self._max_workers,
+            return_exceptions=True,
+        )
+
+    async def warm_metadata(self, hashes, limit=None):
+        """ask TorrServer to connect and resolve metadata for many torrents"""
+        return await self.get_torrent_infos(hashes, limit=limit)
+
+    def run(self, coro):
+        """Run ``coro`` to completion from synchronous code.
+
+        The service calls this from its monitor loop; every call reuses the
+        same event loop.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
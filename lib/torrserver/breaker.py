@@ -0,0 +1,107 @@
+"""Circuit breaker shared by every process talking to TorrServer.
+
+The state lives in a small JSON file keyed by server, so a plugin invocation
+learns that TorrServer is down from earlier invocations (or from the service
+probe) and fails in milliseconds instead of waiting for a connect timeout.
+"""
+
+import logging
+import threading
+import time
+
+from lib.torrserver.statefile import SharedStateFile
+
+
+STATE_FILE_NAME = "torrserver_breaker.json"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30
+
+
+class CircuitBreaker(object):
+    """Closed/open/half-open breaker persisted in ``state_path`` under ``name``.
+
+    After ``failure_threshold`` consecutive connection failures the breaker
+    opens and rejects requests. Once ``reset_timeout`` seconds have passed a
+    single trial request is let through (half-open): success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name,
+        state_path=None,
+        failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout=DEFAULT_RESET_TIMEOUT,
+        clock=time.time,
+    ):
+        self._name = name
+        self._state_file = SharedStateFile(state_path)
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current()["state"]
+
+    def allow_request(self):
+        with self._lock:
+            current = self._current()
+            if current["state"] == CLOSED:
+                return True
+            if self._clock() - current["changed_at"] < self._reset_timeout:
+                return False
+            # Let one trial through and hold others back for another period.
+            self._store(HALF_OPEN, current["failures"])
+            return True
+
+    def record_success(self):
+        with self._lock:
+            current = self._current()
+            if current["state"] != CLOSED or current["failures"]:
+                if current["state"] != CLOSED:
+                    logging.info("TorrServer %s is reachable again", self._name)
+                self._store(CLOSED, 0)
+
+    def record_failure(self):
+        with self._lock:
+            current = self._current()
+            failures = current["failures"] + 1
+            if current["state"] == HALF_OPEN or failures >= self._failure_threshold:
+                if current["state"] == CLOSED:
+                    logging.warning(
+                        "TorrServer %s unreachable after %d failures, failing fast for %ss",
+                        self._name,
+                        failures,
+                        self._reset_timeout,
+                    )
+                self._store(OPEN, failures)
+            else:
+                self._store(CLOSED, failures)
+
+    def _current(self):
+        current = self._state_file.load().get(self._name)
+        if not isinstance(current, dict):
+            return {"state": CLOSED, "failures": 0, "changed_at": 0}
+        return current
+
+    def _store(self, state, failures):
+        def store(states):
+            states[self._name] = {
+                "state": state,
+                "failures": failures,
+                "changed_at": self._clock(),
+            }
+
+        self._state_file.update(store)
@@ -0,0 +1,92 @@
+"""Opt-in TTL response cache with in-flight request collapsing."""
+
+import threading
+import time
+
+
+# Seconds a parsed response stays fresh, keyed by cache key kind. Status
+# kinds stay at or below the shortest buffering poll interval so adaptive
+# polling near completion sees fresh numbers.
+DEFAULT_TTLS = {
+    "torrents": 2.0,
+    "torrent": 2.0,
+    "torrent_info": 0.25,
+    "file_info": 0.2,
+}
+
+
+class _Flight(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache(object):
+    """Cache parsed TorrServer responses for a short, per-kind TTL.
+
+    Keys are tuples whose first item is the kind (used to pick the TTL) and
+    whose second item, when present, is the torrent hash (used for
+    invalidation). Concurrent lookups of the same missing key share a single
+    load. Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, ttls=None, clock=time.monotonic):
+        self._ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self._ttls.update(ttls)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._flights = {}
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        ttl = self._ttls.get(key[0])
+        if not ttl:
+            return loader()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (self._clock() + ttl, flight.result)
+            return flight.result
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+    def invalidate(self, info_hash=None):
+        """Drop entries of one torrent plus the torrent list, or everything."""
+        with self._lock:
+            self._generation += 1
+            if info_hash is None:
+                self._entries.clear()
+                self._flights.clear()
+                return
+            for store in (self._entries, self._flights):
+                for key in list(store):
+                    if key[0] == "torrents" or (len(key) > 1 and key[1] == info_hash):
+                        del store[key]
@@ -0,0 +1,78 @@
+"""Incremental parsing of JSON arrays received in chunks."""
+
+import codecs
+from json import JSONDecoder
+
+
+_WHITESPACE = " \t\n\r"
+_decoder = JSONDecoder()
+
+
+def _skip_whitespace(buf, pos):
+    while pos < len(buf) and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array one at a time.
+
+    ``chunks`` is an iterable of bytes (e.g. ``response.iter_content()``).
+    Only the element being decoded is kept in memory, so peak usage depends on
+    the largest element rather than on the array size. Raises ValueError when
+    the input is not a well-formed JSON array.
+    """
+    chunks = iter(chunks)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    exhausted = False
+
+    def read_more():
+        nonlocal buf, pos, exhausted
+        for chunk in chunks:
+            if chunk:
+                buf = buf[pos:] + utf8.decode(chunk)
+                pos = 0
+                return True
+        buf = buf[pos:] + utf8.decode(b"", final=True)
+        pos = 0
+        exhausted = True
+        return False
+
+    expect = "["
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos >= len(buf):
+            if exhausted:
+                raise ValueError("Unexpected end of JSON array")
+            read_more()
+            continue
+
+        if expect == "[":
+            if buf[pos] != "[":
+                raise ValueError("Expected JSON array")
+            pos += 1
+            expect = "value or ]"
+        elif expect == ", or ]" or (expect == "value or ]" and buf[pos] == "]"):
+            if buf[pos] == "]":
+                return
+            if buf[pos] != ",":
+                raise ValueError("Expected ',' or ']' at position {}".format(pos))
+            pos += 1
+            expect = "value"
+        else:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except ValueError:
+                if exhausted:
+                    raise
+                read_more()
+                continue
+            if end >= len(buf) and not exhausted:
+                # A number or literal may continue in the next chunk.
+                read_more()
+                continue
+            pos = end
+            expect = ", or ]"
+            yield value
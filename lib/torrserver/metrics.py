@@ -0,0 +1,252 @@
+"""In-memory latency and error metrics for TorrServer requests.
+
+Every process (plugin invocations, the service) merges what it recorded into
+one JSON file, so the file covers all of them. The raw histogram buckets are
+stored next to the summaries to keep the merged percentiles exact.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+
+from lib import json_codec
+from lib.torrserver.statefile import file_lock
+
+
+# Values below 2 * SUB_BUCKETS are recorded exactly; above that each power of
+# two is split into SUB_BUCKETS linear buckets, bounding the error to ~3%.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+PERCENTILES = (50, 95, 99)
+DUMP_FILE_NAME = "metrics.json"
+
+
+def _bucket_index(value):
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - (SUB_BUCKET_BITS + 1)
+    return 2 * SUB_BUCKETS + (shift - 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_upper_bound(index):
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = (index - 2 * SUB_BUCKETS) // SUB_BUCKETS + 1
+    top = (index - 2 * SUB_BUCKETS) % SUB_BUCKETS + SUB_BUCKETS
+    return ((top + 1) << shift) - 1
+
+
+class Histogram(object):
+    """HDR-style log-linear histogram of non-negative integers."""
+
+    def __init__(self):
+        self._counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = max(0, int(value))
+        index = _bucket_index(value)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        target = max(1, int(math.ceil(percent / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= target:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def to_dict(self):
+        return {
+            "buckets": {str(k): v for k, v in self._counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram._counts = {int(k): v for k, v in data.get("buckets", {}).items()}
+        histogram.count = data.get("count", 0)
+        histogram.total = data.get("total", 0)
+        histogram.min = data.get("min")
+        histogram.max = data.get("max")
+        return histogram
+
+    def summary(self, scale=1):
+        if not self.count:
+            return {"count": 0}
+        result = {
+            "count": self.count,
+            "min": self.min / scale,
+            "max": self.max / scale,
+            "mean": self.total / float(self.count) / scale,
+        }
+        for percent in PERCENTILES:
+            result["p{}".format(percent)] = self.percentile(percent) / scale
+        return result
+
+
+class _EndpointStats(object):
+    def __init__(self):
+        self.latency_us = Histogram()
+        self.size_bytes = Histogram()
+        self.status = {}
+        self.errors = {}
+
+    def record(self, seconds, size, status, error):
+        self.latency_us.record(seconds * 1e6)
+        if size is not None:
+            self.size_bytes.record(size)
+        if status is not None:
+            self.status[status] = self.status.get(status, 0) + 1
+        if error is not None:
+            error_name = type(error).__name__
+            self.errors[error_name] = self.errors.get(error_name, 0) + 1
+
+    def merge(self, other):
+        self.latency_us.merge(other.latency_us)
+        self.size_bytes.merge(other.size_bytes)
+        for key, count in other.status.items():
+            self.status[key] = self.status.get(key, 0) + count
+        for key, count in other.errors.items():
+            self.errors[key] = self.errors.get(key, 0) + count
+
+    def to_dict(self):
+        return {
+            "latency_us": self.latency_us.to_dict(),
+            "size_bytes": self.size_bytes.to_dict(),
+            "status": {str(k): v for k, v in self.status.items()},
+            "errors": dict(self.errors),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.latency_us = Histogram.from_dict(data.get("latency_us", {}))
+        stats.size_bytes = Histogram.from_dict(data.get("size_bytes", {}))
+        stats.status = {int(k): v for k, v in data.get("status", {}).items()}
+        stats.errors = dict(data.get("errors", {}))
+        return stats
+
+    def summary(self):
+        return {
+            "latency_ms": self.latency_us.summary(scale=1000.0),
+            "size_bytes": self.size_bytes.summary(),
+            "status": {str(k): v for k, v in self.status.items()},
+            "errors": dict(self.errors),
+        }
+
+
+class RequestMetrics(object):
+    """Per endpoint and method request metrics.
+
+    When ``dump_path`` is set, ``dump`` merges everything recorded since the
+    previous dump into that file. The plugin dumps at the end of each
+    invocation; long-running processes also dump at most every
+    ``dump_interval`` seconds as requests are recorded.
+    """
+
+    def __init__(self, dump_path=None, dump_interval=60, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pending = {}
+        self._dump_path = dump_path
+        self._dump_interval = dump_interval
+        self._clock = clock
+        self._last_dump = clock()
+
+    def record(self, name, seconds, size=None, status=None, error=None):
+        with self._lock:
+            for stats_by_name in (self._stats, self._pending):
+                stats = stats_by_name.get(name)
+                if stats is None:
+                    stats = stats_by_name[name] = _EndpointStats()
+                stats.record(seconds, size, status, error)
+        self.maybe_dump()
+
+    def snapshot(self):
+        """Summaries of this process's requests."""
+        with self._lock:
+            return {name: stats.summary() for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._pending.clear()
+
+    def maybe_dump(self):
+        if not self._dump_path or self._clock() - self._last_dump < self._dump_interval:
+            return
+        self.dump()
+
+    def dump(self, path=None):
+        """Merge the requests recorded since the last dump into ``path``.
+
+        Nothing is written when no request was recorded.
+        """
+        path = path or self._dump_path
+        if not path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_dump = self._clock()
+        if not pending:
+            return
+        with file_lock(path):
+            merged = self._load(path)
+            for name, stats in pending.items():
+                merged.setdefault(name, _EndpointStats()).merge(stats)
+            tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json_codec.dump(
+                        {
+                            "timestamp": time.time(),
+                            "endpoints": {
+                                name: stats.summary() for name, stats in merged.items()
+                            },
+                            "histograms": {
+                                name: stats.to_dict() for name, stats in merged.items()
+                            },
+                        },
+                        file,
+                    )
+                os.replace(tmp_path, path)
+            except Exception:
+                logging.exception("Failed to dump TorrServer metrics to %s", path)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json_codec.load(file)
+            return {
+                name: _EndpointStats.from_dict(stats)
+                for name, stats in data.get("histograms", {}).items()
+            }
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
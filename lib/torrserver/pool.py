@@ -0,0 +1,374 @@
+"""Route TorrServer calls across several instances.
+
+Nodes are probed for health and latency, new torrents go to the least-loaded
+healthy node, and each hash stays pinned to the node that holds it. Health and
+pins are persisted in a shared state file so every plugin invocation and the
+service see the same routing table.
+"""
+
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.torrserver.api import (
+    DEFAULT_BATCH_WORKERS,
+    TorrServerError,
+    batch_torrent_infos,
+)
+from lib.torrserver.statefile import SharedStateFile
+
+
+STATE_FILE_NAME = "torrserver_pool.json"
+DEFAULT_PROBE_INTERVAL = 30
+LATENCY_SMOOTHING = 0.3
+MAX_PINS = 2000
+
+
+def is_connection_error(exc):
+    """TorrServerError raised before any HTTP status was received"""
+    return isinstance(exc, TorrServerError) and exc.status_code is None
+
+
+class TorrServerPool(object):
+    def __init__(
+        self,
+        clients,
+        state_path=None,
+        probe_interval=DEFAULT_PROBE_INTERVAL,
+        clock=time.time,
+    ):
+        if not clients:
+            raise ValueError("TorrServerPool needs at least one client")
+        self._clients = list(clients)
+        self._by_url = {client.base_url: client for client in self._clients}
+        self._state = SharedStateFile(state_path)
+        self._probe_interval = probe_interval
+        self._clock = clock
+
+    @property
+    def base_url(self):
+        return self._clients[0].base_url
+
+    @property
+    def session(self):
+        return self._clients[0].session
+
+    @property
+    def metrics(self):
+        return self._clients[0].metrics
+
+    @property
+    def clients(self):
+        return list(self._clients)
+
+    # Health and routing state
+
+    def probe(self):
+        """Measure /echo latency of every node concurrently and persist it."""
+
+        def echo(client):
+            start = time.monotonic()
+            try:
+                client.torr_version
+            except TorrServerError as e:
+                logging.debug("TorrServer %s probe failed: %s", client.base_url, e)
+                return client.base_url, None
+            return client.base_url, time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=len(self._clients)) as executor:
+            results = list(executor.map(echo, self._clients))
+
+        now = self._clock()
+
+        def update(data):
+            nodes = dict(data.get("nodes", {}))
+            for url, latency in results:
+                previous = nodes.get(url, {})
+                smoothed = previous.get("latency")
+                if latency is not None:
+                    smoothed = (
+                        latency
+                        if smoothed is None
+                        else smoothed + LATENCY_SMOOTHING * (latency - smoothed)
+                    )
+                nodes[url] = {
+                    "healthy": latency is not None,
+                    "latency": smoothed,
+                    "probed_at": now,
+                }
+            data["nodes"] = nodes
+
+        self._state.update(update)
+
+    def probe_if_stale(self):
+        nodes = self._state.load().get("nodes", {})
+        now = self._clock()
+        if any(
+            now - nodes.get(client.base_url, {}).get("probed_at", 0)
+            >= self._probe_interval
+            for client in self._clients
+        ):
+            self.probe()
+
+    def ranked(self, exclude=()):
+        """Healthy nodes, least loaded first, then lowest latency."""
+        self.probe_if_stale()
+        data = self._state.load()
+        nodes = data.get("nodes", {})
+        load = Counter(data.get("pins", {}).values())
+
+        def key(client):
+            latency = nodes.get(client.base_url, {}).get("latency")
+            return load[client.base_url], float("inf") if latency is None else latency
+
+        healthy = [
+            client
+            for client in self._clients
+            if client not in exclude
+            and nodes.get(client.base_url, {}).get("healthy", True)
+        ]
+        return sorted(healthy, key=key)
+
+    def _mark_down(self, client):
+        def update(data):
+            nodes = dict(data.get("nodes", {}))
+            node = dict(nodes.get(client.base_url, {}))
+            node["healthy"] = False
+            node.setdefault("probed_at", self._clock())
+            nodes[client.base_url] = node
+            data["nodes"] = nodes
+
+        self._state.update(update)
+
+    def _pin_many(self, pins):
+        if not pins:
+            return
+
+        def update(data):
+            current = dict(data.get("pins", {}))
+            for info_hash, url in pins.items():
+                # Re-insert so the dict order doubles as recency for trimming.
+                current.pop(info_hash, None)
+                current[info_hash] = url
+            while len(current) > MAX_PINS:
+                current.pop(next(iter(current)))
+            data["pins"] = current
+
+        self._state.update(update)
+
+    def _pin(self, info_hash, client):
+        if self._state.load().get("pins", {}).get(info_hash) != client.base_url:
+            self._pin_many({info_hash: client.base_url})
+
+    def _unpin(self, info_hash):
+        def update(data):
+            pins = dict(data.get("pins", {}))
+            pins.pop(info_hash, None)
+            data["pins"] = pins
+
+        if info_hash in self._state.load().get("pins", {}):
+            self._state.update(update)
+
+    def _locate(self, info_hash, candidates):
+        """Return the first candidate whose DB already holds ``info_hash``."""
+        if not candidates:
+            return None
+
+        def holds(client):
+            try:
+                return bool(client.get_torrent_info_by_hash(info_hash))
+            except TorrServerError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            found = list(executor.map(holds, candidates))
+        for client, holds_hash in zip(candidates, found):
+            if holds_hash:
+                return client
+        return None
+
+    def owner(self, info_hash, exclude=()):
+        """Node serving ``info_hash``, failing over when its node is down."""
+        healthy = self.ranked(exclude=exclude)
+        pinned = self._by_url.get(self._state.load().get("pins", {}).get(info_hash))
+        if pinned is not None and pinned in healthy:
+            return pinned
+        if pinned is None:
+            located = self._locate(info_hash, healthy)
+            if located is not None:
+                self._pin(info_hash, located)
+                return located
+        if not healthy:
+            raise TorrServerError("No TorrServer instance is available")
+        if pinned is not None:
+            logging.warning(
+                "TorrServer %s is down, failing over %s to %s",
+                pinned.base_url,
+                info_hash,
+                healthy[0].base_url,
+            )
+        self._pin(info_hash, healthy[0])
+        return healthy[0]
+
+    def _on_hash(self, info_hash, call):
+        tried = []
+        while True:
+            client = self.owner(info_hash, exclude=tried)
+            try:
+                return call(client)
+            except TorrServerError as e:
+                if not is_connection_error(e):
+                    raise
+                logging.warning("TorrServer %s failed: %s", client.base_url, e)
+                self._mark_down(client)
+                tried.append(client)
+                if len(tried) >= len(self._clients):
+                    raise
+
+    def _on_any(self, call, retry=True):
+        tried = []
+        while True:
+            candidates = self.ranked(exclude=tried)
+            if not candidates:
+                raise TorrServerError("No TorrServer instance is available")
+            client = candidates[0]
+            try:
+                return client, call(client)
+            except TorrServerError as e:
+                if not retry or not is_connection_error(e):
+                    raise
+                logging.warning("TorrServer %s failed: %s", client.base_url, e)
+                self._mark_down(client)
+                tried.append(client)
+
+    def _add(self, call, retry=True):
+        client, info_hash = self._on_any(call, retry=retry)
+        self._pin(info_hash, client)
+        return info_hash
+
+    # TorrServer surface
+
+    @property
+    def torr_version(self):
+        return self._on_any(lambda c: c.torr_version)[1]
+
+    def add_magnet(self, magnet, title="", poster="", data=""):
+        return self._add(
+            lambda c: c.add_magnet(magnet, title=title, poster=poster, data=data)
+        )
+
+    def add_torrent(self, path, title="", poster="", data=""):
+        return self._add(
+            lambda c: c.add_torrent(path, title=title, poster=poster, data=data)
+        )
+
+    def add_torrent_obj(self, obj, title="", poster="", data=""):
+        # The upload consumes ``obj``, so it cannot be replayed on another node.
+        return self._add(
+            lambda c: c.add_torrent_obj(obj, title=title, poster=poster, data=data),
+            retry=False,
+        )
+
+    def torrents(self):
+        """torrents of every healthy node, de-duplicated by hash"""
+        return list(self.iter_torrents())
+
+    def iter_torrents(self, fields=None):
+        seen = set()
+        pins = {}
+        try:
+            for client in self.ranked():
+                try:
+                    listing = client.iter_torrents(fields=fields)
+                    for torrent in listing:
+                        info_hash = (
+                            torrent.get("hash") if isinstance(torrent, dict) else None
+                        )
+                        if info_hash:
+                            if info_hash in seen:
+                                continue
+                            seen.add(info_hash)
+                            pins[info_hash] = client.base_url
+                        yield torrent
+                except TorrServerError as e:
+                    if not is_connection_error(e):
+                        raise
+                    logging.warning("TorrServer %s failed: %s", client.base_url, e)
+                    self._mark_down(client)
+        finally:
+            self._pin_many(pins)
+
+    def search(self, query):
+        return self._on_any(lambda c: c.search(query))[1]
+
+    def get_torrent_info_by_hash(self, hash):
+        return self._on_hash(hash, lambda c: c.get_torrent_info_by_hash(hash))
+
+    def set_torrent(self, hash, title=None, poster=None, category=None, data=None):
+        return self._on_hash(
+            hash,
+            lambda c: c.set_torrent(
+                hash, title=title, poster=poster, category=category, data=data
+            ),
+        )
+
+    def get_torrent_info(self, link):
+        return self._on_hash(link, lambda c: c.get_torrent_info(link))
+
+    def get_torrent_infos(self, hashes, max_workers=DEFAULT_BATCH_WORKERS, timeout=None):
+        return batch_torrent_infos(
+            self.get_torrent_info, hashes, max_workers=max_workers, timeout=timeout
+        )
+
+    def get_torrent_file_info(self, link, file_index=1):
+        return self._on_hash(link, lambda c: c.get_torrent_file_info(link, file_index))
+
+    def drop_torrent(self, hash):
+        return self._on_hash(hash, lambda c: c.drop_torrent(hash))
+
+    def remove_torrent(self, info_hash, save_to_db=True):
+        response = self._on_hash(
+            info_hash, lambda c: c.remove_torrent(info_hash, save_to_db=save_to_db)
+        )
+        self._unpin(info_hash)
+        return response
+
+    def download_file(self, hash, file_id):
+        return self._on_hash(hash, lambda c: c.download_file(hash, file_id))
+
+    def get_ffprobe(self, hash, file_id):
+        return self._on_hash(hash, lambda c: c.get_ffprobe(hash, file_id))
+
+    def get_cache(self, hash):
+        return self._on_hash(hash, lambda c: c.get_cache(hash))
+
+    def play_torrent(self, hash, id):
+        return self._on_hash(hash, lambda c: c.play_torrent(hash, id))
+
+    def preload_torrent(self, link, file_id=1, title=""):
+        return self._on_hash(
+            link, lambda c: c.preload_torrent(link, file_id=file_id, title=title)
+        )
+
+    def preload_request(self, link, file_id=1, title=""):
+        return self.owner(link).preload_request(link, file_id=file_id, title=title)
+
+    def record_preload(self, link, seconds, status=None, error=None, unreachable=False):
+        self.owner(link).record_preload(
+            link, seconds, status=status, error=error, unreachable=unreachable
+        )
+
+    def read_stream_range(self, link, file_id, start, end, read_timeout=None):
+        return self._on_hash(
+            link,
+            lambda c: c.read_stream_range(
+                link, file_id, start, end, read_timeout=read_timeout
+            ),
+        )
+
+    def get_stream_url(self, link, path, file_id):
+        return self.owner(link).get_stream_url(link=link, path=path, file_id=file_id)
+
+    def get_settings(self):
+        return self._clients[0].get_settings()
@@ -0,0 +1,60 @@
+"""Pooled keep-alive HTTP session shared by every TorrServer caller."""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 10
+CONNECT_RETRIES = 2
+RETRY_BACKOFF_FACTOR = 0.2
+
+_shared_sessions = {}
+_shared_session_lock = threading.Lock()
+
+
+def create_session(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=POOL_MAXSIZE,
+    retries=CONNECT_RETRIES,
+):
+    """Return a requests.Session with a bounded per-host keep-alive pool.
+
+    Only connection establishment is retried: TorrServer POST actions such as
+    "add" are not idempotent, so read and status errors are left to callers.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=0,
+        redirect=0,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def shared_session(retries=CONNECT_RETRIES):
+    """Return the process-wide pooled session, creating it on first use.
+
+    Callers guarded by a circuit breaker pass ``retries=0``: the breaker
+    counts logical calls, and retried connects would multiply the time an
+    unreachable host blocks before the breaker opens.
+    """
+    with _shared_session_lock:
+        session = _shared_sessions.get(retries)
+        if session is None:
+            session = _shared_sessions[retries] = create_session(retries=retries)
+        return session
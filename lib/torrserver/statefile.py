@@ -0,0 +1,133 @@
+"""Small JSON state files shared between Kodi processes."""
+
+import errno
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from lib import json_codec
+
+
+LOCK_TIMEOUT = 2.0
+# A lock file older than this was left behind by a writer that died.
+LOCK_STALE_AFTER = 10.0
+
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT, stale_after=LOCK_STALE_AFTER):
+    """Hold ``path``.lock exclusively across processes for a read-modify-write.
+
+    The lock is a file created with O_EXCL, which behaves the same on every
+    platform Kodi runs on. When the lock cannot be taken within ``timeout``
+    seconds the block runs unlocked (last-writer-wins) rather than failing.
+    """
+    lock_path = path + ".lock"
+    deadline = time.monotonic() + timeout
+    fd = None
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                logging.warning("Cannot lock %s: %s", path, e)
+                break
+        try:
+            if time.time() - os.stat(lock_path).st_mtime > stale_after:
+                os.remove(lock_path)
+                continue
+        except OSError:
+            continue
+        if time.monotonic() >= deadline:
+            logging.warning("Timed out waiting for the lock of %s", path)
+            break
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if fd is not None:
+            os.close(fd)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+
+class SharedStateFile(object):
+    """A JSON dict on disk, re-read only when another process changed it.
+
+    Writes go through a temporary file and ``os.replace`` so readers never see
+    a partial document. ``update`` holds ``file_lock`` across its
+    read-modify-write so concurrent updates from other processes are merged
+    rather than overwritten.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._data = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self):
+        """Return the current document; callers must not mutate it."""
+        with self._lock:
+            if not self._path:
+                return self._data
+            try:
+                stat = os.stat(self._path)
+            except OSError:
+                self._data = {}
+                self._signature = None
+                return self._data
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature:
+                try:
+                    with open(self._path, "r", encoding="utf-8") as file:
+                        data = json_codec.load(file)
+                except (OSError, ValueError):
+                    data = {}
+                self._data = data if isinstance(data, dict) else {}
+                self._signature = signature
+            return self._data
+
+    def save(self, data):
+        with self._lock:
+            self._data = data
+            if not self._path:
+                return
+            tmp_path = "{}.{}.{}.tmp".format(
+                self._path, os.getpid(), threading.get_ident()
+            )
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json_codec.dump(data, file)
+                os.replace(tmp_path, self._path)
+                stat = os.stat(self._path)
+                self._signature = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                logging.exception("Failed to persist state file %s", self._path)
+
+    def update(self, func):
+        """Apply ``func`` to a copy of the freshest document and save it.
+
+        ``func`` may return False to leave the file untouched.
+        """
+        if not self._path:
+            data = dict(self.load())
+            if func(data) is not False:
+                self.save(data)
+            return data
+        with file_lock(self._path):
+            with self._lock:
+                # Another process may have written within the mtime resolution.
+                self._signature = None
+            data = dict(self.load())
+            if func(data) is not False:
+                self.save(data)
+        return data
@@ -0,0 +1,189 @@
+"""Keep recently stopped torrents connected so resuming them starts at once.
+
+When playback stops the plugin records the torrent in ``WarmPool``, a state
+file shared with the background service, and removes it again when playback
+of the torrent starts. The service's ``WarmKeeper`` keeps
+every entry connected with a periodic stat request (TorrServer disconnects
+idle torrents after its ``TorrentDisconnectTimeout``), preloads the stopped
+file once so its head pieces are in the cache, and drops the least recently
+stopped torrents beyond the configured count or cache budget. An entry whose
+preload finished is warm: playing that file again skips buffering.
+"""
+
+import logging
+import time
+
+from lib.preload import DONE
+from lib.torrserver.api import TorrServerError
+from lib.torrserver.async_api import AsyncTorrServer, gather_limited
+from lib.torrserver.statefile import SharedStateFile
+
+
+STATE_FILE_NAME = "warm_pool.json"
+DEFAULT_SIZE = 3
+DEFAULT_BUDGET_MB = 512
+# Below TorrServer's default TorrentDisconnectTimeout of 30 seconds.
+KEEPALIVE_INTERVAL = 20
+
+
+class WarmPool(object):
+    """Stopped torrents in least recently stopped first order."""
+
+    def __init__(self, path=None, clock=time.time):
+        self._state = SharedStateFile(path)
+        self._clock = clock
+
+    def entries(self):
+        """[(hash, entry)] from the least recently stopped torrent."""
+        return list(self._state.load().get("entries", {}).items())
+
+    def get(self, info_hash):
+        return self._state.load().get("entries", {}).get(info_hash.lower())
+
+    def is_warm(self, info_hash, file_id):
+        entry = self.get(info_hash)
+        return bool(
+            entry and entry.get("ready") and str(entry.get("file_id")) == str(file_id)
+        )
+
+    def touch(self, info_hash, file_id):
+        """Record a stop; the torrent becomes the most recent entry."""
+        key = info_hash.lower()
+
+        def update(entries):
+            previous = entries.pop(key, None) or {}
+            same_file = str(previous.get("file_id")) == str(file_id)
+            entries[key] = {
+                "file_id": file_id,
+                "stopped_at": self._clock(),
+                "ready": bool(previous.get("ready")) and same_file,
+                "cost": previous.get("cost", 0),
+            }
+
+        self._update(update)
+
+    def mark(self, info_hash, ready, cost):
+        key = info_hash.lower()
+
+        def update(entries):
+            if key in entries:
+                entries[key] = dict(entries[key], ready=ready, cost=cost)
+
+        self._update(update)
+
+    def discard(self, info_hash):
+        key = info_hash.lower()
+        if self.get(key) is not None:
+            self._update(lambda entries: entries.pop(key, None))
+
+    def evict(self, size, budget):
+        """Drop the oldest entries beyond ``size`` entries or ``budget`` bytes.
+
+        Returns the evicted hashes.
+        """
+        evicted = []
+
+        def update(entries):
+            while entries and (
+                len(entries) > size
+                or sum(e.get("cost", 0) for e in entries.values()) > budget
+            ):
+                key = next(iter(entries))
+                del entries[key]
+                evicted.append(key)
+
+        self._update(update)
+        return evicted
+
+    def _update(self, func):
+        def update(data):
+            previous = data.get("entries", {})
+            entries = dict(previous)
+            func(entries)
+            # Order is recency, so compare it too.
+            if list(entries.items()) == list(previous.items()):
+                return False
+            data["entries"] = entries
+
+        self._state.update(update)
+
+
+class WarmKeeper(object):
+    """Service side of the pool, driven by ``tick`` from the service loop.
+
+    Keep-alives, cache reads and drops of evicted torrents fan out
+    concurrently through ``AsyncTorrServer`` instead of one blocking call
+    after another.
+    """
+
+    def __init__(self, api, pool, preloads, clock=time.monotonic):
+        self._client = AsyncTorrServer(api)
+        self._pool = pool
+        self._preloads = preloads
+        self._clock = clock
+        self._last_keepalive = {}
+
+    def tick(self, size, budget):
+        self._client.run(self._tick(size, budget))
+
+    def close(self):
+        self._client.close()
+
+    async def _tick(self, size, budget):
+        evicted = self._pool.evict(size, budget)
+        if evicted:
+            await self._release(evicted)
+        now = self._clock()
+        entries = self._pool.entries()
+        for info_hash in set(self._last_keepalive) - {h for h, _ in entries}:
+            # Removed by the plugin: deleted, or playing again.
+            del self._last_keepalive[info_hash]
+            self._preloads.cancel(info_hash)
+        due = []
+        for info_hash, entry in entries:
+            last = self._last_keepalive.get(info_hash)
+            if last is not None and now - last < KEEPALIVE_INTERVAL:
+                continue
+            self._last_keepalive[info_hash] = now
+            due.append(self._keep_alive(info_hash, entry))
+        await gather_limited(due)
+
+    async def _keep_alive(self, info_hash, entry):
+        try:
+            # /stream?stat reconnects the torrent and resets its idle timer.
+            status = await self._client.get_torrent_info(info_hash)
+        except TorrServerError as e:
+            if e.status_code is None:
+                # TorrServer unreachable: keep the entry for the next tick.
+                logging.debug("Keep-alive of %s failed: %s", info_hash, e)
+                return
+            logging.info("Dropping %s from the warm pool: %s", info_hash, e)
+            self._pool.discard(info_hash)
+            self._preloads.cancel(info_hash)
+            return
+        file_id = entry.get("file_id")
+        task = self._preloads.get(info_hash, file_id)
+        if task is None or not (task.active or task.state == DONE):
+            task = self._preloads.start(info_hash, file_id)
+        cost = await self._cost(info_hash, status)
+        self._pool.mark(info_hash, ready=task.state == DONE, cost=cost)
+
+    async def _cost(self, info_hash, status):
+        """Bytes the torrent holds in TorrServer's cache."""
+        try:
+            filled = (await self._client.get_cache(info_hash)).get("Filled")
+        except (TorrServerError, AttributeError):
+            filled = None
+        if filled is None:
+            filled = status.get("preloaded_bytes") or 0
+        return filled
+
+    async def _release(self, hashes):
+        for info_hash in hashes:
+            logging.info("Evicting %s from the warm pool", info_hash)
+            self._last_keepalive.pop(info_hash, None)
+            self._preloads.cancel(info_hash)
+        results = await self._client.drop_torrents(hashes)
+        for info_hash, result in zip(hashes, results):
+            if isinstance(result, Exception):
+                logging.warning("Failed to drop %s: %s", info_hash, result)
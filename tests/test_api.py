@@ -5,11 +5,19 @@ instead of a dict, causing TypeError when accessing ["hash"].
 """
 
 import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch, mock_open
 
 import pytest
+import requests
 
-from lib.torrserver.api import TorrServer, TorrServerError
+from lib.torrserver.api import TorrServer, TorrServerError, TorrServerUnavailableError
+from lib.torrserver.breaker import CircuitBreaker
+from lib.torrserver.cache import ResponseCache
+from lib.torrserver.session import shared_session
 
 
 def _make_response(json_data, status_code=200, text=None):
@@ -18,6 +26,7 @@ def _make_response(json_data, status_code=200, text=None):
     response.json.return_value = json_data
     response.status_code = status_code
     response.text = text or json.dumps(json_data)
+    response.content = response.text.encode("utf-8")
     return response
 
 
@@ -74,7 +83,7 @@ class TestParseJsonResponse:
         response = MagicMock()
         response.status_code = 200
         response.text = "not json"
-        response.json.side_effect = ValueError("invalid json")
+        response.content = b"not json"
         with pytest.raises(TorrServerError, match="invalid JSON") as exc:
             torrserver._parse_json_response(response, "/torrent/upload")
         assert exc.value.status_code == 200
@@ -289,6 +298,80 @@ class TestDownloadFile:
         assert call.kwargs["stream"] is True
 
 
+class TestGetFfprobe:
+    def test_get_ffprobe_uses_ffp_path_endpoint(self, torrserver):
+        probe = {"format": {"format_name": "matroska,webm", "duration": "1320.5"}}
+        torrserver._session.request.return_value = _make_response(probe)
+
+        assert torrserver.get_ffprobe("abc", 2) == probe
+
+        call = torrserver._session.request.call_args
+        assert call.args[0] == "get"
+        assert call.args[1] == "http://localhost:8090/ffp/abc/2"
+        assert call.kwargs["timeout"] == (5, 60)
+
+
+class TestGetCache:
+    def test_get_cache_posts_get_action(self, torrserver):
+        state = {"PiecesLength": 4, "Pieces": {"0": {"Id": 0, "Completed": True}}}
+        torrserver._session.request.return_value = _make_response(state)
+
+        assert torrserver.get_cache("abc") == state
+
+        call = torrserver._session.request.call_args
+        assert call.args[0] == "post"
+        assert call.args[1] == "http://localhost:8090/cache"
+        assert json.loads(call.kwargs["data"]) == {"action": "get", "hash": "abc"}
+
+
+class TestPreloadRequest:
+    def test_returns_preload_url_and_basic_auth(self, torrserver):
+        url, headers = torrserver.preload_request("abc", 2)
+
+        assert url == (
+            "http://localhost:8090/stream"
+            "?link=abc&index=2&title=&stat=true&preload=true"
+        )
+        assert headers == {"Authorization": "Basic YWRtaW46cGFzcw=="}
+
+    def test_omits_auth_without_credentials(self):
+        torrserver = TorrServer("localhost", 8090, "", "", session=MagicMock())
+
+        assert torrserver.preload_request("abc")[1] == {}
+
+
+class TestReadStreamRange:
+    def test_reads_requested_range_and_total_length(self, torrserver):
+        response = MagicMock(status_code=206)
+        response.headers = {"Content-Range": "bytes 10-19/1000"}
+        response.iter_content.return_value = iter([b"0123456789"])
+        torrserver._session.request.return_value = response
+
+        assert torrserver.read_stream_range("abc", 2, 10, 19) == (b"0123456789", 1000)
+
+        call = torrserver._session.request.call_args
+        assert call.kwargs["headers"] == {"Range": "bytes=10-19"}
+        assert call.kwargs["params"] == {"link": "abc", "index": 2, "play": "true"}
+        response.close.assert_called_once_with()
+
+    def test_stops_reading_when_range_is_ignored(self, torrserver):
+        response = MagicMock(status_code=200)
+        response.headers = {}
+        response.iter_content.return_value = iter([b"abcdef", b"ghij", b"never"])
+        torrserver._session.request.return_value = response
+
+        assert torrserver.read_stream_range("abc", 1, 0, 7) == (b"abcdefgh", None)
+
+    def test_error_status_raises(self, torrserver):
+        response = MagicMock(status_code=404)
+        torrserver._session.request.return_value = response
+
+        with pytest.raises(TorrServerError) as excinfo:
+            torrserver.read_stream_range("abc", 1, 0, 7)
+        assert excinfo.value.status_code == 404
+        response.close.assert_called_once_with()
+
+
 class TestDropTorrent:
     """Regression guard for drop_torrent arity (1-arg, hash-only contract)."""
 
@@ -339,3 +422,389 @@ class TestSearch:
         with pytest.raises(TorrServerError) as exc:
             torrserver.search("x")
         assert exc.value.status_code == 500
+
+
+class TestTimeouts:
+    """Tests for per-endpoint connect/read timeouts in TorrServer._request."""
+
+    def test_default_timeout_applied(self, torrserver):
+        torrserver._session.request.return_value = _make_response({"hash": "abc"})
+        torrserver.get_torrent_info("abc")
+        assert torrserver._session.request.call_args.kwargs["timeout"] == (5, 30)
+
+    def test_endpoint_specific_read_timeout(self, torrserver):
+        torrserver._session.request.return_value = _make_response({})
+        torrserver.torr_version
+        assert torrserver._session.request.call_args.kwargs["timeout"] == (5, 5)
+
+    def test_endpoint_timeouts_override(self):
+        session = MagicMock()
+        session.request.return_value = _make_response([])
+        server = TorrServer(
+            "localhost",
+            8090,
+            "admin",
+            "pass",
+            session=session,
+            connect_timeout=2,
+            read_timeout=10,
+            endpoint_timeouts={"/search": 90},
+        )
+        server.search("x")
+        assert session.request.call_args.kwargs["timeout"] == (2, 90)
+        server.torrents()
+        assert session.request.call_args.kwargs["timeout"] == (2, 10)
+
+    def test_preload_has_no_read_timeout(self, torrserver):
+        torrserver._session.request.return_value = _make_response({})
+        torrserver.preload_torrent("abc", 2)
+        assert torrserver._session.request.call_args.kwargs["timeout"] == (5, None)
+
+
+class TestGetTorrentInfos:
+    """Tests for the batched, bounded-parallel TorrServer.get_torrent_infos."""
+
+    def test_results_keep_input_order_and_isolate_errors(self, torrserver):
+        def get_torrent_info(link):
+            if link == "bad":
+                raise TorrServerError("boom", status_code=500)
+            return {"hash": link}
+
+        torrserver.get_torrent_info = get_torrent_info
+        results = torrserver.get_torrent_infos(["a", "bad", "c"], max_workers=2)
+
+        assert [r.hash for r in results] == ["a", "bad", "c"]
+        assert results[0].info == {"hash": "a"} and results[0].error is None
+        assert results[1].info is None
+        assert results[1].error.status_code == 500
+        assert results[2].info == {"hash": "c"}
+
+    def test_concurrency_is_capped(self, torrserver):
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+
+        def get_torrent_info(link):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.02)
+            with lock:
+                state["running"] -= 1
+            return {"hash": link}
+
+        torrserver.get_torrent_info = get_torrent_info
+        results = torrserver.get_torrent_infos(
+            [str(i) for i in range(12)], max_workers=3
+        )
+
+        assert all(r.error is None for r in results)
+        assert 1 < state["peak"] <= 3
+
+    def test_deadline_reports_pending_hashes_as_timed_out(self, torrserver):
+        release = threading.Event()
+
+        def get_torrent_info(link):
+            if link == "slow":
+                release.wait(1)
+            return {"hash": link}
+
+        torrserver.get_torrent_info = get_torrent_info
+        try:
+            results = torrserver.get_torrent_infos(
+                ["fast", "slow"], max_workers=2, timeout=0.05
+            )
+        finally:
+            release.set()
+
+        assert results[0].info == {"hash": "fast"}
+        assert results[1].info is None
+        assert "timed out" in str(results[1].error)
+
+    def test_deadline_cancels_queued_hashes_without_cancel_futures(
+        self, torrserver, monkeypatch
+    ):
+        release = threading.Event()
+        shutdown = ThreadPoolExecutor.shutdown
+
+        def shutdown_py38(self, wait=True):
+            # Python 3.8 has no cancel_futures argument.
+            return shutdown(self, wait=wait)
+
+        monkeypatch.setattr(ThreadPoolExecutor, "shutdown", shutdown_py38)
+        called = []
+
+        def get_torrent_info(link):
+            called.append(link)
+            release.wait(1)
+            return {"hash": link}
+
+        torrserver.get_torrent_info = get_torrent_info
+        try:
+            results = torrserver.get_torrent_infos(
+                ["slow", "queued"], max_workers=1, timeout=0.05
+            )
+        finally:
+            release.set()
+
+        assert all("timed out" in str(r.error) for r in results)
+        assert called == ["slow"]
+
+    def test_empty_input(self, torrserver):
+        assert torrserver.get_torrent_infos([]) == []
+
+
+class TestResponseCache:
+    """Tests for the opt-in response cache wired into TorrServer."""
+
+    @pytest.fixture
+    def cached_torrserver(self):
+        return TorrServer(
+            "localhost", 8090, "admin", "pass", session=MagicMock(), cache=ResponseCache()
+        )
+
+    def test_repeated_info_reads_issue_one_request(self, cached_torrserver):
+        session = cached_torrserver._session
+        session.request.return_value = _make_response({"hash": "abc", "file_stats": []})
+
+        first = cached_torrserver.get_torrent_info("abc")
+        second = cached_torrserver.get_torrent_info("abc")
+
+        assert first == second
+        assert session.request.call_count == 1
+
+    def test_mutations_invalidate_cached_info(self, cached_torrserver):
+        session = cached_torrserver._session
+        session.request.return_value = _make_response({"hash": "abc"})
+
+        cached_torrserver.get_torrent_info("abc")
+        cached_torrserver.set_torrent("abc", poster="p")
+        cached_torrserver.get_torrent_info("abc")
+        cached_torrserver.drop_torrent("abc")
+        cached_torrserver.get_torrent_info("abc")
+
+        assert session.request.call_count == 5
+
+    def test_add_invalidates_torrent_list(self, cached_torrserver):
+        session = cached_torrserver._session
+        session.request.return_value = _make_response([{"hash": "abc"}])
+
+        cached_torrserver.torrents()
+        cached_torrserver.add_magnet("magnet:?xt=urn:btih:abc")
+        cached_torrserver.torrents()
+
+        assert session.request.call_count == 3
+
+    def test_uncached_client_always_requests(self, torrserver):
+        torrserver._session.request.return_value = _make_response({"hash": "abc"})
+        torrserver.get_torrent_info("abc")
+        torrserver.get_torrent_info("abc")
+        assert torrserver._session.request.call_count == 2
+
+
+class TestIterTorrents:
+    """Tests for the streaming TorrServer.iter_torrents."""
+
+    def _streaming_response(self, body, status_code=200, chunk=5):
+        response = MagicMock()
+        response.status_code = status_code
+        response.iter_content.side_effect = lambda size: iter(
+            [body[i : i + chunk] for i in range(0, len(body), chunk)]
+        )
+        return response
+
+    def test_yields_projected_torrents_and_closes_response(self, torrserver):
+        body = json.dumps(
+            [
+                {"hash": "a", "title": "A", "data": "blob", "poster": "p", "stat": 3},
+                {"hash": "b", "title": "B", "data": "blob"},
+            ]
+        ).encode()
+        response = self._streaming_response(body)
+        torrserver._session.request.return_value = response
+
+        result = list(torrserver.iter_torrents(fields=("hash", "title", "poster")))
+
+        assert result == [
+            {"hash": "a", "title": "A", "poster": "p"},
+            {"hash": "b", "title": "B"},
+        ]
+        call = torrserver._session.request.call_args
+        assert call.kwargs["stream"] is True
+        assert json.loads(call.kwargs["data"]) == {"action": "list"}
+        response.close.assert_called_once_with()
+
+    def test_without_fields_yields_full_records(self, torrserver):
+        torrserver._session.request.return_value = self._streaming_response(
+            b'[{"hash": "a", "data": "blob"}]'
+        )
+        assert list(torrserver.iter_torrents()) == [{"hash": "a", "data": "blob"}]
+
+    def test_http_error_raises(self, torrserver):
+        torrserver._session.request.return_value = self._streaming_response(
+            b"", status_code=500
+        )
+        with pytest.raises(TorrServerError) as exc:
+            list(torrserver.iter_torrents())
+        assert exc.value.status_code == 500
+
+    def test_invalid_json_raises(self, torrserver):
+        torrserver._session.request.return_value = self._streaming_response(
+            b'[{"hash": '
+        )
+        with pytest.raises(TorrServerError, match="invalid JSON"):
+            list(torrserver.iter_torrents())
+
+    def test_body_breaking_mid_stream_raises_connection_error(self, torrserver):
+        def chunks(_size):
+            yield b'[{"hash": "a"}, '
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+        response = MagicMock(status_code=200)
+        response.iter_content.side_effect = chunks
+        torrserver._session.request.return_value = response
+
+        received = []
+        with pytest.raises(TorrServerError) as exc:
+            for torrent in torrserver.iter_torrents():
+                received.append(torrent)
+        assert received == [{"hash": "a"}]
+        assert exc.value.status_code is None
+        response.close.assert_called_once_with()
+
+
+class TestRequestMetrics:
+    """Tests for the per-endpoint instrumentation in TorrServer._request."""
+
+    def test_records_labelled_endpoints(self, torrserver):
+        torrserver._session.request.return_value = _make_response({"hash": "abc"})
+
+        torrserver.add_magnet("magnet:?xt=urn:btih:abc")
+        torrserver.get_torrent_info("abc")
+        torrserver.preload_torrent("abc", 1)
+        torrserver.download_file("abc", 2)
+
+        snapshot = torrserver.metrics.snapshot()
+        assert set(snapshot) == {
+            "POST /torrents add",
+            "GET /stream stat",
+            "GET /stream preload",
+            "GET /play",
+        }
+        assert snapshot["GET /stream stat"]["status"] == {"200": 1}
+
+    def test_records_exception_type(self, torrserver):
+        torrserver._session.request.side_effect = ConnectionError("refused")
+
+        with pytest.raises(TorrServerError):
+            torrserver.get_torrent_info("abc")
+
+        stats = torrserver.metrics.snapshot()["GET /stream stat"]
+        assert stats["errors"] == {"ConnectionError": 1}
+        assert stats["latency_ms"]["count"] == 1
+
+
+class TestCircuitBreaker:
+    """Tests for the circuit breaker guarding TorrServer._request."""
+
+    @pytest.fixture
+    def guarded(self, tmp_path):
+        return TorrServer(
+            "localhost",
+            8090,
+            "admin",
+            "pass",
+            session=MagicMock(),
+            breaker=CircuitBreaker(
+                "localhost:8090",
+                state_path=str(tmp_path / "breaker.json"),
+                failure_threshold=2,
+            ),
+        )
+
+    def test_fails_fast_once_breaker_opens(self, guarded):
+        guarded._session.request.side_effect = ConnectionError("refused")
+        for _ in range(2):
+            with pytest.raises(TorrServerError):
+                guarded.torr_version
+
+        with pytest.raises(TorrServerUnavailableError):
+            guarded.torr_version
+        assert guarded._session.request.call_count == 2
+
+    def test_connect_timeouts_open_breaker(self, guarded):
+        guarded._session.request.side_effect = requests.ConnectTimeout("slow connect")
+        for _ in range(2):
+            with pytest.raises(TorrServerError):
+                guarded.torr_version
+
+        with pytest.raises(TorrServerUnavailableError):
+            guarded.torr_version
+
+    def test_unreachable_preloads_open_breaker(self, guarded):
+        for _ in range(2):
+            guarded.record_preload(
+                "abc", 0.1, error=ConnectionRefusedError(), unreachable=True
+            )
+
+        with pytest.raises(TorrServerUnavailableError):
+            guarded.preload_request("abc")
+        stats = guarded.metrics.snapshot()["GET /stream preload"]
+        assert stats["errors"] == {"ConnectionRefusedError": 2}
+
+    def test_answered_preload_closes_breaker(self, guarded):
+        refused = ConnectionRefusedError()
+        guarded.record_preload("abc", 0.1, error=refused, unreachable=True)
+        guarded.record_preload("abc", 2.0, status=500)
+        guarded.record_preload("abc", 0.1, error=refused, unreachable=True)
+
+        assert guarded._breaker.state == "closed"
+        assert guarded.metrics.snapshot()["GET /stream preload"]["status"] == {"500": 1}
+
+    def test_unreachable_host_opens_breaker_after_one_connect_per_call(
+        self, tmp_path, monkeypatch
+    ):
+        attempts = []
+
+        def create_connection(*_args, **_kwargs):
+            attempts.append(1)
+            raise socket.timeout("timed out")
+
+        monkeypatch.setattr(
+            "urllib3.util.connection.create_connection", create_connection
+        )
+        guarded = TorrServer(
+            "10.255.255.1",
+            8090,
+            "",
+            "",
+            session=shared_session(retries=0),
+            connect_timeout=5,
+            breaker=CircuitBreaker(
+                "10.255.255.1:8090", state_path=str(tmp_path / "breaker.json")
+            ),
+        )
+        for _ in range(3):
+            with pytest.raises(TorrServerError):
+                guarded.torr_version
+
+        with pytest.raises(TorrServerUnavailableError):
+            guarded.torr_version
+        # Each call waits at most one connect timeout: the breaker opens
+        # after 3 x 5 s against a blackholed host, not 3 x 3 attempts.
+        assert len(attempts) == 3
+
+    def test_read_timeouts_do_not_open_breaker(self, guarded):
+        guarded._session.request.side_effect = requests.ReadTimeout("slow read")
+        for _ in range(3):
+            with pytest.raises(TorrServerError):
+                guarded.get_ffprobe("abc", 1)
+
+        assert guarded._breaker.state == "closed"
+        assert guarded._session.request.call_count == 3
+
+    def test_http_errors_do_not_open_breaker(self, guarded):
+        guarded._session.request.return_value = _make_response({}, status_code=500)
+        for _ in range(3):
+            with pytest.raises(TorrServerError):
+                guarded.get_torrent_info("abc")
+        assert guarded._session.request.call_count == 3
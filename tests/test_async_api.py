@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+from lib.torrserver.api import TorrServerError
+from lib.torrserver.async_api import AsyncTorrServer, gather_limited
+
+
+def test_gather_limited_caps_concurrency_and_keeps_order():
+    running = 0
+    peak = 0
+
+    async def job(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return value
+
+    result = asyncio.run(gather_limited((job(i) for i in range(10)), limit=3))
+
+    assert result == list(range(10))
+    assert peak == 3
+
+
+def test_get_torrent_infos_runs_concurrently_and_reports_errors():
+    client = MagicMock()
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def get_torrent_info(link):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        if link == "bad":
+            raise TorrServerError("boom", status_code=500)
+        return {"hash": link}
+
+    client.get_torrent_info.side_effect = get_torrent_info
+
+    async def run():
+        async with AsyncTorrServer(client, max_workers=4) as server:
+            return await server.get_torrent_infos(["a", "bad", "c", "d", "e"])
+
+    result = asyncio.run(run())
+
+    assert result[0] == {"hash": "a"}
+    assert isinstance(result[1], TorrServerError)
+    assert result[2:] == [{"hash": "c"}, {"hash": "d"}, {"hash": "e"}]
+    assert 1 < state["peak"] <= 4
+
+
+def test_methods_forward_arguments_to_sync_client():
+    client = MagicMock()
+    client.add_magnet.return_value = "hash"
+
+    async def run():
+        async with AsyncTorrServer(client) as server:
+            info_hash = await server.add_magnet("magnet:?xt=urn:btih:abc", poster="p")
+            await server.remove_torrents(["a", "b"], save_to_db=False)
+            return info_hash
+
+    assert asyncio.run(run()) == "hash"
+    client.add_magnet.assert_called_once_with(
+        "magnet:?xt=urn:btih:abc", title="", poster="p", data=""
+    )
+    assert client.remove_torrent.call_count == 2
+    client.remove_torrent.assert_any_call("a", save_to_db=False)
+
+
+def test_run_reuses_one_loop_for_sync_callers():
+    client = MagicMock()
+    client.drop_torrent.side_effect = [None, TorrServerError("boom", status_code=500)]
+    server = AsyncTorrServer(client)
+
+    async def loop():
+        return asyncio.get_running_loop()
+
+    try:
+        first = server.run(loop())
+        results = server.run(server.drop_torrents(["a", "b"]))
+        assert server.run(loop()) is first
+    finally:
+        server.close()
+
+    assert results[0] is None
+    assert isinstance(results[1], TorrServerError)
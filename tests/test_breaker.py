@@ -0,0 +1,98 @@
+from lib.torrserver.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(tmp_path, clock, name="host:5665"):
+    return CircuitBreaker(
+        name,
+        state_path=str(tmp_path / "breaker.json"),
+        failure_threshold=2,
+        reset_timeout=30,
+        clock=clock,
+    )
+
+
+def test_opens_after_threshold_and_rejects(tmp_path):
+    clock = _Clock()
+    breaker = _breaker(tmp_path, clock)
+
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.allow_request() is False
+
+
+def test_success_resets_failure_count(tmp_path):
+    breaker = _breaker(tmp_path, _Clock())
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through(tmp_path):
+    clock = _Clock()
+    breaker = _breaker(tmp_path, clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now += 31
+    assert breaker.allow_request() is True
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() is False
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 31
+    assert breaker.allow_request() is True
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request() is True
+
+
+def test_state_is_shared_between_instances_through_file(tmp_path):
+    clock = _Clock()
+    plugin_breaker = _breaker(tmp_path, clock)
+    other_process_breaker = _breaker(tmp_path, clock)
+
+    plugin_breaker.record_failure()
+    plugin_breaker.record_failure()
+    assert other_process_breaker.allow_request() is False
+
+    other_process_breaker.record_success()
+    assert plugin_breaker.state == CLOSED
+
+
+def test_states_are_kept_per_server(tmp_path):
+    clock = _Clock()
+    first = _breaker(tmp_path, clock, name="a:1")
+    second = _breaker(tmp_path, clock, name="b:2")
+
+    first.record_failure()
+    first.record_failure()
+
+    assert first.state == OPEN
+    assert second.state == CLOSED
+
+
+def test_unreadable_state_file_counts_as_closed(tmp_path):
+    (tmp_path / "breaker.json").write_text("not json")
+    assert _breaker(tmp_path, _Clock()).allow_request() is True
+
+
+def test_without_state_path_keeps_state_in_memory():
+    breaker = CircuitBreaker("host", failure_threshold=1)
+    breaker.record_failure()
+    assert breaker.state == OPEN
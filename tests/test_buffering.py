@@ -1,10 +1,22 @@
 from lib.buffering import (
+    POLL_DEFAULT_SECONDS,
+    POLL_MAX_SECONDS,
+    POLL_MIN_SECONDS,
+    Ewma,
+    RateEstimator,
     backoff_seconds,
+    buffer_target_bytes,
+    can_start_early,
     clamp_progress,
     compute_buffering_progress,
+    estimate_eta,
+    file_length,
     is_preload_complete,
     is_resolving_metadata,
     is_retryable_error,
+    next_poll_interval,
+    piece_map_due,
+    wait_or_cancel,
 )
 from lib.torrserver.api import TorrServerError
 
@@ -61,3 +73,121 @@ def test_is_resolving_metadata_detects_unresolved_preload_size():
     assert is_resolving_metadata(None) is True
     assert is_resolving_metadata(-5) is True
     assert is_resolving_metadata(100) is False
+
+
+def test_rate_estimator_smooths_and_resets_on_counter_restart():
+    rate = RateEstimator(smoothing=0.5)
+
+    assert rate.update(0, 0.0) is None
+    assert rate.update(100, 1.0) == 100.0
+    assert rate.update(400, 2.0) == 200.0
+    # No elapsed time: the sample is ignored.
+    assert rate.update(500, 2.0) == 200.0
+    assert rate.update(None, 3.0) == 200.0
+    assert rate.update(10, 3.0) is None
+    assert rate.update(60, 4.0) == 50.0
+
+
+def test_estimate_eta():
+    assert estimate_eta(0, None) == 0.0
+    assert estimate_eta(-5, 10) == 0.0
+    assert estimate_eta(100, 50) == 2.0
+    assert estimate_eta(100, 0) is None
+    assert estimate_eta(100, None) is None
+    assert estimate_eta(None, 10) is None
+
+
+def test_next_poll_interval_polls_tightly_near_completion():
+    assert next_poll_interval(0.0) == POLL_MIN_SECONDS
+    assert next_poll_interval(0.5) == 0.5
+    assert next_poll_interval(30.0) == POLL_DEFAULT_SECONDS
+
+
+def test_next_poll_interval_backs_off_without_peers():
+    assert next_poll_interval(None, active_peers=3, stalled_polls=10) == 1.0
+    assert next_poll_interval(None, active_peers=0, stalled_polls=1) == 1.0
+    assert next_poll_interval(None, active_peers=0, stalled_polls=2) == 2.0
+    assert next_poll_interval(None, active_peers=0, stalled_polls=3) == 4.0
+    assert next_poll_interval(None, active_peers=0, stalled_polls=9) == POLL_MAX_SECONDS
+    assert next_poll_interval(None, active_peers=0, stalled_polls=2, default=0.5) == 1.0
+
+
+def test_ewma_smooths_samples_and_ignores_none():
+    ewma = Ewma(smoothing=0.5)
+
+    assert ewma.update(None) is None
+    assert ewma.update(10) == 10.0
+    assert ewma.update(20) == 15.0
+    assert ewma.update(None) == 15.0
+
+
+def test_file_length_looks_up_file_by_id():
+    status = {"file_stats": [{"id": 1, "length": 5}, {"id": 2, "length": 7}]}
+
+    assert file_length(status, "2") == 7
+    assert file_length(status, 3) is None
+    assert file_length({}, 1) is None
+
+
+def test_can_start_early_when_download_stays_ahead_of_playback():
+    # 1000 s of media at 1000 B/s.
+    length, bitrate = 1000000, 1000.0
+
+    # Twice the bitrate with a 1.5x margin never falls behind.
+    assert can_start_early(20000, length, bitrate, 2000.0, margin=1.5)
+    # Below the minimum buffer, even a fast swarm waits.
+    assert not can_start_early(5000, length, bitrate, 2000.0, margin=1.5)
+    # Slower than the bitrate: the head start covers only part of the file.
+    assert not can_start_early(20000, length, bitrate, 900.0, margin=1.0)
+    # ... unless enough is already buffered to absorb the shortfall.
+    assert can_start_early(100000, length, bitrate, 900.0, margin=1.0)
+
+
+def test_can_start_early_needs_known_inputs():
+    assert not can_start_early(20000, None, 1000.0, 2000.0)
+    assert not can_start_early(20000, 1000000, None, 2000.0)
+    assert not can_start_early(20000, 1000000, 1000.0, None)
+    assert not can_start_early(0, 1000000, 1000.0, 2000.0)
+
+
+def test_buffer_target_bytes_is_seconds_of_playback_capped_at_preload():
+    assert buffer_target_bytes(1000.0, 60, 1000000) == 60000
+    assert buffer_target_bytes(1000.0, 60, 30000) == 30000
+    assert buffer_target_bytes(None, 60, 30000) == 30000
+    assert buffer_target_bytes(1000.0, 0, 30000) == 30000
+    assert buffer_target_bytes(1000.0, 60, 0) == 0
+
+
+class _Monitor:
+    def __init__(self, abort_after=None):
+        self.waits = []
+        self._abort_after = abort_after
+
+    def waitForAbort(self, timeout):
+        self.waits.append(timeout)
+        return self._abort_after is not None and len(self.waits) >= self._abort_after
+
+
+def test_wait_or_cancel_waits_in_slices():
+    monitor = _Monitor()
+    assert wait_or_cancel(monitor, POLL_MAX_SECONDS, lambda: False) is False
+    assert max(monitor.waits) <= 0.5
+    assert abs(sum(monitor.waits) - POLL_MAX_SECONDS) < 1e-9
+
+
+def test_wait_or_cancel_returns_on_cancel_or_abort():
+    monitor = _Monitor()
+    canceled = iter([False, True])
+    assert wait_or_cancel(monitor, POLL_MAX_SECONDS, lambda: next(canceled)) is False
+    assert len(monitor.waits) == 2
+
+    monitor = _Monitor(abort_after=1)
+    assert wait_or_cancel(monitor, POLL_MAX_SECONDS, lambda: False) is True
+    assert len(monitor.waits) == 1
+
+
+def test_piece_map_read_every_poll_only_near_target():
+    assert piece_map_due(0, 100, None, 0.0)
+    assert not piece_map_due(50, 100, 0.0, 1.0)
+    assert piece_map_due(50, 100, 0.0, 5.0)
+    assert piece_map_due(90, 100, 0.0, 0.2)
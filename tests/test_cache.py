@@ -0,0 +1,101 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from lib.torrserver.cache import ResponseCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_kind_ttl():
+    clock = _Clock()
+    cache = ResponseCache(ttls={"torrent_info": 1.0}, clock=clock)
+    loader = MagicMock(side_effect=[{"v": 1}, {"v": 2}])
+
+    assert cache.get_or_load(("torrent_info", "a"), loader) == {"v": 1}
+    clock.now = 0.9
+    assert cache.get_or_load(("torrent_info", "a"), loader) == {"v": 1}
+    clock.now = 1.1
+    assert cache.get_or_load(("torrent_info", "a"), loader) == {"v": 2}
+    assert loader.call_count == 2
+
+
+def test_kinds_without_ttl_are_not_cached():
+    cache = ResponseCache(ttls={"file_info": 0})
+    loader = MagicMock(return_value={})
+
+    cache.get_or_load(("file_info", "a", 1), loader)
+    cache.get_or_load(("file_info", "a", 1), loader)
+
+    assert loader.call_count == 2
+
+
+def test_invalidate_drops_hash_entries_and_torrent_list():
+    cache = ResponseCache()
+    loader = MagicMock(return_value={})
+    keys = [("torrent_info", "a"), ("file_info", "a", 1), ("torrents",), ("torrent_info", "b")]
+    for key in keys:
+        cache.get_or_load(key, loader)
+
+    cache.invalidate("a")
+    for key in keys:
+        cache.get_or_load(key, loader)
+
+    assert loader.call_count == 7
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache()
+    loader = MagicMock(side_effect=[ValueError("boom"), {"v": 1}])
+
+    with pytest.raises(ValueError):
+        cache.get_or_load(("torrent_info", "a"), loader)
+    assert cache.get_or_load(("torrent_info", "a"), loader) == {"v": 1}
+
+
+def test_concurrent_identical_loads_are_collapsed():
+    cache = ResponseCache()
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return {"v": 1}
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_load(("torrent_info", "a"), loader))
+        )
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(1)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"v": 1}] * 5
+
+
+def test_result_loaded_across_invalidation_is_not_stored():
+    cache = ResponseCache()
+
+    def loader():
+        cache.invalidate("a")
+        return {"v": "stale"}
+
+    assert cache.get_or_load(("torrent_info", "a"), loader) == {"v": "stale"}
+    assert cache.get_or_load(("torrent_info", "a"), lambda: {"v": "fresh"}) == {"v": "fresh"}
@@ -1,6 +1,6 @@
 import pytest
 
-from lib.episode_matching import match_episode_file
+from lib.episode_matching import match_episode_file, next_episode_file, parse_episode
 
 
 def _candidate(path, file_id=1):
@@ -91,3 +91,36 @@ def test_match_episode_file_prefers_one_strong_match_over_weak_alternatives():
     weak = _candidate("Show/Season 1/Episode 5.mkv", 2)
 
     assert match_episode_file([strong, weak], 1, 5) is strong
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("Show.S01E05.1080p.mkv", (1, 5)),
+        ("Show/Season 1/Show.s02e07.mkv", (2, 7)),
+        ("Show/1x05/title.mkv", (1, 5)),
+        ("Show.S01E05.1920x1080.mkv", (1, 5)),
+        ("Show Season 3/Episode 04.mkv", (3, 4)),
+        ("Movie.2020.1920x1080.mkv", None),
+        ("Show/Episode 04.mkv", None),
+    ],
+)
+def test_parse_episode(path, expected):
+    assert parse_episode(path) == expected
+
+
+def test_parse_episode_takes_season_from_torrent_title():
+    assert parse_episode("Show/Episode 04.mkv", "Show Season 2") == (2, 4)
+
+
+def test_next_episode_file_moves_to_next_season_after_last_episode():
+    files = [
+        _candidate("Show.S01E01.mkv", 1),
+        _candidate("Show.S01E02.mkv", 2),
+        _candidate("Show.S02E01.mkv", 3),
+    ]
+
+    assert next_episode_file(files, "Show.S01E01.mkv") is files[1]
+    assert next_episode_file(files, "Show.S01E02.mkv") is files[2]
+    assert next_episode_file(files, "Show.S02E01.mkv") is None
+    assert next_episode_file(files, "Movie.mkv") is None
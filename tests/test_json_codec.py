@@ -0,0 +1,55 @@
+import io
+import json
+
+import pytest
+
+from lib import json_codec
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def codec(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(json_codec, "_orjson", None)
+        monkeypatch.setattr(json_codec, "_ujson", None)
+    return json_codec
+
+
+PAYLOAD = {
+    "action": "add",
+    "title": "Сериал / Série ✓",
+    "save_to_db": True,
+    "file_stats": [{"id": 1, "path": "a.mkv", "length": 2 ** 40}],
+}
+
+
+def test_encode_returns_utf8_bytes_readable_by_stdlib(codec):
+    data = codec.encode(PAYLOAD)
+    assert isinstance(data, bytes)
+    assert json.loads(data.decode("utf-8")) == PAYLOAD
+
+
+def test_dumps_returns_str(codec):
+    assert isinstance(codec.dumps(PAYLOAD), str)
+    assert json.loads(codec.dumps(PAYLOAD)) == PAYLOAD
+
+
+def test_loads_accepts_bytes_and_str(codec):
+    text = json.dumps(PAYLOAD)
+    assert codec.loads(text) == PAYLOAD
+    assert codec.loads(text.encode("utf-8")) == PAYLOAD
+
+
+def test_invalid_json_raises_value_error(codec):
+    with pytest.raises(ValueError):
+        codec.loads(b"not json")
+
+
+def test_file_helpers_round_trip(codec):
+    buffer = io.StringIO()
+    codec.dump(["a", "b"], buffer)
+    buffer.seek(0)
+    assert codec.load(buffer) == ["a", "b"]
+
+
+def test_encode_falls_back_for_non_str_keys():
+    assert json.loads(json_codec.encode({1: "a"})) == {"1": "a"}
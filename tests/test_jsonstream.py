@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from lib.torrserver.jsonstream import iter_json_array
+
+
+def _chunked(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 4096])
+def test_yields_elements_across_any_chunk_boundary(size):
+    items = [
+        {"hash": "a", "title": "Ünïcödé ✓", "data": "x" * 100},
+        {"hash": "b", "stat": 3, "nested": {"list": [1, 2, 3]}},
+        12345,
+        "text, with ] and ,",
+        None,
+        True,
+    ]
+    data = json.dumps(items, ensure_ascii=False).encode("utf-8")
+
+    assert list(iter_json_array(_chunked(data, size))) == items
+
+
+def test_empty_array_and_whitespace():
+    assert list(iter_json_array([b" \n[ ", b" ] "])) == []
+
+
+def test_number_split_across_chunks_is_not_truncated():
+    assert list(iter_json_array([b"[12", b"34, 5", b"6]"])) == [1234, 56]
+
+
+def test_non_array_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"hash": "a"}']))
+
+
+def test_truncated_array_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"hash": "a"}, {"hash": ']))
+
+
+def test_missing_separator_raises():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"hash": "a"} {"hash": "b"}]']))
@@ -0,0 +1,29 @@
+from lib.known_hashes import KnownHashes
+
+
+def test_add_discard_and_case_insensitive_lookup():
+    known = KnownHashes()
+    known.add("ABC")
+
+    assert "abc" in known
+    assert "ABC" in known
+
+    known.discard("abc")
+    assert "abc" not in known
+    assert None not in known
+
+
+def test_replace_drops_hashes_missing_from_listing():
+    known = KnownHashes()
+    known.add("old")
+
+    known.replace(["new", None])
+
+    assert "new" in known
+    assert "old" not in known
+
+
+def test_index_is_shared_through_file(tmp_path):
+    path = str(tmp_path / "known.json")
+    KnownHashes(path).add("abc")
+    assert "abc" in KnownHashes(path)
@@ -0,0 +1,47 @@
+import pytest
+
+from lib.magnet import is_magnet, normalize_info_hash, parse_info_hash
+
+
+HEX = "c9e15763f722f23e98a29decdfae341b98d53056"
+BASE32 = "ZHQVOY7XELZD5GFCTXWN7LRUDOMNKMCW"
+
+
+@pytest.mark.parametrize(
+    "link",
+    [
+        "magnet:?xt=urn:btih:" + HEX,
+        "magnet:?xt=urn:btih:" + HEX.upper() + "&dn=Some+Show&tr=udp%3A%2F%2Ft.example%3A80",
+        "magnet:?xt=urn:btih:" + BASE32,
+        "magnet:?xt=urn:btih:" + BASE32.lower(),
+        "MAGNET:?dn=x&xt=urn:btmh:1220abcd&xt=urn:btih:" + HEX,
+        HEX,
+    ],
+)
+def test_parse_info_hash_variants(link):
+    assert parse_info_hash(link) == HEX
+
+
+@pytest.mark.parametrize(
+    "link",
+    [
+        "magnet:?xt=urn:btih:abc",
+        "magnet:?dn=missing-xt",
+        "magnet:?xt=urn:btmh:1220" + "ab" * 32,
+        "https://example.com/file.torrent",
+        "",
+        None,
+    ],
+)
+def test_parse_info_hash_rejects_invalid(link):
+    assert parse_info_hash(link) is None
+
+
+def test_normalize_info_hash_rejects_bad_base32():
+    assert normalize_info_hash("1" * 32) is None
+
+
+def test_is_magnet():
+    assert is_magnet("magnet:?xt=urn:btih:" + HEX)
+    assert not is_magnet("http://example.com")
+    assert not is_magnet(None)
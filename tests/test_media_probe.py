@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock
+
+from lib.media_probe import MediaInfo, MediaProbe, MediaProbeCache, parse_ffprobe
+from lib.torrserver.api import TorrServerError
+
+
+FFPROBE = {
+    "streams": [{"codec_type": "video", "codec_name": "hevc"}],
+    "format": {
+        "format_name": "matroska,webm",
+        "duration": "1320.000000",
+        "bit_rate": "8000000",
+        "size": "1320000000",
+    },
+}
+
+
+def test_parse_ffprobe_reads_container_duration_and_bitrate():
+    assert parse_ffprobe(FFPROBE) == MediaInfo("matroska,webm", 1320.0, 1000000.0)
+
+
+def test_parse_ffprobe_derives_bitrate_from_file_length():
+    result = {"format": {"format_name": "mp4", "duration": "100", "bit_rate": "N/A"}}
+
+    assert parse_ffprobe(result, file_length=5000).bitrate == 50.0
+    assert parse_ffprobe(result).bitrate is None
+
+
+def test_parse_ffprobe_rejects_results_without_timing():
+    assert parse_ffprobe({"format": {"format_name": "mp4"}}) is None
+    assert parse_ffprobe({"error": "no file"}) is None
+    assert parse_ffprobe(None) is None
+
+
+def test_cache_round_trip_through_file(tmp_path):
+    path = str(tmp_path / "probe.json")
+    MediaProbeCache(path).put("ABC", 2, MediaInfo("mp4", 10.0, 5.0))
+
+    assert MediaProbeCache(path).get("abc", "2") == MediaInfo("mp4", 10.0, 5.0)
+    assert MediaProbeCache(path).get("abc", 3) is None
+
+
+def test_probe_fetches_once_and_caches():
+    api = MagicMock()
+    api.get_ffprobe.return_value = FFPROBE
+    cache = MediaProbeCache()
+
+    first = MediaProbe(api, cache, "abc", 1).start()
+    assert first.result(timeout=5) == parse_ffprobe(FFPROBE)
+    second = MediaProbe(api, cache, "abc", 1).start()
+
+    assert second.done
+    assert second.result() == parse_ffprobe(FFPROBE)
+    api.get_ffprobe.assert_called_once_with("abc", 1)
+
+
+def test_probe_failure_yields_no_result():
+    api = MagicMock()
+    api.get_ffprobe.side_effect = TorrServerError("boom", status_code=500)
+
+    probe = MediaProbe(api, MediaProbeCache(), "abc", 1).start()
+
+    assert probe.result(timeout=5) is None
+    assert probe.done
+
+
+def test_file_length_set_after_start_derives_bitrate():
+    api = MagicMock()
+    api.get_ffprobe.return_value = {"format": {"duration": "100"}}
+    probe = MediaProbe(api, MediaProbeCache(), "abc", 1).start()
+    probe.set_file_length(5000)
+
+    assert probe.result(timeout=5).bitrate == 50.0
@@ -0,0 +1,99 @@
+import json
+import random
+
+from lib.torrserver.metrics import Histogram, RequestMetrics
+
+
+def test_histogram_small_values_are_exact():
+    histogram = Histogram()
+    for value in range(1, 11):
+        histogram.record(value)
+
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(100) == 10
+    assert histogram.min == 1
+    assert histogram.max == 10
+
+
+def test_histogram_percentiles_within_relative_error():
+    rng = random.Random(1)
+    values = sorted(int(rng.expovariate(1 / 50000.0)) for _ in range(5000))
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+
+    for percent in (50, 95, 99):
+        exact = values[int(len(values) * percent / 100.0) - 1]
+        assert abs(histogram.percentile(percent) - exact) <= exact * 0.04 + 1
+
+
+def test_empty_histogram_summary():
+    assert Histogram().summary() == {"count": 0}
+    assert Histogram().percentile(50) is None
+
+
+def test_request_metrics_snapshot_groups_by_name():
+    metrics = RequestMetrics()
+    metrics.record("GET /stream stat", 0.010, size=100, status=200)
+    metrics.record("GET /stream stat", 0.030, size=300, status=200)
+    metrics.record("GET /stream stat", 0.002, error=ConnectionError("down"))
+    metrics.record("POST /torrents add", 0.5, size=10, status=500)
+
+    snapshot = metrics.snapshot()
+
+    stream = snapshot["GET /stream stat"]
+    assert stream["latency_ms"]["count"] == 3
+    assert stream["latency_ms"]["max"] >= 29.0
+    assert stream["size_bytes"]["count"] == 2
+    assert stream["status"] == {"200": 2}
+    assert stream["errors"] == {"ConnectionError": 1}
+    assert snapshot["POST /torrents add"]["status"] == {"500": 1}
+
+
+def test_request_metrics_dumps_periodically(tmp_path):
+    now = [0.0]
+    path = tmp_path / "metrics.json"
+    metrics = RequestMetrics(dump_path=str(path), dump_interval=60, clock=lambda: now[0])
+
+    metrics.record("GET /echo", 0.001, status=200)
+    assert not path.exists()
+
+    now[0] = 61.0
+    metrics.record("GET /echo", 0.001, status=200)
+    dumped = json.loads(path.read_text())
+    assert dumped["endpoints"]["GET /echo"]["latency_ms"]["count"] == 2
+
+
+def test_dumps_from_several_processes_merge(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    plugin = RequestMetrics(dump_path=path)
+    service = RequestMetrics(dump_path=path)
+
+    plugin.record("GET /stream stat", 0.010, status=200)
+    plugin.dump()
+    service.record("GET /stream stat", 0.030, status=500)
+    service.dump()
+    plugin.record("GET /stream stat", 0.020, status=200)
+    plugin.dump()
+
+    with open(path) as file:
+        stream = json.load(file)["endpoints"]["GET /stream stat"]
+    assert stream["latency_ms"]["count"] == 3
+    assert stream["latency_ms"]["max"] >= 29.0
+    assert stream["status"] == {"200": 2, "500": 1}
+    assert plugin.snapshot()["GET /stream stat"]["latency_ms"]["count"] == 2
+
+
+def test_dump_without_new_requests_writes_nothing(tmp_path):
+    path = tmp_path / "metrics.json"
+    metrics = RequestMetrics(dump_path=str(path))
+
+    metrics.dump()
+    assert not path.exists()
+
+    metrics.record("GET /echo", 0.001, status=200)
+    metrics.dump()
+    mtime = path.stat().st_mtime_ns
+    metrics.dump()
+    assert path.stat().st_mtime_ns == mtime
+    assert not (tmp_path / "metrics.json.lock").exists()
@@ -1,7 +1,12 @@
+import io
+import os
 import sys
+import threading
 import types
 from unittest.mock import MagicMock
 
+import pytest
+
 
 class _Addon:
     def getAddonInfo(self, key):
@@ -41,6 +46,8 @@ class _Dummy:
 xbmc = sys.modules.setdefault("xbmc", types.ModuleType("xbmc"))
 xbmc.Monitor = getattr(xbmc, "Monitor", _Dummy)
 xbmc.Player = getattr(xbmc, "Player", _Dummy)
+xbmc.PlayList = getattr(xbmc, "PlayList", _Dummy)
+xbmc.PLAYLIST_VIDEO = getattr(xbmc, "PLAYLIST_VIDEO", 1)
 xbmc.executebuiltin = getattr(xbmc, "executebuiltin", lambda _command: None)
 xbmc.getInfoLabel = getattr(xbmc, "getInfoLabel", lambda _label: "")
 xbmc.getCondVisibility = getattr(xbmc, "getCondVisibility", lambda _condition: False)
@@ -101,6 +108,20 @@ class _Plugin:
 routing.Plugin = _Plugin
 
 from lib import navigation
+from lib.known_hashes import KnownHashes
+from lib.media_probe import MediaProbeCache
+from lib.torrent_cache import TorrentCache
+from lib.torrent_file import parse_torrent
+from lib.torrserver.api import TorrentInfoResult, TorrServerError
+from lib.warm_pool import WarmPool
+
+
+@pytest.fixture(autouse=True)
+def _isolated_local_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(navigation, "known_hashes", KnownHashes())
+    monkeypatch.setattr(navigation, "torrent_cache", TorrentCache(str(tmp_path)))
+    monkeypatch.setattr(navigation, "media_probes", MediaProbeCache())
+    monkeypatch.setattr(navigation, "warm_pool", WarmPool())
 
 
 def test_play_magnet_forwards_episode_metadata_to_play_info_hash(monkeypatch):
@@ -121,10 +142,125 @@ def test_play_magnet_forwards_episode_metadata_to_play_info_hash(monkeypatch):
     )
 
 
+HASH = "c9e15763f722f23e98a29decdfae341b98d53056"
+
+
+def test_play_magnet_skips_add_for_known_hash(monkeypatch):
+    navigation.known_hashes.add(HASH)
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info_by_hash", lambda _hash: {"hash": HASH}
+    )
+    add_magnet = MagicMock()
+    monkeypatch.setattr(navigation.api, "add_magnet", add_magnet)
+    play_info_hash = MagicMock()
+    monkeypatch.setattr(navigation, "play_info_hash", play_info_hash)
+
+    navigation.play_magnet(magnet="magnet:?xt=urn:btih:" + HASH.upper(), buffer=False)
+
+    add_magnet.assert_not_called()
+    play_info_hash.assert_called_once_with(
+        info_hash=HASH, buffer=False, season="", episode=""
+    )
+
+
+def test_play_magnet_readds_known_hash_missing_from_server(monkeypatch):
+    navigation.known_hashes.add(HASH)
+
+    def get_torrent_info_by_hash(_hash):
+        raise TorrServerError("not found", status_code=404)
+
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info_by_hash", get_torrent_info_by_hash
+    )
+    add_magnet = MagicMock(return_value=HASH)
+    monkeypatch.setattr(navigation.api, "add_magnet", add_magnet)
+    play_info_hash = MagicMock()
+    monkeypatch.setattr(navigation, "play_info_hash", play_info_hash)
+    magnet = "magnet:?xt=urn:btih:" + HASH + "&tr=udp://tracker"
+
+    navigation.play_magnet(magnet=magnet, buffer=False, poster="poster")
+
+    add_magnet.assert_called_once_with(magnet, poster="poster")
+    assert HASH in navigation.known_hashes
+    play_info_hash.assert_called_once_with(
+        info_hash=HASH, buffer=False, season="", episode=""
+    )
+
+
+def test_play_magnet_replay_reuses_get_response_for_metadata(monkeypatch):
+    navigation.known_hashes.add(HASH)
+    files = [{"id": 1, "path": "Movie.mkv", "length": 10}]
+    monkeypatch.setattr(
+        navigation.api,
+        "get_torrent_info_by_hash",
+        lambda _hash: {"hash": HASH, "stat": 5, "file_stats": files},
+    )
+    get_torrent_info = MagicMock()
+    monkeypatch.setattr(navigation.api, "get_torrent_info", get_torrent_info)
+    monkeypatch.setattr(navigation, "get_min_candidate_size", lambda: 0)
+    start_playback = MagicMock()
+    monkeypatch.setattr(navigation, "start_playback", start_playback)
+
+    navigation.play_magnet(magnet="magnet:?xt=urn:btih:" + HASH, buffer=False)
+
+    get_torrent_info.assert_not_called()
+    start_playback.assert_called_once_with(HASH, files[0], buffer=False)
+
+
+def test_play_magnet_keeps_known_hash_when_server_unreachable(monkeypatch):
+    navigation.known_hashes.add(HASH)
+
+    def get_torrent_info_by_hash(_hash):
+        raise TorrServerError("timed out")
+
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info_by_hash", get_torrent_info_by_hash
+    )
+    monkeypatch.setattr(navigation.api, "add_magnet", MagicMock(return_value=HASH))
+    monkeypatch.setattr(navigation, "play_info_hash", MagicMock())
+
+    navigation.play_magnet(magnet="magnet:?xt=urn:btih:" + HASH, buffer=False)
+
+    assert HASH in navigation.known_hashes
+
+
+def test_play_magnet_adds_unknown_hash_and_remembers_it(monkeypatch):
+    add_magnet = MagicMock(return_value=HASH)
+    monkeypatch.setattr(navigation.api, "add_magnet", add_magnet)
+    monkeypatch.setattr(navigation, "play_info_hash", MagicMock())
+
+    navigation.play_magnet(magnet="magnet:?xt=urn:btih:" + HASH, buffer=False)
+
+    add_magnet.assert_called_once()
+    assert HASH in navigation.known_hashes
+
+
+def test_play_url_plays_magnet_links_without_download(monkeypatch):
+    get = MagicMock()
+    monkeypatch.setattr(navigation.api.session, "get", get)
+    play_magnet = MagicMock()
+    monkeypatch.setattr(navigation, "play_magnet", play_magnet)
+
+    navigation.play_url(url="magnet:?xt=urn:btih:" + HASH, buffer=False)
+
+    get.assert_not_called()
+    play_magnet.assert_called_once_with(
+        magnet="magnet:?xt=urn:btih:" + HASH,
+        buffer=False,
+        poster="",
+        season="",
+        episode="",
+    )
+
+
 def test_play_url_forwards_episode_metadata_to_play_info_hash(monkeypatch):
     response = MagicMock()
     response.__enter__.return_value = response
-    monkeypatch.setattr(navigation.requests, "get", lambda *_args, **_kwargs: response)
+    # Unreadable metainfo falls back to TorrServer's file list.
+    response.iter_content.return_value = iter([b"not a torrent"])
+    monkeypatch.setattr(
+        navigation.api.session, "get", lambda *_args, **_kwargs: response
+    )
     monkeypatch.setattr(
         navigation.api, "add_torrent_obj", lambda *_args, **_kwargs: "hash"
     )
@@ -144,6 +280,122 @@ def test_play_url_forwards_episode_metadata_to_play_info_hash(monkeypatch):
     )
 
 
+def test_play_url_chooses_file_from_local_metainfo(monkeypatch):
+    data = (
+        b"d4:infod5:filesl"
+        b"d6:lengthi10e4:pathl15:Show.S01E04.mkvee"
+        b"d6:lengthi10e4:pathl15:Show.S01E05.mkvee"
+        b"d6:lengthi1e4:pathl8:Show.nfoee"
+        b"e4:name4:Show12:piece lengthi16384e6:pieces20:" + b"x" * 20 + b"ee"
+    )
+    info_hash = parse_torrent(io.BytesIO(data)).info_hash
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.iter_content.return_value = iter([data[:40], b"", data[40:]])
+    get = MagicMock(return_value=response)
+    monkeypatch.setattr(navigation.api.session, "get", get)
+    parse = MagicMock(wraps=navigation.parse_torrent)
+    monkeypatch.setattr(navigation, "parse_torrent", parse)
+    uploaded = []
+
+    def add_torrent_obj(file, poster=""):
+        uploaded.append(file.read())
+        return info_hash
+
+    monkeypatch.setattr(navigation.api, "add_torrent_obj", add_torrent_obj)
+    get_torrent_info = MagicMock()
+    monkeypatch.setattr(navigation.api, "get_torrent_info", get_torrent_info)
+    monkeypatch.setattr(navigation, "get_min_candidate_size", lambda: 0)
+    play = MagicMock()
+    monkeypatch.setattr(navigation, "play", play)
+
+    navigation.play_url(
+        url="https://example.com/show.torrent", buffer=False, season="1", episode="5"
+    )
+
+    assert uploaded == [data]
+    assert get.call_args.kwargs["stream"] is True
+    # Parsed once, while downloading.
+    assert parse.call_count == 1
+    assert not [name for name in os.listdir(navigation.ADDON_DATA) if ".torrent" in name]
+    get_torrent_info.assert_not_called()
+    play.assert_called_once_with(
+        info_hash=info_hash, file_id=2, path="Show/Show.S01E05.mkv"
+    )
+    assert info_hash in navigation.known_hashes
+    assert navigation.torrent_cache.lookup("https://example.com/show.torrent") == info_hash
+    assert navigation.torrent_cache.get(info_hash) == data
+
+
+def test_play_url_skips_download_for_cached_known_torrent(monkeypatch):
+    navigation.torrent_cache.put("https://example.com/show.torrent", HASH, b"d")
+    navigation.known_hashes.add(HASH)
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info_by_hash", lambda _hash: {"hash": HASH}
+    )
+    get = MagicMock()
+    monkeypatch.setattr(navigation.api.session, "get", get)
+    play_info_hash = MagicMock()
+    monkeypatch.setattr(navigation, "play_info_hash", play_info_hash)
+
+    navigation.play_url(url="https://example.com/show.torrent", buffer=False)
+
+    get.assert_not_called()
+    play_info_hash.assert_called_once_with(
+        info_hash=HASH, buffer=False, season="", episode=""
+    )
+
+
+def test_play_url_reuploads_cached_torrent_without_download(monkeypatch):
+    navigation.torrent_cache.put("https://example.com/show.torrent", HASH, b"d")
+    # Known, but removed from TorrServer since.
+    navigation.known_hashes.add(HASH)
+
+    def get_torrent_info_by_hash(_hash):
+        raise TorrServerError("not found", status_code=404)
+
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info_by_hash", get_torrent_info_by_hash
+    )
+    get = MagicMock()
+    monkeypatch.setattr(navigation.api.session, "get", get)
+    play_torrent_file = MagicMock()
+    monkeypatch.setattr(navigation, "play_torrent_file", play_torrent_file)
+
+    navigation.play_url(url="https://example.com/show.torrent", buffer=False)
+
+    get.assert_not_called()
+    open_torrent = play_torrent_file.call_args[0][0]
+    assert open_torrent().read() == b"d"
+    assert HASH not in navigation.known_hashes
+
+
+def test_magnet_startup_reads_torrent_info_once(monkeypatch):
+    monkeypatch.setattr(navigation.api, "add_magnet", lambda *_a, **_k: HASH)
+    info = {
+        "stat": 3,
+        "poster": "poster",
+        "title": "Show",
+        "file_stats": [{"id": 1, "path": "Show.S01E01.mkv", "length": 10}],
+    }
+    get_torrent_info = MagicMock(return_value=info)
+    monkeypatch.setattr(navigation.api, "get_torrent_info", get_torrent_info)
+    monkeypatch.setattr(navigation, "get_min_candidate_size", lambda: 0)
+    monkeypatch.setattr(navigation, "preload_torrent", MagicMock())
+    monkeypatch.setattr(navigation, "MediaProbe", MagicMock())
+    monkeypatch.setattr(navigation, "wait_for_buffering_completion", MagicMock())
+    monkeypatch.setattr(navigation, "prewarm_enabled", lambda: False)
+    play = MagicMock()
+    monkeypatch.setattr(navigation, "play", play)
+
+    navigation.play_magnet(magnet="magnet:?xt=urn:btih:" + HASH, buffer=True)
+
+    get_torrent_info.assert_called_once_with(HASH)
+    play.assert_called_once_with(
+        info_hash=HASH, file_id=1, path="Show.S01E01.mkv", poster="poster"
+    )
+
+
 def _run_play_info_hash(monkeypatch, files, dialog_index=0, **metadata):
     info = {"file_stats": files, "title": "Show Season 1"}
     api = navigation.api
@@ -224,3 +476,392 @@ def test_torrent_files_uses_original_path_for_stream_url(monkeypatch):
     navigation.torrent_files("hash")
 
     stream_url.assert_called_once_with(link="hash", path=path, file_id=7)
+
+
+def test_race_plays_first_ready_candidate_and_releases_losers(monkeypatch):
+    other = "d" * 40
+    picked = {"Title": "Movie 2020", "Magnet": "magnet:?xt=urn:btih:" + HASH}
+    look_alike = {"Title": "Movie 2020 x265", "Magnet": "magnet:?xt=urn:btih:" + other}
+    api = navigation.api
+    monkeypatch.setattr(api, "search", lambda _query: [picked, look_alike])
+    monkeypatch.setattr(api, "add_magnet", lambda magnet, **_k: magnet[-40:])
+    files = [{"id": 1, "path": "Movie.mkv", "length": 10}]
+    statuses = {
+        HASH: {"stat": 3, "file_stats": files, "preloaded_bytes": 1, "preload_size": 9},
+        other: {"stat": 3, "file_stats": files, "preloaded_bytes": 9, "preload_size": 9},
+    }
+    monkeypatch.setattr(
+        api,
+        "get_torrent_infos",
+        lambda hashes: [TorrentInfoResult(h, statuses[h], None) for h in hashes],
+    )
+    monkeypatch.setattr(api, "iter_torrents", lambda **_kwargs: iter([]))
+    remove_torrent = MagicMock()
+    monkeypatch.setattr(api, "remove_torrent", remove_torrent)
+    monkeypatch.setattr(navigation, "get_race_candidates", lambda: 3)
+    monkeypatch.setattr(navigation, "preload_torrent", MagicMock())
+    start_playback = MagicMock()
+    monkeypatch.setattr(navigation, "start_playback", start_playback)
+
+    navigation.race(query="movie", magnet=picked["Magnet"])
+
+    remove_torrent.assert_called_once_with(HASH)
+    assert HASH not in navigation.known_hashes
+    assert other in navigation.known_hashes
+    start_playback.assert_called_once_with(other, files[0])
+
+
+def _race_loser_setup(monkeypatch, listing):
+    other = "d" * 40
+    picked = {"Title": "Movie 2020", "Magnet": "magnet:?xt=urn:btih:" + HASH}
+    look_alike = {"Title": "Movie 2020 x265", "Magnet": "magnet:?xt=urn:btih:" + other}
+    api = navigation.api
+    monkeypatch.setattr(api, "search", lambda _query: [picked, look_alike])
+    monkeypatch.setattr(api, "add_magnet", lambda magnet, **_k: magnet[-40:])
+    monkeypatch.setattr(api, "iter_torrents", listing)
+    files = [{"id": 1, "path": "Movie.mkv", "length": 10}]
+    statuses = {
+        HASH: {"stat": 3, "file_stats": files, "preloaded_bytes": 1, "preload_size": 9},
+        other: {"stat": 3, "file_stats": files, "preloaded_bytes": 9, "preload_size": 9},
+    }
+    monkeypatch.setattr(
+        api,
+        "get_torrent_infos",
+        lambda hashes: [TorrentInfoResult(h, statuses[h], None) for h in hashes],
+    )
+    remove_torrent, drop_torrent = MagicMock(), MagicMock()
+    monkeypatch.setattr(api, "remove_torrent", remove_torrent)
+    monkeypatch.setattr(api, "drop_torrent", drop_torrent)
+    monkeypatch.setattr(navigation, "get_race_candidates", lambda: 3)
+    monkeypatch.setattr(navigation, "preload_torrent", MagicMock())
+    monkeypatch.setattr(navigation, "start_playback", MagicMock())
+
+    navigation.race(query="movie", magnet=picked["Magnet"])
+    return remove_torrent, drop_torrent
+
+
+def test_race_keeps_loser_saved_on_server_but_not_known_locally(monkeypatch):
+    assert HASH not in navigation.known_hashes
+
+    remove_torrent, drop_torrent = _race_loser_setup(
+        monkeypatch, lambda **_kwargs: iter([{"hash": HASH.upper()}])
+    )
+
+    remove_torrent.assert_not_called()
+    drop_torrent.assert_called_once_with(HASH)
+
+
+def test_race_keeps_losers_when_listing_fails(monkeypatch):
+    def listing(**_kwargs):
+        raise TorrServerError("refused")
+
+    remove_torrent, drop_torrent = _race_loser_setup(monkeypatch, listing)
+
+    remove_torrent.assert_not_called()
+    drop_torrent.assert_called_once_with(HASH)
+
+
+def test_race_plays_the_raced_episode_without_dialog(monkeypatch):
+    other = "d" * 40
+    picked = {"Title": "Show S01", "Magnet": "magnet:?xt=urn:btih:" + HASH}
+    look_alike = {"Title": "Show S01 x265", "Magnet": "magnet:?xt=urn:btih:" + other}
+    api = navigation.api
+    monkeypatch.setattr(api, "search", lambda _query: [picked, look_alike])
+    monkeypatch.setattr(api, "add_magnet", lambda magnet, **_k: magnet[-40:])
+    files = [
+        {"id": 1, "path": "Show.S01E01.mkv", "length": 10},
+        {"id": 2, "path": "Show.S01E02.mkv", "length": 9},
+    ]
+    status = {"stat": 3, "file_stats": files, "preloaded_bytes": 9, "preload_size": 9}
+    monkeypatch.setattr(
+        api,
+        "get_torrent_infos",
+        lambda hashes: [TorrentInfoResult(h, status, None) for h in hashes],
+    )
+    monkeypatch.setattr(api, "iter_torrents", lambda **_kwargs: iter([]))
+    monkeypatch.setattr(api, "remove_torrent", MagicMock())
+    monkeypatch.setattr(navigation, "get_race_candidates", lambda: 3)
+    preload_torrent = MagicMock()
+    monkeypatch.setattr(navigation, "preload_torrent", preload_torrent)
+    dialog = MagicMock()
+    monkeypatch.setattr(navigation, "Dialog", lambda: dialog)
+    start_playback = MagicMock()
+    monkeypatch.setattr(navigation, "start_playback", start_playback)
+
+    navigation.race(query="show", magnet=picked["Magnet"], season="1", episode="2")
+
+    preload_torrent.assert_any_call(HASH, 2)
+    start_playback.assert_called_once_with(HASH, files[1])
+    dialog.select.assert_not_called()
+
+
+def test_buffer_and_play_skips_buffering_for_warm_torrent(monkeypatch):
+    navigation.warm_pool.touch(HASH, 1)
+    navigation.warm_pool.mark(HASH, ready=True, cost=10)
+    info = {"stat": 3, "poster": "poster", "file_stats": []}
+    monkeypatch.setattr(navigation.api, "get_torrent_info", lambda _hash: info)
+    preload_torrent = MagicMock()
+    monkeypatch.setattr(navigation, "preload_torrent", preload_torrent)
+    wait = MagicMock()
+    monkeypatch.setattr(navigation, "wait_for_buffering_completion", wait)
+    play = MagicMock()
+    monkeypatch.setattr(navigation, "play", play)
+
+    navigation.buffer_and_play(info_hash=HASH, file_id=1, path="Movie.mkv")
+
+    preload_torrent.assert_not_called()
+    wait.assert_not_called()
+    play.assert_called_once_with(
+        info_hash=HASH, file_id=1, path="Movie.mkv", poster="poster"
+    )
+
+
+def test_buffer_and_play_overlaps_preload_and_probe_with_stat_call(monkeypatch):
+    events = []
+    probing = threading.Event()
+    monkeypatch.setattr(
+        navigation, "preload_torrent", lambda *_args: events.append("preload")
+    )
+
+    def get_ffprobe(*_args):
+        probing.set()
+        return {"format": {"duration": "100"}}
+
+    def get_torrent_info(_hash):
+        # Returns only once the probe runs, so it must have started first.
+        assert probing.wait(5)
+        events.append("stat")
+        return {"stat": 3, "file_stats": [{"id": 1, "length": 5000}]}
+
+    monkeypatch.setattr(navigation.api, "get_ffprobe", get_ffprobe)
+    monkeypatch.setattr(navigation.api, "get_torrent_info", get_torrent_info)
+    monkeypatch.setattr(navigation, "prewarm_enabled", lambda: False)
+    probes = []
+    monkeypatch.setattr(
+        navigation,
+        "wait_for_buffering_completion",
+        lambda *_args, probe=None, prewarm=None: probes.append(probe),
+    )
+    monkeypatch.setattr(navigation, "play", MagicMock())
+
+    navigation.buffer_and_play(info_hash=HASH, file_id=1, path="Movie.mkv")
+
+    assert events == ["preload", "stat"]
+    assert probes[0].result(timeout=5).bitrate == 50.0
+
+
+def test_metadata_backoff_counts_only_consecutive_polls_without_peers(monkeypatch):
+    infos = [{"stat": 1, "active_peers": peers} for peers in (3, 3, 0, 0)]
+    infos.append({"stat": 3})
+    monkeypatch.setattr(
+        navigation.api, "get_torrent_info", MagicMock(side_effect=infos)
+    )
+    monkeypatch.setattr(navigation, "get_metadata_timeout", lambda: 0)
+    monkeypatch.setattr(navigation, "Monitor", MagicMock)
+    progress = MagicMock()
+    progress.iscanceled.return_value = False
+    monkeypatch.setattr(navigation, "DialogProgress", lambda: progress)
+    waits = []
+
+    def wait_or_cancel(_monitor, seconds, _canceled):
+        waits.append(seconds)
+        return False
+
+    monkeypatch.setattr(navigation, "wait_or_cancel", wait_or_cancel)
+
+    assert navigation.wait_for_metadata(HASH) == {"stat": 3}
+
+    poll = navigation.METADATA_POLL_SECONDS
+    assert waits == [poll, poll, poll, 2 * poll]
+
+
+def _cache_state(complete):
+    return {
+        "PiecesLength": 1024 * 1024,
+        "Pieces": {str(i): {"Id": i, "Completed": True} for i in complete},
+    }
+
+
+def _buffering_setup(monkeypatch, cache_states):
+    mb = 1024 * 1024
+    status = {
+        "name": "Movie",
+        "preloaded_bytes": 4 * mb,
+        "preload_size": 4 * mb,
+        "file_stats": [{"id": 1, "path": "Movie.mkv", "length": 10 * mb}],
+    }
+    get_file_info = MagicMock(return_value=status)
+    monkeypatch.setattr(navigation.api, "get_torrent_file_info", get_file_info)
+    get_cache = MagicMock(side_effect=cache_states)
+    monkeypatch.setattr(navigation.api, "get_cache", get_cache)
+    monkeypatch.setattr(navigation, "early_start_enabled", lambda: False)
+    monkeypatch.setattr(navigation, "get_buffer_seconds", lambda: 0)
+    monkeypatch.setattr(navigation, "get_buffering_timeout", lambda: 0)
+    monitor = MagicMock()
+    monitor.waitForAbort.return_value = False
+    monkeypatch.setattr(navigation, "Monitor", lambda: monitor)
+    progress = MagicMock()
+    progress.iscanceled.return_value = False
+    monkeypatch.setattr(navigation, "DialogProgress", lambda: progress)
+    return get_file_info, get_cache, progress
+
+
+def test_buffering_needs_contiguous_head_not_tail_pieces(monkeypatch):
+    # Two head pieces and the tail make 4 MB readable, but the head is short.
+    states = [_cache_state([0, 1, 8, 9]), _cache_state([0, 1, 2, 3, 9])]
+    get_file_info, get_cache, _ = _buffering_setup(monkeypatch, states)
+
+    navigation.wait_for_buffering_completion(HASH, 1)
+
+    assert get_cache.call_count == 2
+    # One status poll per loop, no separate initial request.
+    assert get_file_info.call_count == 2
+
+
+def test_buffering_reads_piece_map_rarely_far_from_target(monkeypatch):
+    mb = 1024 * 1024
+    get_file_info, get_cache, _ = _buffering_setup(
+        monkeypatch, [_cache_state([0]), _cache_state([0, 1, 2, 3])]
+    )
+    files = [{"id": 1, "path": "Movie.mkv", "length": 10 * mb}]
+    get_file_info.side_effect = [
+        {"preloaded_bytes": n * mb, "preload_size": 4 * mb, "file_stats": files}
+        for n in (1, 1, 2, 2, 4)
+    ]
+
+    navigation.wait_for_buffering_completion(HASH, 1)
+
+    assert get_file_info.call_count == 5
+    # The first poll and the one that reached the target.
+    assert get_cache.call_count == 2
+
+
+def test_early_start_needs_probed_bitrate(monkeypatch):
+    mb = 1024 * 1024
+    get_file_info, _, _ = _buffering_setup(monkeypatch, [_cache_state([0, 1])] * 2)
+    monkeypatch.setattr(navigation, "early_start_enabled", lambda: True)
+    files = [{"id": 1, "path": "Movie.mkv", "length": 10 * mb}]
+    # A fast download that would pass for early start at any guessed bitrate
+    # of a 20 minute file.
+    get_file_info.side_effect = [
+        {
+            "preloaded_bytes": n * mb,
+            "preload_size": 4 * mb,
+            "download_speed": 100 * mb,
+            "file_stats": files,
+        }
+        for n in (2, 4)
+    ]
+    navigation.api.get_cache.side_effect = [
+        _cache_state([0, 1, 9]),
+        _cache_state([0, 1, 2, 3, 9]),
+    ]
+
+    navigation.wait_for_buffering_completion(HASH, 1)
+
+    assert get_file_info.call_count == 2
+
+
+def test_buffering_keeps_dialog_up_until_prewarm_finished(monkeypatch):
+    _, get_cache, progress = _buffering_setup(
+        monkeypatch, [_cache_state([0, 1, 2, 3, 9])] * 3
+    )
+    prewarm = MagicMock(started=False)
+    type(prewarm).done = property(lambda _self: get_cache.call_count >= 3)
+
+    def start():
+        prewarm.started = True
+
+    prewarm.start.side_effect = start
+
+    navigation.wait_for_buffering_completion(HASH, 1, prewarm=prewarm)
+
+    prewarm.start.assert_called_once_with()
+    assert get_cache.call_count == 3
+    assert "30277" in progress.update.call_args[0][1]
+
+
+def test_buffering_retries_first_poll_even_without_retry_setting(monkeypatch):
+    get_file_info, _, _ = _buffering_setup(
+        monkeypatch, [_cache_state([0, 1, 2, 3, 9])]
+    )
+    status = get_file_info.return_value
+    get_file_info.side_effect = [TorrServerError("refused"), status]
+    monkeypatch.setattr(navigation, "get_buffer_retries", lambda: 0)
+
+    navigation.wait_for_buffering_completion(HASH, 1)
+
+    assert get_file_info.call_count == 2
+
+
+def test_playback_start_takes_torrent_out_of_warm_pool():
+    navigation.warm_pool.touch(HASH, 1)
+    startup = MagicMock()
+
+    navigation.handle_player_start(HASH, startup)
+
+    startup.finish.assert_called_once_with()
+    assert navigation.warm_pool.get(HASH) is None
+
+
+def test_season_playback_runs_single_file_start_and_stop_handlers(monkeypatch):
+    files = [
+        {"id": 1, "path": "Show.S01E01.mkv", "length": 1},
+        {"id": 2, "path": "Show.S01E02.mkv", "length": 1},
+    ]
+    monkeypatch.setattr(
+        navigation.api,
+        "get_torrent_info",
+        lambda link: {"title": "Show", "file_stats": files},
+    )
+    monkeypatch.setattr(navigation.api, "get_stream_url", lambda **_kwargs: "url")
+    monkeypatch.setattr(navigation, "preloads", MagicMock())
+    monkeypatch.setattr(navigation, "preload_torrent", lambda *_args: None)
+    monkeypatch.setattr(
+        navigation, "wait_for_buffering_completion", lambda *_args: None
+    )
+    monkeypatch.setattr(navigation, "set_info_tag", lambda *_args: None)
+    monkeypatch.setattr(navigation, "StatusPublisher", MagicMock())
+    events = []
+    monkeypatch.setattr(
+        navigation,
+        "handle_player_start",
+        lambda info_hash, startup: events.append(("start", info_hash, startup)),
+    )
+    monkeypatch.setattr(
+        navigation,
+        "handle_player_stop",
+        lambda info_hash, name, file_id, status: events.append(
+            ("stop", info_hash, name, file_id)
+        ),
+    )
+
+    class _Player:
+        def __init__(self, playlist, on_item_handler=None, **kwargs):
+            self._on_item_handler = on_item_handler
+            self._kwargs = kwargs
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_exc):
+            return False
+
+        def play(self, _playlist):
+            pass
+
+        def handle_events(self):
+            self._kwargs["on_start_handler"]()
+            self._on_item_handler(0)
+            self._on_item_handler(1)
+            self._kwargs["on_close_handler"]()
+
+    monkeypatch.setattr(navigation, "PlaylistPlayer", _Player)
+
+    navigation.play_season(HASH, 1)
+
+    assert [event[0] for event in events] == ["start", "stop"]
+    assert events[0][1] == HASH
+    assert events[0][2] is not None
+    # The stop handler keeps the episode that was playing last warm.
+    assert events[1] == ("stop", HASH, "Show.S01E02.mkv", 2)
@@ -0,0 +1,127 @@
+from unittest.mock import MagicMock
+
+from lib.next_episode import NextEpisodePreloader
+from lib.preload import CANCELED, DONE, RUNNING
+from lib.torrserver.api import TorrServerError
+
+HASH = "abc"
+INFO = {
+    "title": "Show Season 1",
+    "file_stats": [
+        {"id": 1, "path": "Show/Show.S01E01.mkv", "length": 10},
+        {"id": 2, "path": "Show/Show.S01E02.mkv", "length": 10},
+    ],
+}
+
+
+class _Player:
+    def __init__(self, elapsed=0, total=3000, buffered=300):
+        self.elapsed = elapsed
+        self.total = total
+        self.buffered = buffered
+
+    def playback_position(self):
+        return self.elapsed, self.total
+
+    def buffered_seconds(self):
+        return self.buffered
+
+
+class _Task:
+    def __init__(self, state=RUNNING):
+        self.state = state
+
+    @property
+    def active(self):
+        return self.state == RUNNING
+
+
+def _preloader(player, path="Show/Show.S01E01.mkv", **kwargs):
+    api = MagicMock()
+    api.get_torrent_info.return_value = INFO
+    preloads = MagicMock()
+    preloads.start.side_effect = lambda *_args: _Task()
+    preloader = NextEpisodePreloader(api, preloads, player, HASH, path, **kwargs)
+    return preloader, api, preloads
+
+
+def test_is_due_by_percent_or_minutes_left():
+    preloader, _, _ = _preloader(_Player(), percent=80, minutes_left=5)
+
+    assert not preloader.is_due(1000, 3000)
+    assert preloader.is_due(2400, 3000)
+    assert preloader.is_due(1000, 1200)
+    assert not preloader.is_due(0, 0)
+
+
+def test_preloads_next_episode_once_due():
+    player = _Player(elapsed=100)
+    preloader, api, preloads = _preloader(player)
+
+    preloader()
+    api.get_torrent_info.assert_not_called()
+
+    player.elapsed = 2500
+    preloader()
+    preloader()
+
+    api.get_torrent_info.assert_called_once_with(HASH)
+    preloads.start.assert_called_once_with(HASH, 2)
+    assert preloader.target["id"] == 2
+
+    preloads.start.side_effect = None
+    preloader._task.state = DONE
+    preloader()
+    assert preloader.finished
+
+
+def test_pauses_while_current_buffer_is_low():
+    player = _Player(elapsed=2500, buffered=300)
+    preloader, _, preloads = _preloader(player, min_buffer_seconds=30)
+    preloader()
+    assert preloads.start.call_count == 1
+
+    player.buffered = 10
+    preloader()
+    preloads.cancel.assert_called_once_with(HASH, 2)
+
+    player.buffered = 40
+    preloader()
+    assert preloads.start.call_count == 1
+
+    player.buffered = 60
+    preloader()
+    assert preloads.start.call_count == 2
+
+
+def test_retries_failed_preload():
+    player = _Player(elapsed=2500)
+    preloader, _, preloads = _preloader(player)
+    preloader()
+    preloader._task.state = CANCELED
+
+    preloader()
+    preloader()
+
+    assert preloads.start.call_count == 2
+
+
+def test_last_episode_finishes_without_preload():
+    player = _Player(elapsed=2500)
+    preloader, _, preloads = _preloader(player, path="Show/Show.S01E02.mkv")
+
+    preloader()
+
+    assert preloader.finished
+    preloads.start.assert_not_called()
+
+
+def test_lookup_error_retries_later():
+    preloader, api, preloads = _preloader(_Player(elapsed=2500))
+    api.get_torrent_info.side_effect = [TorrServerError("down"), INFO]
+
+    preloader()
+    preloads.start.assert_not_called()
+    preloader()
+
+    preloads.start.assert_called_once_with(HASH, 2)
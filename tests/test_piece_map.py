@@ -0,0 +1,70 @@
+from lib.piece_map import PieceMap, file_span
+
+
+def _piece(index, length, size, completed):
+    return {"Id": index, "Length": length, "Size": size, "Completed": completed}
+
+
+def _state(piece_length, complete=(), partial=()):
+    pieces = {str(i): _piece(i, piece_length, piece_length, True) for i in complete}
+    for i in partial:
+        pieces[str(i)] = _piece(i, piece_length, piece_length // 2, False)
+    return {"PiecesLength": piece_length, "PiecesCount": 100, "Pieces": pieces}
+
+
+def test_file_span_sums_previous_file_lengths():
+    files = [
+        {"id": 2, "length": 30},
+        {"id": 1, "length": 10},
+        {"id": 3, "length": 5},
+    ]
+
+    assert file_span(files, 1) == (0, 10)
+    assert file_span(files, "2") == (10, 30)
+    assert file_span(files, 3) == (40, 5)
+    assert file_span(files, 4) is None
+    assert file_span(None, 1) is None
+
+
+def test_head_bytes_stop_at_first_missing_piece():
+    pieces = PieceMap.from_cache_state(_state(10, complete=(1, 2, 4)))
+
+    # The file starts mid piece 1 and ends mid piece 6.
+    assert pieces.head_bytes(15, 50) == 15
+    assert pieces.head_bytes(0, 50) == 0
+
+
+def test_tail_bytes_and_readable_bytes_ignore_scattered_pieces():
+    pieces = PieceMap.from_cache_state(_state(10, complete=(0, 1, 3, 5, 6)))
+
+    assert pieces.head_bytes(0, 65) == 20
+    assert pieces.tail_bytes(0, 65) == 15
+    assert pieces.readable_bytes(0, 65) == 35
+
+
+def test_fully_cached_span_is_counted_once():
+    pieces = PieceMap.from_cache_state(_state(10, complete=range(4)))
+
+    assert pieces.readable_bytes(0, 40) == 40
+
+
+def test_tail_only_gates_once_it_is_being_fetched():
+    idle = PieceMap.from_cache_state(_state(10, complete=(0,)))
+    fetching = PieceMap.from_cache_state(_state(10, complete=(0,), partial=(9,)))
+    done = PieceMap.from_cache_state(_state(10, complete=(0, 8, 9)))
+
+    assert idle.tail_ready(0, 100, tail=20)
+    assert not fetching.tail_ready(0, 100, tail=20)
+    assert done.tail_ready(0, 100, tail=20)
+
+
+def test_bar_marks_complete_partial_and_missing_cells():
+    pieces = PieceMap.from_cache_state(_state(10, complete=(0,), partial=(1,)))
+
+    assert pieces.bar(0, 40, width=4) == "[#+..]"
+
+
+def test_from_cache_state_rejects_missing_piece_data():
+    assert PieceMap.from_cache_state(None) is None
+    assert PieceMap.from_cache_state({"Pieces": {}}) is None
+    assert PieceMap.from_cache_state({"PiecesLength": 4}).head_bytes(0, 4) == 0
@@ -0,0 +1,389 @@
+import sys
+import types
+
+import pytest
+
+
+class _Addon:
+    def getAddonInfo(self, key):
+        return {"name": "JackTorr", "id": "plugin.video.jacktorr", "path": "."}.get(
+            key, ""
+        )
+
+    def getLocalizedString(self, string_id):
+        return str(string_id)
+
+    def getSetting(self, _setting):
+        return ""
+
+    def setSetting(self, _setting, _value):
+        return None
+
+    def openSettings(self):
+        return None
+
+
+class _Dummy:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: None
+
+
+xbmc = sys.modules.setdefault("xbmc", types.ModuleType("xbmc"))
+xbmc.Monitor = getattr(xbmc, "Monitor", _Dummy)
+xbmc.Player = getattr(xbmc, "Player", _Dummy)
+for name, value in {
+    "LOGFATAL": 50,
+    "LOGERROR": 40,
+    "LOGWARNING": 30,
+    "LOGINFO": 20,
+    "LOGDEBUG": 10,
+    "LOGNONE": 0,
+}.items():
+    setattr(xbmc, name, getattr(xbmc, name, value))
+xbmcgui = sys.modules.setdefault("xbmcgui", types.ModuleType("xbmcgui"))
+for name in ("Window", "ControlImage", "ControlLabel", "Dialog"):
+    setattr(xbmcgui, name, getattr(xbmcgui, name, _Dummy))
+xbmcaddon = sys.modules.setdefault("xbmcaddon", types.ModuleType("xbmcaddon"))
+xbmcaddon.Addon = getattr(xbmcaddon, "Addon", _Addon)
+xbmcvfs = sys.modules.setdefault("xbmcvfs", types.ModuleType("xbmcvfs"))
+xbmcvfs.translatePath = getattr(xbmcvfs, "translatePath", lambda path: path)
+
+from lib import overlay
+from lib.player import (
+    JackTorrPlayer,
+    Player,
+    PlayerTimeoutError,
+    PlayerUrlError,
+    PlaylistPlayer,
+)
+from lib.status import snapshot_from_status
+
+URL = "http://localhost:8090/stream/movie.mkv?link=abc&index=1&play"
+
+
+class _Monitor:
+    """Runs one scripted step per waitForAbort call, like Kodi delivering
+    player callbacks while the script waits."""
+
+    def __init__(self, steps):
+        self._steps = list(steps)
+        self.waits = 0
+
+    def waitForAbort(self, _timeout):
+        self.waits += 1
+        if not self._steps:
+            return True
+        step = self._steps.pop(0)
+        return step() if step else False
+
+
+class _RecordingPlayer(Player):
+    def __init__(self, steps, playing_file=URL):
+        super(_RecordingPlayer, self).__init__()
+        self._monitor = _Monitor([None if s is None else s(self) for s in steps])
+        self.active = False
+        self.playing_file = playing_file
+        self.events = []
+
+    def isPlaying(self):
+        return self.active
+
+    def getPlayingFile(self):
+        if not self.active:
+            raise RuntimeError("Kodi is not playing any media file")
+        return self.playing_file
+
+    def on_playback_started(self):
+        self.events.append("started")
+
+    def on_playback_paused(self):
+        self.events.append("paused")
+
+    def on_playback_resumed(self):
+        self.events.append("resumed")
+
+    def on_playback_stopped(self):
+        self.events.append("stopped")
+
+    def on_abort_requested(self):
+        self.events.append("abort")
+
+
+def _start(player):
+    def step():
+        player.active = True
+        player.onAVStarted()
+
+    return step
+
+
+def _call(name):
+    return lambda player: getattr(player, name)
+
+
+def _stop(player):
+    def step():
+        player.active = False
+        player.onPlayBackStopped()
+
+    return step
+
+
+def test_callbacks_follow_kodi_events():
+    player = _RecordingPlayer(
+        [
+            _start,
+            _call("onPlayBackPaused"),
+            _call("onPlayBackPaused"),
+            _call("onPlayBackResumed"),
+            _stop,
+        ]
+    )
+
+    player.handle_events(url=URL)
+
+    assert player.events == ["started", "paused", "resumed", "stopped"]
+    assert player._monitor.waits == 5
+
+
+def test_watchdog_catches_missed_events():
+    def start_silently(player):
+        def step():
+            player.active = True
+
+        return step
+
+    def stop_silently(player):
+        def step():
+            player.active = False
+
+        return step
+
+    player = _RecordingPlayer([start_silently, None, stop_silently])
+
+    player.handle_events(url=URL)
+
+    assert player.events == ["started", "stopped"]
+
+
+def test_other_file_raises_url_error():
+    player = _RecordingPlayer([_start], playing_file="http://other")
+
+    with pytest.raises(PlayerUrlError):
+        player.handle_events(url=URL)
+    assert player.events == []
+
+
+def test_start_timeout(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("lib.player.time.time", lambda: now[0])
+
+    def wait(_player):
+        def step():
+            now[0] += 2
+
+        return step
+
+    player = _RecordingPlayer([wait] * 10)
+
+    with pytest.raises(PlayerTimeoutError):
+        player.handle_events(url=URL, timeout=5)
+    assert player._monitor.waits == 3
+
+
+def test_abort_during_playback():
+    player = _RecordingPlayer([_start, lambda _player: (lambda: True)])
+
+    player.handle_events(url=URL)
+
+    assert player.events == ["started", "abort"]
+
+
+def test_tick_handlers_run_each_watchdog_period_while_playing():
+    player = JackTorrPlayer()
+    active = [False]
+    player.isPlaying = lambda: active[0]
+    ticks = []
+    player.add_tick_handler(lambda: ticks.append(active[0]))
+
+    def start():
+        active[0] = True
+        player.onAVStarted()
+
+    def stop():
+        active[0] = False
+        player.onPlayBackStopped()
+
+    player._monitor = _Monitor([None, start, None, None, stop, None])
+    player.handle_events()
+
+    assert ticks == [True, True, True]
+
+
+class _Label:
+    def __init__(self, *args, **kwargs):
+        self.labels = []
+
+    def setLabel(self, label):
+        self.labels.append(label)
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: None
+
+
+def test_overlay_skips_unchanged_labels(monkeypatch):
+    monkeypatch.setattr(overlay, "get_resolution", lambda: (1920, 1080))
+    monkeypatch.setattr(overlay, "ControlLabel", _Label)
+    text = overlay.OverlayText()
+
+    text.set_text("a", "b", "c")
+    text.set_text("a", "b2", "c")
+    text.set_text("a", None, "c")
+
+    assert text._label1.labels == ["a"]
+    assert text._label2.labels == ["b", "b2"]
+    assert text._label3.labels == ["c"]
+
+
+class _Publisher:
+    def __init__(self):
+        self.latest = None
+        self.subscribers = []
+        self.started = False
+        self.stopped = False
+        self.requests = 0
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def request_sample(self):
+        self.requests += 1
+
+    def start(self):
+        self.started = True
+
+    def stop(self, wait=True):
+        self.stopped = True
+
+    def publish(self, status):
+        self.latest = snapshot_from_status(status, 0)
+        for callback in self.subscribers:
+            callback(self.latest)
+
+
+def test_overlay_follows_published_status_while_paused(monkeypatch):
+    overlays = []
+
+    class _Overlay:
+        def __init__(self):
+            self.shown = False
+            self.texts = []
+            self.closed = False
+            overlays.append(self)
+
+        def show(self):
+            self.shown = True
+
+        def hide(self):
+            self.shown = False
+
+        def set_text(self, *labels):
+            self.texts.append(labels)
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr("lib.player.OverlayText", _Overlay)
+    publisher = _Publisher()
+    with JackTorrPlayer(
+        status_publisher=publisher,
+        text_handler=lambda snapshot: (str(snapshot and snapshot.stat),),
+    ) as player:
+        player.onAVStarted()
+        assert publisher.started
+        assert publisher.subscribers == []
+        publisher.publish({"stat": 1})
+        player.onPlayBackPaused()
+        assert publisher.requests == 1
+        publisher.publish({"stat": 3})
+        player.onPlayBackResumed()
+        assert publisher.subscribers == []
+        publisher.publish({"stat": 4})
+
+    assert overlays[0].texts == [("1",), ("3",)]
+    assert overlays[0].closed
+    assert publisher.stopped
+
+
+class _Playlist:
+    def __init__(self):
+        self.position = 0
+
+    def getposition(self):
+        return self.position
+
+
+def test_playlist_player_reports_items_until_playlist_ends():
+    playlist = _Playlist()
+    positions = []
+    player = PlaylistPlayer(playlist, on_item_handler=positions.append)
+    player.active = False
+    player.isPlaying = lambda: player.active
+
+    def start(position):
+        def step():
+            playlist.position = position
+            player.active = True
+            player.onAVStarted()
+
+        return step
+
+    def end_item():
+        player.active = False
+        player.onPlayBackEnded()
+
+    steps = [start(0), end_item, start(1), end_item, None, None]
+    player._monitor = _Monitor(steps)
+
+    player.handle_events()
+
+    assert positions == [0, 1]
+    assert player._monitor.waits == 6
+
+
+def test_playlist_player_runs_start_and_close_handlers_once():
+    playlist = _Playlist()
+    events = []
+    player = PlaylistPlayer(
+        playlist,
+        on_item_handler=lambda position: events.append(("item", position)),
+        on_start_handler=lambda: events.append("start"),
+        on_close_handler=lambda: events.append("close"),
+    )
+    player.active = False
+    player.isPlaying = lambda: player.active
+
+    def start(position):
+        def step():
+            playlist.position = position
+            player.active = True
+            player.onAVStarted()
+
+        return step
+
+    def end_item():
+        player.active = False
+        player.onPlayBackEnded()
+
+    player._monitor = _Monitor([start(0), end_item, start(1), end_item, None, None])
+
+    with player:
+        player.handle_events()
+
+    assert events == ["start", ("item", 0), ("item", 1), "close"]
@@ -0,0 +1,123 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from lib.torrserver.api import TorrServerError
+from lib.torrserver.pool import TorrServerPool
+
+
+def _client(url, holds=()):
+    client = MagicMock()
+    client.base_url = url
+    client.torr_version = b"1.0"
+
+    def get_torrent_info_by_hash(info_hash):
+        if info_hash in holds:
+            return {"hash": info_hash}
+        raise TorrServerError("not found", status_code=404)
+
+    client.get_torrent_info_by_hash.side_effect = get_torrent_info_by_hash
+    client.get_stream_url.side_effect = lambda link, path, file_id: "{}/stream/{}".format(
+        url, path
+    )
+    return client
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+def _pool(tmp_path, clock, *clients):
+    return TorrServerPool(
+        clients, state_path=str(tmp_path / "pool.json"), probe_interval=30, clock=clock
+    )
+
+
+def test_add_goes_to_least_loaded_node_and_pins_hash(tmp_path, clock):
+    a, b = _client("http://a"), _client("http://b")
+    a.add_magnet.return_value = "ha"
+    b.add_magnet.return_value = "hb"
+    pool = _pool(tmp_path, clock, a, b)
+
+    added = {pool.add_magnet("magnet:1"), pool.add_magnet("magnet:2")}
+
+    assert added == {"ha", "hb"}
+    pool.get_torrent_info("hb")
+    b.get_torrent_info.assert_called_once_with("hb")
+    a.get_torrent_info.assert_not_called()
+    assert pool.get_stream_url("ha", "x.mkv", 1) == "http://a/stream/x.mkv"
+
+
+def test_unknown_hash_is_located_on_the_node_holding_it(tmp_path, clock):
+    a, b = _client("http://a"), _client("http://b", holds=("h9",))
+    pool = _pool(tmp_path, clock, a, b)
+
+    pool.get_torrent_file_info("h9", 3)
+
+    b.get_torrent_file_info.assert_called_once_with("h9", 3)
+    a.get_torrent_file_info.assert_not_called()
+
+
+def test_metadata_requests_fail_over_when_node_dies(tmp_path, clock):
+    a, b = _client("http://a", holds=("h1",)), _client("http://b")
+    pool = _pool(tmp_path, clock, a, b)
+    assert pool.get_stream_url("h1", "x.mkv", 1) == "http://a/stream/x.mkv"
+
+    a.get_torrent_info.side_effect = TorrServerError("connection refused")
+    b.get_torrent_info.return_value = {"hash": "h1"}
+
+    assert pool.get_torrent_info("h1") == {"hash": "h1"}
+    assert pool.get_stream_url("h1", "x.mkv", 1) == "http://b/stream/x.mkv"
+
+
+def test_http_errors_do_not_fail_over(tmp_path, clock):
+    a, b = _client("http://a", holds=("h1",)), _client("http://b")
+    a.get_torrent_info.side_effect = TorrServerError("bad", status_code=500)
+    pool = _pool(tmp_path, clock, a, b)
+
+    with pytest.raises(TorrServerError):
+        pool.get_torrent_info("h1")
+    b.get_torrent_info.assert_not_called()
+
+
+def test_probe_excludes_unhealthy_nodes_from_new_adds(tmp_path, clock):
+    a, b = _client("http://a"), _client("http://b")
+    type(a).torr_version = property(
+        lambda self: (_ for _ in ()).throw(TorrServerError("down"))
+    )
+    b.add_magnet.return_value = "h1"
+    pool = _pool(tmp_path, clock, a, b)
+
+    assert pool.add_magnet("magnet:1") == "h1"
+    a.add_magnet.assert_not_called()
+
+
+def test_state_is_shared_between_pool_instances(tmp_path, clock):
+    a, b = _client("http://a"), _client("http://b", holds=("h1",))
+    first = _pool(tmp_path, clock, a, b)
+    first.get_torrent_info("h1")
+
+    second = _pool(tmp_path, clock, _client("http://a"), _client("http://b"))
+    assert second.get_stream_url("h1", "x.mkv", 1) == "http://b/stream/x.mkv"
+
+
+def test_iter_torrents_merges_nodes_and_pins_hashes(tmp_path, clock):
+    a, b = _client("http://a"), _client("http://b")
+    a.iter_torrents.return_value = iter([{"hash": "h1"}, {"hash": "h2"}])
+    b.iter_torrents.return_value = iter([{"hash": "h2"}, {"hash": "h3"}])
+    pool = _pool(tmp_path, clock, a, b)
+
+    hashes = [t["hash"] for t in pool.iter_torrents(fields=("hash",))]
+
+    assert sorted(hashes) == ["h1", "h2", "h3"]
+    pool.remove_torrent("h3")
+    b.remove_torrent.assert_called_once_with("h3", save_to_db=True)
@@ -0,0 +1,224 @@
+import http.client
+import threading
+
+from lib.preload import CANCELED, DONE, FAILED, PENDING, PreloadManager
+from lib.torrserver.api import TorrServerError
+
+
+class _Api:
+    def __init__(self):
+        self.recorded = []
+
+    def preload_request(self, link, file_id=1, title=""):
+        return "http://localhost:8090/stream?link={}&index={}".format(link, file_id), {}
+
+    def record_preload(self, link, seconds, status=None, error=None, unreachable=False):
+        self.recorded.append((link, status, type(error).__name__, unreachable))
+
+
+class _Response:
+    def __init__(self, status):
+        self.status = status
+
+    def read(self):
+        return b""
+
+
+class _Socket:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def settimeout(self, _timeout):
+        pass
+
+    def shutdown(self, _how):
+        self._connection.release.set()
+
+
+class _Connection:
+    """Blocks in getresponse until released, like a preload in progress."""
+
+    def __init__(self, status=200, on_request=None):
+        self.status = status
+        self.sock = None
+        self.auto_open = 1
+        self.requests = []
+        self.closed = False
+        self.release = threading.Event()
+        self._on_request = on_request
+
+    def connect(self):
+        self.sock = _Socket(self)
+
+    def request(self, method, path, headers=None):
+        if self.sock is None and not self.auto_open:
+            raise http.client.NotConnected()
+        self.requests.append((method, path))
+        self._on_request()
+
+    def getresponse(self):
+        self.release.wait(5)
+        if self.closed or self.sock is None:
+            raise http.client.RemoteDisconnected("closed")
+        return _Response(self.status)
+
+    def close(self):
+        self.closed = True
+        self.release.set()
+
+
+class _Connections:
+    def __init__(self, status=200):
+        self.status = status
+        self.opened = []
+        self._requests = threading.Semaphore(0)
+
+    def __call__(self, url, timeout):
+        connection = _Connection(self.status, on_request=self._requests.release)
+        self.opened.append(connection)
+        return connection
+
+    def wait_for_request(self):
+        """The connection of the next request sent to the server."""
+        assert self._requests.acquire(timeout=5)
+        return self.opened[-1]
+
+
+def test_start_deduplicates_running_preloads():
+    connections = _Connections()
+    manager = PreloadManager(_Api(), open_connection=connections)
+
+    task = manager.start("abc", 1)
+    assert manager.start("abc", "1") is task
+    assert task.wait(0) is False
+
+    connection = connections.wait_for_request()
+    assert connection.requests == [("GET", "/stream?link=abc&index=1")]
+    connection.release.set()
+    assert task.wait(5)
+    assert manager.status("abc", 1) == DONE
+    assert len(connections.opened) == 1
+
+    assert manager.start("abc", 1) is not task
+
+
+def test_cancel_closes_running_connection():
+    connections = _Connections()
+    manager = PreloadManager(_Api(), open_connection=connections)
+    task = manager.start("abc", 1)
+    connection = connections.wait_for_request()
+
+    assert manager.cancel("abc") == 1
+    assert task.wait(5)
+    assert task.state == CANCELED
+    assert connection.closed
+
+
+def test_cancel_keeps_requested_file():
+    connections = _Connections()
+    manager = PreloadManager(_Api(), open_connection=connections)
+    first = manager.start("abc", 1)
+    second = manager.start("abc", 2)
+
+    assert manager.cancel("abc", keep=2) == 1
+    assert first.wait(5)
+    assert first.state == CANCELED
+    assert second.active
+
+    manager.cancel_all()
+    assert second.wait(5)
+
+
+def test_concurrency_cap_queues_and_cancels_pending_preloads():
+    connections = _Connections()
+    manager = PreloadManager(_Api(), max_concurrent=1, open_connection=connections)
+    running = manager.start("abc", 1)
+    queued = manager.start("def", 1)
+    connection = connections.wait_for_request()
+
+    assert queued.state == PENDING
+    assert len(connections.opened) == 1
+
+    assert queued.cancel()
+    assert queued.wait(5)
+    assert queued.state == CANCELED
+
+    connection.release.set()
+    assert running.wait(5)
+    assert running.state == DONE
+    assert len(connections.opened) == 1
+
+
+def test_http_error_marks_preload_failed():
+    connections = _Connections(status=500)
+    manager = PreloadManager(_Api(), open_connection=connections)
+    task = manager.start("abc", 1)
+    connections.wait_for_request().release.set()
+
+    assert task.wait(5)
+    assert task.state == FAILED
+    assert isinstance(task.error, TorrServerError)
+    assert manager.snapshot() == {("abc", "1"): FAILED}
+
+
+def test_preload_records_metric_and_outcome():
+    api = _Api()
+    connections = _Connections()
+    manager = PreloadManager(api, open_connection=connections)
+    task = manager.start("abc", 1)
+    connections.wait_for_request().release.set()
+
+    assert task.wait(5)
+    assert api.recorded == [("abc", 200, "NoneType", False)]
+    assert connections.opened[0].auto_open == 0
+
+
+def test_refused_connection_is_recorded_as_unreachable():
+    class _Refused(_Connection):
+        def connect(self):
+            raise ConnectionRefusedError("refused")
+
+    api = _Api()
+    manager = PreloadManager(api, open_connection=lambda url, timeout: _Refused())
+    task = manager.start("abc", 1)
+
+    assert task.wait(5)
+    assert task.state == FAILED
+    assert api.recorded == [("abc", None, "ConnectionRefusedError", True)]
+
+
+def test_cancel_while_connecting_sends_no_request():
+    connections = []
+
+    class _Cancelled(_Connection):
+        def connect(self):
+            super(_Cancelled, self).connect()
+            manager.cancel("abc")
+
+    def open_connection(url, timeout):
+        connections.append(_Cancelled())
+        return connections[-1]
+
+    api = _Api()
+    manager = PreloadManager(api, open_connection=open_connection)
+    task = manager.start("abc", 1)
+
+    assert task.wait(5)
+    assert task.state == CANCELED
+    assert connections[0].requests == []
+    assert api.recorded == []
+
+
+def test_unexpected_error_still_finishes_task():
+    class _Broken(_Connection):
+        def connect(self):
+            pass
+
+        def request(self, method, path, headers=None):
+            raise ValueError("unexpected")
+
+    manager = PreloadManager(_Api(), open_connection=lambda url, timeout: _Broken())
+    task = manager.start("abc", 1)
+
+    assert task.wait(5)
+    assert task.state == FAILED
@@ -0,0 +1,138 @@
+import struct
+import threading
+
+from lib.prewarm import (
+    HEAD_BYTES,
+    MAX_INDEX_BYTES,
+    Prewarm,
+    TAIL_BYTES,
+    index_ranges,
+    mkv_cues_offset,
+    mp4_moov_range,
+    prewarm,
+)
+from lib.torrserver.api import TorrServerError
+
+
+def _ebml(element_id, payload):
+    size = len(payload)
+    # One byte vint when possible, otherwise an 8 byte vint.
+    if size < 127:
+        encoded = bytes([0x80 | size])
+    else:
+        encoded = b"\x01" + size.to_bytes(7, "big")
+    return element_id + encoded + payload
+
+
+def _mkv_head(cues_position):
+    seek = _ebml(
+        b"\x4d\xbb",
+        _ebml(b"\x53\xab", b"\x1c\x53\xbb\x6b")
+        + _ebml(b"\x53\xac", cues_position.to_bytes(4, "big")),
+    )
+    info_seek = _ebml(
+        b"\x4d\xbb",
+        _ebml(b"\x53\xab", b"\x15\x49\xa9\x66") + _ebml(b"\x53\xac", b"\x00\x10"),
+    )
+    segment_payload = _ebml(b"\x11\x4d\x9b\x74", info_seek + seek) + _ebml(
+        b"\x1f\x43\xb6\x75", b"\x00" * 64
+    )
+    header = _ebml(b"\x1a\x45\xdf\xa3", _ebml(b"\x42\x82", b"matroska"))
+    # Segment of unknown size, as written by live muxers.
+    unknown_size = b"\x01" + b"\xff" * 7
+    return header + b"\x18\x53\x80\x67" + unknown_size + segment_payload
+
+
+def _box(box_type, size):
+    return struct.pack(">I4s", size, box_type)
+
+
+def test_mkv_cues_offset_follows_seek_head():
+    head = _mkv_head(5000000)
+    segment_start = head.index(b"\x11\x4d\x9b\x74")
+
+    assert mkv_cues_offset(head) == segment_start + 5000000
+
+
+def test_mkv_without_seek_head_or_truncated():
+    assert mkv_cues_offset(b"not a matroska file") is None
+    assert mkv_cues_offset(_mkv_head(5000000)[:30]) is None
+
+
+def test_mp4_moov_after_mdat():
+    head = _box(b"ftyp", 24) + b"\x00" * 16 + _box(b"mdat", 9000000)
+
+    assert mp4_moov_range(head, 10000000) == (9000024, None)
+
+
+def test_mp4_faststart_moov_in_head():
+    head = _box(b"ftyp", 24) + b"\x00" * 16 + _box(b"moov", 5000) + b"\x00" * 100
+
+    assert mp4_moov_range(head, 10000000) == (24, 5000)
+    assert mp4_moov_range(b"\x00" * 100, 10000000) is None
+
+
+def test_index_ranges_merge_tail_and_index():
+    length = 100 * 1024 * 1024
+    cues = length - 2 * 1024 * 1024
+    head = _mkv_head(cues - _mkv_head(0).index(b"\x11\x4d\x9b\x74"))
+
+    assert index_ranges(head, length) == [(cues, length - 1)]
+
+
+def test_index_ranges_cap_unknown_moov_and_skip_head():
+    length = 100 * 1024 * 1024
+    head = _box(b"ftyp", 24) + b"\x00" * 16 + _box(b"mdat", 10 * 1024 * 1024)
+    moov = 24 + 10 * 1024 * 1024
+
+    assert index_ranges(head, length) == [
+        (moov, moov + MAX_INDEX_BYTES - 1),
+        (length - TAIL_BYTES, length - 1),
+    ]
+    # A file smaller than the head needs no prewarm.
+    assert index_ranges(head, HEAD_BYTES // 2) == []
+
+
+class FakeApi:
+    def __init__(self, head, length, fail=False):
+        self.head = head
+        self.length = length
+        self.fail = fail
+        self.reads = []
+        self.lock = threading.Lock()
+
+    def read_stream_range(self, link, file_id, start, end, read_timeout=None):
+        with self.lock:
+            self.reads.append((start, end))
+        if start == 0:
+            return self.head, self.length
+        if self.fail:
+            raise TorrServerError("boom")
+        return b"\x00" * (end - start + 1), self.length
+
+
+def test_prewarm_reads_index_ranges():
+    length = 100 * 1024 * 1024
+    api = FakeApi(_box(b"ftyp", 24) + b"\x00" * 16 + _box(b"mdat", 5000000), length)
+
+    assert prewarm(api, "hash", 1, timeout=5)
+    assert sorted(api.reads) == [
+        (0, HEAD_BYTES - 1),
+        (5000024, 5000024 + MAX_INDEX_BYTES - 1),
+        (length - TAIL_BYTES, length - 1),
+    ]
+
+
+def test_prewarm_reports_failed_ranges():
+    api = FakeApi(b"\x00" * 100, 100 * 1024 * 1024, fail=True)
+
+    assert not prewarm(api, "hash", 1, timeout=5)
+
+
+def test_prewarm_runs_in_background():
+    api = FakeApi(b"\x00" * 100, 100 * 1024 * 1024)
+    task = Prewarm(api, "hash", 1, timeout=5)
+    assert not task.started and not task.done
+
+    assert task.start().result(timeout=5) is True
+    assert task.started and task.done
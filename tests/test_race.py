@@ -0,0 +1,119 @@
+from lib.race import (
+    Race,
+    RaceEntry,
+    parse_size,
+    race_file,
+    same_content,
+    select_candidates,
+)
+
+HASH_A = "a" * 40
+HASH_B = "b" * 40
+HASH_C = "c" * 40
+HASH_D = "d" * 40
+
+
+def _result(info_hash, title, size="4.00 GB", seeds=0):
+    return {
+        "Title": title,
+        "Size": size,
+        "Seed": seeds,
+        "Magnet": "magnet:?xt=urn:btih:" + info_hash,
+    }
+
+
+def _status(stat=3, files=None, preloaded=0, preload_size=100):
+    return {
+        "stat": stat,
+        "file_stats": files or [],
+        "preloaded_bytes": preloaded,
+        "preload_size": preload_size,
+    }
+
+
+def test_parse_size_handles_units_and_numbers():
+    assert parse_size("42.93 GB") == int(42.93 * 1024 ** 3)
+    assert parse_size("700 MiB") == 700 * 1024 ** 2
+    assert parse_size("1,5 KB") == 1536
+    assert parse_size(1234) == 1234
+    assert parse_size("unknown") is None
+    assert parse_size(None) is None
+
+
+def test_same_content_matches_similar_titles_or_sizes():
+    picked = _result(HASH_A, "Movie.Name.2020.1080p.WEB-DL [Group]", "4.00 GB")
+
+    assert same_content(picked, _result(HASH_B, "Movie Name 2020 1080p WEBRip", "9 GB"))
+    assert same_content(picked, _result(HASH_C, "Something else", "4.50 GB"))
+    assert not same_content(picked, _result(HASH_D, "Something else", "1 GB"))
+
+
+def test_select_candidates_keeps_picked_first_and_orders_by_seeds():
+    picked = _result(HASH_A, "Movie 2020 1080p", seeds=1)
+    results = [
+        _result(HASH_B, "Movie 2020 1080p x265", seeds=5),
+        picked,
+        _result(HASH_C, "Movie 2020 720p", seeds=50),
+        _result(HASH_A.upper(), "Movie 2020 1080p duplicate", seeds=99),
+        _result(HASH_D, "Unrelated", "100 MB", seeds=1000),
+        {"Title": "Movie 2020 1080p", "Size": "4 GB"},
+    ]
+
+    candidates = select_candidates(results, picked["Magnet"], limit=3)
+
+    assert candidates == [picked, results[2], results[0]]
+    assert select_candidates(results, picked["Magnet"], limit=1) == [picked]
+    assert select_candidates(results, "magnet:?xt=urn:btih:" + "e" * 40) == []
+
+
+def test_race_file_picks_largest_video():
+    files = [
+        {"id": 1, "path": "Movie/sample.mkv", "length": 10},
+        {"id": 2, "path": "Movie/movie.mkv", "length": 100},
+        {"id": 3, "path": "Movie/extras.nfo", "length": 1000},
+    ]
+
+    assert race_file(files)["id"] == 2
+    assert race_file(files, min_size=200) is None
+
+
+def test_race_file_picks_requested_episode():
+    files = [
+        {"id": 1, "path": "Show/Show.S01E01.mkv", "length": 100},
+        {"id": 2, "path": "Show/Show.S01E02.mkv", "length": 90},
+    ]
+
+    assert race_file(files, season="1", episode="2")["id"] == 2
+    assert race_file(files, season="1", episode="3") is None
+
+
+def test_race_update_resolves_fails_and_picks_winner():
+    fast = RaceEntry(_result(HASH_A, "fast"), HASH_A)
+    slow = RaceEntry(_result(HASH_B, "slow"), HASH_B)
+    empty = RaceEntry(_result(HASH_C, "empty"), HASH_C)
+    race = Race([fast, slow, empty])
+    video = [{"id": 1, "path": "movie.mkv", "length": 100}]
+
+    newly_resolved, winner = race.update(
+        {
+            HASH_A: _status(files=video),
+            HASH_B: _status(stat=1),
+            HASH_C: _status(files=[{"id": 1, "path": "a.txt", "length": 1}]),
+        }
+    )
+
+    assert newly_resolved == [fast]
+    assert winner is None
+    assert empty.failed
+    assert race.running == [fast, slow]
+
+    newly_resolved, winner = race.update(
+        {
+            HASH_A: _status(files=video, preloaded=100),
+            HASH_B: _status(files=video, preloaded=10),
+        }
+    )
+
+    assert newly_resolved == [slow]
+    assert winner is fast
+    assert race.losers(winner) == [slow, empty]
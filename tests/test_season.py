@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock, call
+
+from lib.season import PreloadWindow, season_playlist
+
+
+def _file(file_id, path, length=10):
+    return {"id": file_id, "path": path, "length": length}
+
+
+FILES = [
+    _file(1, "Show/Show.S01E03.mkv"),
+    _file(2, "Show/Show.S01E01.mkv"),
+    _file(3, "Show/Show.S01E02.mkv"),
+    _file(4, "Show/Show.S01E02.720p.mkv", length=5),
+    _file(5, "Show/Show.S02E01.mkv"),
+    _file(6, "Show/Show.S01E04.srt"),
+    _file(7, "Show/Extras/Behind the scenes.mkv"),
+]
+
+
+def test_season_playlist_orders_episodes_from_picked_one():
+    items = season_playlist(FILES, 2)
+
+    assert [item["id"] for item in items] == [2, 3, 1]
+
+
+def test_season_playlist_keeps_picked_version_of_episode():
+    items = season_playlist(FILES, "4")
+
+    assert [item["id"] for item in items] == [4, 1]
+
+
+def test_season_playlist_needs_an_episode():
+    assert season_playlist(FILES, 7) == []
+    assert season_playlist(FILES, 99) == []
+
+
+def test_preload_window_moves_with_playback():
+    preloads = MagicMock()
+    items = [_file(i, "Show.S01E0{}.mkv".format(i)) for i in range(1, 6)]
+    window = PreloadWindow(preloads, "abc", items, size=2)
+
+    window.move(0)
+    assert preloads.start.call_args_list == [call("abc", "2"), call("abc", "3")]
+    preloads.cancel.assert_not_called()
+
+    preloads.reset_mock()
+    window.move(1)
+    assert preloads.start.call_args_list == [call("abc", "4")]
+    assert preloads.cancel.call_args_list == [call("abc", "2")]
+
+    # Skipping ahead cancels the items jumped over.
+    preloads.reset_mock()
+    window.move(4)
+    preloads.start.assert_not_called()
+    assert preloads.cancel.call_args_list == [call("abc", "3"), call("abc", "4")]
+
+    window.move(7)
+    preloads.reset_mock()
+    window.move(2)
+    window.close()
+    assert preloads.cancel.call_args_list == [call("abc", "4"), call("abc", "5")]
@@ -5,7 +5,7 @@ import threading
 import types
 from unittest.mock import MagicMock
 
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, ReadTimeout
 
 
 class _Addon:
@@ -56,11 +56,16 @@ sys.modules.setdefault("xbmcaddon", xbmcaddon)
 sys.modules.setdefault("xbmcvfs", xbmcvfs)
 
 from lib import service
+from lib.torrserver import breaker
+from lib.warm_pool import WarmPool
 
 
 def _monitor():
     monitor = service.DaemonMonitor.__new__(service.DaemonMonitor)
     monitor._settings_set_uri = "settings"
+    monitor._warm_pool = WarmPool()
+    monitor._warm_keeper = None
+    monitor._metrics = MagicMock()
     return monitor
 
 
@@ -111,11 +116,12 @@ def test_update_daemon_settings_writes_when_sync_enabled_and_settings_differ(mon
 
     assert monitor._update_daemon_settings() is True
     monitor._refresh_connection.assert_called_once_with()
-    monitor._request.assert_called_once_with(
-        "post",
-        "settings",
-        data=json.dumps({"action": "set", "sets": {"CacheSize": 2}}),
-    )
+    monitor._request.assert_called_once()
+    assert monitor._request.call_args.args == ("post", "settings")
+    assert json.loads(monitor._request.call_args.kwargs["data"]) == {
+        "action": "set",
+        "sets": {"CacheSize": 2},
+    }
 
 
 def test_update_daemon_settings_does_not_write_when_enabled_settings_match(monkeypatch):
@@ -133,15 +139,110 @@ def test_update_daemon_settings_does_not_write_when_enabled_settings_match(monke
     monitor._request.assert_not_called()
 
 
+def test_keep_warm_skips_empty_pool(monkeypatch):
+    monitor = _monitor()
+    monitor._warm_keeper = MagicMock()
+    monkeypatch.setattr(service, "get_warm_pool_size", lambda: 3)
+    monkeypatch.setattr(service, "get_warm_pool_budget", lambda: 512)
+
+    monitor._keep_warm()
+    monitor._warm_keeper.tick.assert_not_called()
+
+    monitor._warm_pool.touch("abc", 1)
+    monitor._keep_warm()
+    monitor._warm_keeper.tick.assert_called_once_with(3, 512 * 1024 * 1024)
+
+
+def test_keep_warm_survives_unexpected_errors(monkeypatch):
+    monitor = _monitor()
+    monitor._warm_keeper = MagicMock()
+    monitor._warm_keeper.tick.side_effect = KeyError("file_id")
+    monkeypatch.setattr(service, "get_warm_pool_size", lambda: 3)
+    monkeypatch.setattr(service, "get_warm_pool_budget", lambda: 512)
+    monitor._warm_pool.touch("abc", 1)
+
+    monitor._keep_warm()
+
+    monitor._warm_keeper.tick.assert_called_once()
+
+
 def test_start_syncs_then_waits_for_abort():
     monitor = _monitor()
     monitor.onSettingsChanged = MagicMock()
-    monitor.waitForAbort = MagicMock()
+    monitor.waitForAbort = MagicMock(return_value=True)
+    monitor._probe_torrserver = MagicMock()
+    monitor._keep_warm = MagicMock()
 
     monitor.start()
 
     monitor.onSettingsChanged.assert_called_once_with()
-    monitor.waitForAbort.assert_called_once_with()
+    monitor.waitForAbort.assert_called_once_with(monitor.probe_interval)
+    monitor._probe_torrserver.assert_not_called()
+
+
+def test_start_probes_torrserver_until_abort():
+    monitor = _monitor()
+    monitor.onSettingsChanged = MagicMock()
+    monitor.waitForAbort = MagicMock(side_effect=[False, False, True])
+    monitor._probe_torrserver = MagicMock()
+    monitor._keep_warm = MagicMock()
+
+    monitor.start()
+
+    assert monitor._probe_torrserver.call_count == 2
+    assert monitor._keep_warm.call_count == 2
+    assert monitor._metrics.maybe_dump.call_count == 2
+    monitor._metrics.dump.assert_called_once_with()
+
+
+def _breaker_monitor(tmp_path, state):
+    monitor = _monitor()
+    monitor._pool = None
+    monitor._breaker = breaker.CircuitBreaker(
+        "host:5665", state_path=str(tmp_path / "breaker.json"), failure_threshold=1
+    )
+    if state != breaker.CLOSED:
+        monitor._breaker.record_failure()
+    return monitor
+
+
+def test_probe_closes_open_breaker_when_torrserver_answers(tmp_path):
+    monitor = _breaker_monitor(tmp_path, breaker.OPEN)
+    monitor._request = MagicMock(return_value=MagicMock(status_code=200))
+
+    monitor._probe_torrserver()
+
+    monitor._request.assert_called_once_with(
+        "get", "echo", timeout=monitor.probe_timeout
+    )
+    assert monitor._breaker.state == breaker.CLOSED
+
+
+def test_probe_keeps_breaker_open_while_torrserver_is_down(tmp_path):
+    monitor = _breaker_monitor(tmp_path, breaker.OPEN)
+    monitor._request = MagicMock(side_effect=ConnectionError("refused"))
+
+    monitor._probe_torrserver()
+
+    assert monitor._breaker.state == breaker.OPEN
+
+
+def test_probe_read_timeout_is_not_a_breaker_failure(tmp_path):
+    monitor = _breaker_monitor(tmp_path, breaker.OPEN)
+    monitor._request = MagicMock(side_effect=ReadTimeout("slow"))
+
+    monitor._probe_torrserver()
+
+    assert monitor._breaker._current()["failures"] == 1
+
+
+def test_probe_is_skipped_while_breaker_is_closed(tmp_path):
+    monitor = _breaker_monitor(tmp_path, breaker.CLOSED)
+    monitor._request = MagicMock()
+
+    monitor._probe_torrserver()
+
+    monitor._request.assert_not_called()
 
 
 def test_refresh_connection_reloads_settings(monkeypatch):
@@ -152,6 +253,11 @@ def test_refresh_connection_reloads_settings(monkeypatch):
     monkeypatch.setattr(service, "get_username", lambda: "new-user")
     monkeypatch.setattr(service, "get_password", lambda: "new-password")
     monkeypatch.setattr(service, "ssl_enabled", lambda: True)
+    monkeypatch.setattr(service, "get_connect_timeout", lambda: 3)
+    monkeypatch.setattr(service, "get_read_timeout", lambda: 20)
+    monkeypatch.setattr(service, "get_extra_servers", lambda: [])
+    monkeypatch.setattr(service, "create_client", MagicMock())
+    previous = monitor._warm_keeper = MagicMock()
 
     monitor._refresh_connection()
 
@@ -162,6 +268,8 @@ def test_refresh_connection_reloads_settings(monkeypatch):
     assert monitor._base_url == "https://new-host:9000"
     assert monitor._auth.username == "new-user"
     assert monitor._auth.password == "new-password"
+    assert monitor._timeout == (3, 20)
+    previous.close.assert_called_once_with()
 
 
 def test_update_daemon_settings_refreshes_connection_before_gate(monkeypatch):
@@ -179,3 +287,30 @@ def test_update_daemon_settings_refreshes_connection_before_gate(monkeypatch):
     assert monitor._update_daemon_settings() is True
     assert calls == ["refresh", "gate"]
     monitor._get_daemon_settings.assert_not_called()
+
+
+def test_request_uses_pooled_session_with_timeout():
+    monitor = _monitor()
+    monitor._base_url = "http://localhost:5665"
+    monitor._auth = None
+    monitor._timeout = (3, 20)
+    monitor._session = MagicMock()
+
+    monitor._request("post", "settings", data="{}")
+
+    monitor._session.request.assert_called_once_with(
+        "post",
+        "http://localhost:5665/settings",
+        auth=None,
+        timeout=(3, 20),
+        data="{}",
+    )
+
+
+def test_probe_refreshes_pool_health(tmp_path):
+    monitor = _breaker_monitor(tmp_path, breaker.CLOSED)
+    monitor._pool = MagicMock()
+
+    monitor._probe_torrserver()
+
+    monitor._pool.probe_if_stale.assert_called_once_with()
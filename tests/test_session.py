@@ -0,0 +1,25 @@
+from lib.torrserver.session import create_session, shared_session
+
+
+def test_create_session_mounts_bounded_pool_with_connect_retries():
+    session = create_session(pool_connections=2, pool_maxsize=6, retries=3)
+
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(prefix + "localhost:8090/")
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 6
+        assert adapter.max_retries.connect == 3
+        assert adapter.max_retries.read == 0
+        assert adapter.max_retries.status == 0
+
+
+def test_shared_session_is_reused():
+    assert shared_session() is shared_session()
+
+
+def test_shared_session_per_retry_count():
+    guarded = shared_session(retries=0)
+
+    assert guarded is shared_session(retries=0)
+    assert guarded is not shared_session()
+    assert guarded.get_adapter("http://localhost/").max_retries.connect == 0
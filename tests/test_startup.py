@@ -0,0 +1,56 @@
+from unittest.mock import MagicMock
+
+from lib.startup import Startup, current_startup, startup_session
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_phases_accumulate_and_are_recorded():
+    clock = _Clock()
+    metrics = MagicMock()
+    startup = Startup(metrics, clock=clock)
+
+    with startup.phase("metadata"):
+        clock.now += 2
+    with startup.phase("choose"):
+        clock.now += 1
+    with startup.phase("metadata"):
+        clock.now += 0.5
+    startup.begin("play")
+    clock.now += 3
+    startup.finish()
+    startup.finish()
+
+    assert startup.timings == {"metadata": 2.5, "choose": 1.0, "play": 3.0}
+    recorded = [call.args for call in metrics.record.call_args_list]
+    assert recorded == [
+        ("startup metadata", 2),
+        ("startup choose", 1),
+        ("startup metadata", 0.5),
+        ("startup play", 3),
+        ("startup total", 6.5),
+    ]
+
+
+def test_nested_sessions_share_one_startup():
+    with startup_session() as outer:
+        with startup_session() as inner:
+            assert inner is outer
+            assert current_startup() is outer
+        assert not outer.finished
+    assert outer.finished
+    assert current_startup() is None
+
+
+def test_info_is_remembered_per_hash():
+    startup = Startup()
+    startup.remember_info("abc", {"stat": 3})
+
+    assert startup.info_for("abc") == {"stat": 3}
+    assert startup.info_for("def") is None
@@ -0,0 +1,119 @@
+import threading
+from unittest.mock import MagicMock
+
+from lib.status import StatusLog, StatusPublisher, snapshot_from_status
+from lib.torrserver.api import TorrServerError
+
+STATUS = {
+    "stat": 3,
+    "download_speed": 2048.0,
+    "upload_speed": 512.0,
+    "connected_seeders": 7,
+    "active_peers": 12,
+    "total_peers": 40,
+    "loaded_size": 100,
+    "torrent_size": 1000,
+}
+
+
+def test_snapshot_keeps_overlay_fields_only():
+    snapshot = snapshot_from_status(dict(STATUS, file_stats=[{"id": 1}]), 5.0)
+
+    assert snapshot.stat == 3
+    assert snapshot.seeders == 7
+    assert (snapshot.active_peers, snapshot.total_peers) == (12, 40)
+    assert snapshot.sampled_at == 5.0
+    assert snapshot_from_status(None, 0).download_speed == 0
+
+
+def test_sample_uses_light_call_and_publishes_to_subscribers():
+    api = MagicMock()
+    api.get_torrent_info_by_hash.return_value = STATUS
+    publisher = StatusPublisher(api, "abc", clock=lambda: 1.0)
+    received = []
+    publisher.subscribe(lambda _snapshot: 1 / 0)
+    publisher.subscribe(received.append)
+
+    snapshot = publisher.sample()
+
+    api.get_torrent_info_by_hash.assert_called_once_with("abc")
+    api.get_torrent_info.assert_not_called()
+    assert received == [snapshot]
+    assert publisher.latest is snapshot
+
+    publisher.unsubscribe(received.append)
+    publisher.sample()
+    assert received == [snapshot]
+
+
+def test_failed_sample_keeps_last_snapshot():
+    api = MagicMock()
+    api.get_torrent_info_by_hash.side_effect = [STATUS, TorrServerError("down")]
+    publisher = StatusPublisher(api, "abc")
+    snapshot = publisher.sample()
+
+    assert publisher.sample() is None
+    assert publisher.latest is snapshot
+
+
+def test_start_samples_until_stopped():
+    api = MagicMock()
+    api.get_torrent_info_by_hash.return_value = STATUS
+    publisher = StatusPublisher(api, "abc", interval=60)
+    sampled = threading.Event()
+    publisher.subscribe(lambda _snapshot: sampled.set())
+
+    publisher.start()
+    assert sampled.wait(5)
+    publisher.stop()
+
+    assert api.get_torrent_info_by_hash.call_count == 1
+
+
+def test_idles_without_subscribers_and_samples_on_request():
+    api = MagicMock()
+    api.get_torrent_info_by_hash.return_value = STATUS
+    publisher = StatusPublisher(api, "abc", interval=60)
+    sampled = threading.Semaphore(0)
+    publisher.start()
+    try:
+        assert publisher._next_delay() is None
+        api.get_torrent_info_by_hash.assert_not_called()
+
+        publisher.subscribe(lambda _snapshot: sampled.release(), interval=600)
+        assert sampled.acquire(timeout=5)
+        publisher.request_sample()
+        assert sampled.acquire(timeout=5)
+    finally:
+        publisher.stop()
+
+    assert api.get_torrent_info_by_hash.call_count == 2
+
+
+def test_samples_at_shortest_subscriber_interval():
+    now = [0.0]
+    publisher = StatusPublisher(MagicMock(), "abc", interval=2, clock=lambda: now[0])
+    log = MagicMock()
+    publisher.subscribe(log, interval=60)
+    assert publisher._next_delay() == 0
+
+    publisher.sample()
+    now[0] = 1.0
+    assert publisher._next_delay() == 59.0
+
+    overlay = MagicMock()
+    publisher.subscribe(overlay)
+    assert publisher._next_delay() == 1.0
+
+    publisher.unsubscribe(overlay)
+    assert publisher._next_delay() == 59.0
+
+
+def test_status_log_throttles_unchanged_state(caplog):
+    log = StatusLog("movie.mkv", interval=60)
+    caplog.set_level("INFO")
+
+    for now, stat in ((0, 3), (10, 3), (20, 4), (30, 4), (90, 4)):
+        log(snapshot_from_status(dict(STATUS, stat=stat), now))
+
+    assert len([r for r in caplog.records if "movie.mkv" in r.getMessage()]) == 3
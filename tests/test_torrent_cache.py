@@ -0,0 +1,64 @@
+import io
+import os
+
+from lib.torrent_cache import TorrentCache
+
+
+HASH_A = "a" * 40
+HASH_B = "b" * 40
+
+
+def _age(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_put_then_lookup_and_get(tmp_path):
+    cache = TorrentCache(str(tmp_path))
+
+    cache.put("https://example.com/a.torrent", HASH_A.upper(), b"torrent-a")
+
+    assert cache.lookup("https://example.com/a.torrent") == HASH_A
+    assert cache.get(HASH_A) == b"torrent-a"
+    assert cache.lookup("https://example.com/other.torrent") is None
+    assert cache.get(HASH_B) is None
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith(".tmp")]
+
+
+def test_put_copies_file_objects(tmp_path):
+    cache = TorrentCache(str(tmp_path))
+
+    cache.put("u", HASH_A, io.BytesIO(b"torrent-a"))
+
+    assert cache.get(HASH_A) == b"torrent-a"
+
+
+def test_cache_is_shared_between_instances(tmp_path):
+    TorrentCache(str(tmp_path)).put("u", HASH_A, b"x")
+
+    assert TorrentCache(str(tmp_path)).get(HASH_A) == b"x"
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = TorrentCache(str(tmp_path), max_bytes=250)
+    cache.put(None, HASH_A, b"a" * 100)
+    cache.put(None, HASH_B, b"b" * 100)
+    _age(str(tmp_path / (HASH_A + ".torrent")), 100)
+    _age(str(tmp_path / (HASH_B + ".torrent")), 50)
+    # Reading A makes B the least recently used entry.
+    assert cache.get(HASH_A) is not None
+
+    cache.put(None, "c" * 40, b"c" * 100)
+
+    assert cache.get(HASH_A) is not None
+    assert cache.get(HASH_B) is None
+    assert cache.get("c" * 40) is not None
+
+
+def test_rejects_invalid_hash(tmp_path):
+    cache = TorrentCache(str(tmp_path))
+
+    cache.put("u", "../escape", b"x")
+
+    assert cache.lookup("u") is None
+    assert cache.get("../escape") is None
@@ -0,0 +1,119 @@
+import hashlib
+import io
+
+import pytest
+
+from lib.torrent_file import TeeReader, TorrentFileError, parse_torrent
+
+
+def bencode(value):
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(item) for item in value) + b"e"
+    items = sorted(value.items())
+    return b"d" + b"".join(bencode(k) + bencode(v) for k, v in items) + b"e"
+
+
+class CountingReader(io.BytesIO):
+    """BytesIO that records the largest read size requested."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.largest_read = 0
+
+    def read(self, size=-1):
+        self.largest_read = max(self.largest_read, size)
+        return super().read(size)
+
+
+def test_multi_file_torrent_paths_ids_and_hash():
+    info = {
+        "name": "Show S01",
+        "piece length": 16384,
+        "pieces": b"\x00" * 40,
+        "files": [
+            {"length": 100, "path": ["Season 1", "Show.S01E01.mkv"]},
+            {"length": 5, "path": ["Show.nfo"]},
+        ],
+    }
+    data = bencode({"announce": "udp://t.example:80", "info": info})
+
+    meta = parse_torrent(io.BytesIO(data), chunk_size=7)
+
+    assert meta.info_hash == hashlib.sha1(bencode(info)).hexdigest()
+    assert meta.name == "Show S01"
+    assert meta.files == [
+        {"id": 1, "path": "Show S01/Season 1/Show.S01E01.mkv", "length": 100},
+        {"id": 2, "path": "Show S01/Show.nfo", "length": 5},
+    ]
+
+
+def test_tee_reader_parses_chunks_and_copies_them():
+    info = {"length": 42, "name": "Movie.mkv", "piece length": 16384, "pieces": b"p" * 20}
+    data = bencode({"info": info, "url-list": ["http://x"]})
+    chunks = [data[i : i + 9] for i in range(0, len(data), 9)]
+    sink = io.BytesIO()
+    stream = TeeReader(chunks[:2] + [b""] + chunks[2:], sink)
+
+    meta = parse_torrent(stream, chunk_size=4)
+    stream.drain()
+
+    assert meta.files == [{"id": 1, "path": "Movie.mkv", "length": 42}]
+    assert sink.getvalue() == data
+
+
+def test_single_file_torrent():
+    info = {"length": 42, "name": "Movie.mkv", "piece length": 16384, "pieces": b"p" * 20}
+
+    meta = parse_torrent(io.BytesIO(bencode({"info": info})))
+
+    assert meta.info_hash == hashlib.sha1(bencode(info)).hexdigest()
+    assert meta.files == [{"id": 1, "path": "Movie.mkv", "length": 42}]
+
+
+def test_prefers_utf8_variants():
+    info = {
+        "name": "bad",
+        "name.utf-8": "Séries",
+        "files": [{"length": 1, "path": ["x"], "path.utf-8": ["é.mkv"]}],
+        "pieces": b"",
+    }
+
+    meta = parse_torrent(io.BytesIO(bencode({"info": info})))
+
+    assert meta.files[0]["path"] == "Séries/é.mkv"
+
+
+def test_large_pieces_blob_is_streamed():
+    pieces = hashlib.sha1(b"seed").digest() * 200000  # ~4 MB
+    info = {"length": 1, "name": "big.mkv", "pieces": pieces}
+    data = bencode({"info": info})
+    reader = CountingReader(data)
+
+    meta = parse_torrent(reader, chunk_size=4096)
+
+    assert meta.info_hash == hashlib.sha1(bencode(info)).hexdigest()
+    assert reader.largest_read == 4096
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"d4:infod4:name1:x",
+        b"d4:infod4:name1:xee",
+        b"x",
+        b"li1e",
+        b"d4:infoi1ee",
+        b"d4:infod5:filesl1:xe4:name1:xee",
+        b"d4:infod6:lengthi1xe4:name1:xee",
+    ],
+)
+def test_malformed_input(data):
+    with pytest.raises(TorrentFileError):
+        parse_torrent(io.BytesIO(data))
@@ -0,0 +1,180 @@
+import os
+from unittest.mock import MagicMock
+
+from lib.preload import DONE, FAILED, RUNNING
+from lib.torrserver.api import TorrServerError
+from lib.warm_pool import KEEPALIVE_INTERVAL, WarmKeeper, WarmPool
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Task:
+    def __init__(self, state=RUNNING):
+        self.state = state
+
+    @property
+    def active(self):
+        return self.state == RUNNING
+
+
+def test_touch_orders_entries_by_last_stop(tmp_path):
+    pool = WarmPool(str(tmp_path / "warm_pool.json"))
+    pool.touch("AAA", 1)
+    pool.touch("bbb", 2)
+    pool.touch("aaa", 1)
+
+    assert [h for h, _ in WarmPool(str(tmp_path / "warm_pool.json")).entries()] == [
+        "bbb",
+        "aaa",
+    ]
+
+
+def test_unchanged_pool_is_not_rewritten(tmp_path):
+    pool = WarmPool(str(tmp_path / "warm_pool.json"))
+    pool.touch("abc", 1)
+    pool.mark("abc", ready=True, cost=10)
+    pool._state.save = MagicMock()
+
+    pool.mark("abc", ready=True, cost=10)
+    assert pool.evict(size=3, budget=1000) == []
+    pool.discard("missing")
+
+    pool._state.save.assert_not_called()
+
+
+def test_updates_merge_entries_written_by_another_process(tmp_path):
+    path = str(tmp_path / "warm_pool.json")
+    service, plugin = WarmPool(path), WarmPool(path)
+    service.touch("aaa", 1)
+    plugin.touch("bbb", 1)
+    # A write within the mtime resolution leaves the service's copy looking
+    # current.
+    stat = os.stat(path)
+    service._state._signature = (stat.st_mtime_ns, stat.st_size)
+
+    service.mark("aaa", ready=True, cost=10)
+
+    assert [h for h, _ in plugin.entries()] == ["aaa", "bbb"]
+    assert plugin.get("aaa")["cost"] == 10
+
+
+def test_is_warm_needs_ready_entry_for_same_file():
+    pool = WarmPool()
+    pool.touch("abc", 1)
+    assert not pool.is_warm("abc", 1)
+
+    pool.mark("abc", ready=True, cost=10)
+    assert pool.is_warm("abc", "1")
+    assert not pool.is_warm("abc", 2)
+
+    pool.touch("abc", 1)
+    assert pool.is_warm("abc", 1)
+    pool.touch("abc", 2)
+    assert not pool.is_warm("abc", 2)
+
+    pool.discard("abc")
+    assert pool.get("abc") is None
+
+
+def test_evict_drops_least_recent_beyond_size_or_budget():
+    pool = WarmPool()
+    for info_hash in ("a", "b", "c"):
+        pool.touch(info_hash, 1)
+        pool.mark(info_hash, ready=True, cost=100)
+
+    assert pool.evict(size=2, budget=1000) == ["a"]
+    assert pool.evict(size=2, budget=150) == ["b"]
+    assert [h for h, _ in pool.entries()] == ["c"]
+    assert pool.evict(size=0, budget=1000) == ["c"]
+
+
+def _keeper(pool, status=None):
+    api = MagicMock()
+    api.get_torrent_info.return_value = status or {"preloaded_bytes": 5}
+    api.get_cache.return_value = {"Filled": 50}
+    preloads = MagicMock()
+    preloads.get.return_value = None
+    preloads.start.return_value = _Task()
+    clock = _Clock()
+    return WarmKeeper(api, pool, preloads, clock=clock), api, preloads, clock
+
+
+def test_tick_keeps_alive_preloads_once_and_marks_ready():
+    pool = WarmPool()
+    pool.touch("abc", 3)
+    keeper, api, preloads, clock = _keeper(pool)
+
+    keeper.tick(size=3, budget=1000)
+    api.get_torrent_info.assert_called_once_with("abc")
+    preloads.start.assert_called_once_with("abc", 3)
+    assert pool.get("abc")["cost"] == 50
+    assert not pool.is_warm("abc", 3)
+
+    keeper.tick(size=3, budget=1000)
+    assert api.get_torrent_info.call_count == 1
+
+    clock.now += KEEPALIVE_INTERVAL
+    preloads.get.return_value = _Task(DONE)
+    keeper.tick(size=3, budget=1000)
+    assert api.get_torrent_info.call_count == 2
+    assert preloads.start.call_count == 1
+    assert pool.is_warm("abc", 3)
+
+
+def test_tick_restarts_failed_preload():
+    pool = WarmPool()
+    pool.touch("abc", 3)
+    keeper, _, preloads, _ = _keeper(pool)
+    preloads.get.return_value = _Task(FAILED)
+
+    keeper.tick(size=3, budget=1000)
+
+    preloads.start.assert_called_once_with("abc", 3)
+
+
+def test_tick_evicts_and_drops_torrents():
+    pool = WarmPool()
+    pool.touch("old", 1)
+    pool.touch("new", 1)
+    keeper, api, preloads, _ = _keeper(pool)
+
+    keeper.tick(size=1, budget=1000)
+
+    api.drop_torrent.assert_called_once_with("old")
+    preloads.cancel.assert_called_once_with("old")
+    api.get_torrent_info.assert_called_once_with("new")
+
+
+def test_tick_forgets_missing_torrent_but_not_unreachable_server():
+    pool = WarmPool()
+    pool.touch("abc", 1)
+    keeper, api, _, clock = _keeper(pool)
+
+    api.get_torrent_info.side_effect = TorrServerError("refused")
+    keeper.tick(size=3, budget=1000)
+    assert pool.get("abc") is not None
+
+    clock.now += KEEPALIVE_INTERVAL
+    api.get_torrent_info.side_effect = TorrServerError("gone", status_code=404)
+    keeper.tick(size=3, budget=1000)
+    assert pool.get("abc") is None
+
+
+def test_tick_cancels_preload_of_entry_removed_for_playback():
+    pool = WarmPool()
+    pool.touch("abc", 1)
+    keeper, api, preloads, clock = _keeper(pool)
+    keeper.tick(size=3, budget=1000)
+
+    pool.discard("abc")
+    clock.now += KEEPALIVE_INTERVAL
+    keeper.tick(size=3, budget=1000)
+
+    preloads.cancel.assert_called_once_with("abc")
+    api.get_torrent_info.assert_called_once_with("abc")